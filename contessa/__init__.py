@@ -6,11 +6,14 @@ It exposes `DataQualityOperator` that can be plugged in any airflow DAG and will
 check on load in temporary table.
 """
 
-__version__ = "0.2.12"
+__version__ = "0.2.13"
 
 # Start ignoring PyUnusedCodeBear
-from .consistency_checker import ConsistencyChecker
+from .consistency_checker import BatchError, ConsistencyChecker
+from .history import HistoryCache
+from .reader import ResultReader
 from .runner import ContessaRunner
+from .sinks import CsvSink, JsonLinesSink, ParquetSink, WriteBehindSink
 from .rules import EQ, GT, GTE, LT, LTE, NOT, NOT_COLUMN, NOT_NULL, SQL
 
 # Stop ignoring
@@ -26,11 +26,14 @@ target_metadata = None
 
 sqlalchemy_url = context.get_x_argument(as_dictionary=True).get("sqlalchemy_url")
 schema = context.get_x_argument(as_dictionary=True).get("schema")
+partition_results = context.get_x_argument(as_dictionary=True).get("partition_results")
 
 if sqlalchemy_url:
     config.set_main_option("sqlalchemy.url", sqlalchemy_url)
 if schema:
     config.set_main_option("schema", schema)
+if partition_results:
+    config.set_main_option("partition_results", partition_results)
 
 
 def run_migrations_offline():
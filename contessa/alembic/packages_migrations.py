@@ -2,4 +2,5 @@ migration_map = {
     "0.0.0": "54f8985b0ee5",
     "0.2.4": "480e6618700d",
     "0.2.5": "a179e5ca0ad2",
+    "0.2.13": "c41f7b2e9a03",
 }
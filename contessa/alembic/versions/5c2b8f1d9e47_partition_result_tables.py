@@ -0,0 +1,96 @@
+"""partition_result_tables
+
+Optional - result tables are re-created as partitioned by task_ts only if
+the migration is run with `-x partition_results=true` (`--partition-results`
+option of `contessa-migrate`). Otherwise nothing is changed.
+
+Revision ID: 5c2b8f1d9e47
+Revises: a179e5ca0ad2
+Create Date: 2026-10-19 09:12:31.402113
+
+"""
+from alembic import op
+
+from contessa.models import QualityCheck, ConsistencyCheck, FailedExample
+from contessa.partitions import (
+    convert_to_partitioned,
+    convert_to_unpartitioned,
+    is_partitioned,
+    list_result_tables,
+)
+
+# revision identifiers, used by Alembic.
+revision = "5c2b8f1d9e47"
+down_revision = "a179e5ca0ad2"
+branch_labels = None
+depends_on = None
+
+config = None
+
+# columns of the unique constraint of each kind of result table
+UNIQUE_COLUMNS = {
+    QualityCheck._table_prefix: [
+        "attribute",
+        "rule_name",
+        "rule_type",
+        "task_ts",
+        "time_filter",
+    ],
+    ConsistencyCheck._table_prefix: [
+        "type",
+        "name",
+        "left_table",
+        "right_table",
+        "task_ts",
+        "time_filter",
+    ],
+    FailedExample._table_prefix: [
+        "attribute",
+        "rule_name",
+        "rule_type",
+        "task_ts",
+        "time_filter",
+    ],
+}
+
+
+def get_config():
+    global config
+    if config:
+        return config
+
+    from alembic import context
+
+    config = context.config
+
+    return config
+
+
+def get(name):
+    return get_config().get_main_option(name)
+
+
+def upgrade():
+    if get("partition_results") != "true":
+        print("Partitioning of result tables not requested, skipping.")
+        return
+
+    schema = get("schema")
+    bind = op.get_bind()
+    for prefix, unique_columns in UNIQUE_COLUMNS.items():
+        for table_name in list_result_tables(bind, schema, prefix):
+            if is_partitioned(bind, schema, table_name):
+                continue
+            print(f"Migrate table {table_name}")
+            convert_to_partitioned(bind, schema, table_name, unique_columns)
+
+
+def downgrade():
+    schema = get("schema")
+    bind = op.get_bind()
+    for prefix, unique_columns in UNIQUE_COLUMNS.items():
+        for table_name in list_result_tables(bind, schema, prefix):
+            if not is_partitioned(bind, schema, table_name):
+                continue
+            print(f"Migrate table {table_name}")
+            convert_to_unpartitioned(bind, schema, table_name, unique_columns)
@@ -0,0 +1,71 @@
+"""add_result_reader_indexes
+
+Indexes for keyset pagination of `ResultReader` queries.
+
+Revision ID: 8e3a6d0c2f15
+Revises: 5c2b8f1d9e47
+Create Date: 2026-10-19 11:40:02.118734
+
+"""
+from alembic import op
+
+from contessa.models import (
+    HISTORY_INDEX_COLUMNS,
+    INVALID_INDEX_COLUMNS,
+    INVALID_INDEX_WHERE,
+    QualityCheck,
+)
+from contessa.partitions import list_result_tables
+
+# revision identifiers, used by Alembic.
+revision = "8e3a6d0c2f15"
+down_revision = "5c2b8f1d9e47"
+branch_labels = None
+depends_on = None
+
+config = None
+
+
+def get_config():
+    global config
+    if config:
+        return config
+
+    from alembic import context
+
+    config = context.config
+
+    return config
+
+
+def get(name):
+    return get_config().get_main_option(name)
+
+
+def upgrade():
+    schema = get("schema")
+    bind = op.get_bind()
+    for table_name in list_result_tables(bind, schema, QualityCheck._table_prefix):
+        print(f"Migrate table {table_name}")
+        op.execute(
+            f"""
+            CREATE INDEX IF NOT EXISTS {table_name}_history_idx
+            ON {schema}.{table_name} ({', '.join(HISTORY_INDEX_COLUMNS)})
+        """
+        )
+        op.execute(
+            f"""
+            CREATE INDEX IF NOT EXISTS {table_name}_invalid_idx
+            ON {schema}.{table_name} ({', '.join(INVALID_INDEX_COLUMNS)})
+            WHERE {INVALID_INDEX_WHERE}
+        """
+        )
+
+
+def downgrade():
+    schema = get("schema")
+    bind = op.get_bind()
+    for table_name in list_result_tables(bind, schema, QualityCheck._table_prefix):
+        print(f"Migrate table {table_name}")
+        op.execute(f"DROP INDEX IF EXISTS {schema}.{table_name}_history_idx")
+        op.execute(f"DROP INDEX IF EXISTS {schema}.{table_name}_invalid_idx")
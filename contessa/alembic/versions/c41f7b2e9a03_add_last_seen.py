@@ -0,0 +1,59 @@
+"""add_last_seen
+
+`last_seen` of quality check results, used by delta persistence.
+
+Revision ID: c41f7b2e9a03
+Revises: 8e3a6d0c2f15
+Create Date: 2026-10-19 13:05:47.520361
+
+"""
+from alembic import op
+
+from contessa.models import QualityCheck
+from contessa.partitions import list_result_tables
+
+# revision identifiers, used by Alembic.
+revision = "c41f7b2e9a03"
+down_revision = "8e3a6d0c2f15"
+branch_labels = None
+depends_on = None
+
+config = None
+
+
+def get_config():
+    global config
+    if config:
+        return config
+
+    from alembic import context
+
+    config = context.config
+
+    return config
+
+
+def get(name):
+    return get_config().get_main_option(name)
+
+
+def upgrade():
+    schema = get("schema")
+    bind = op.get_bind()
+    for table_name in list_result_tables(bind, schema, QualityCheck._table_prefix):
+        print(f"Migrate table {table_name}")
+        # tables created by 0.2.13 code before the migration already have the column
+        op.execute(
+            f"""
+            ALTER TABLE {schema}.{table_name}
+            ADD COLUMN IF NOT EXISTS last_seen TIMESTAMP WITH TIME ZONE
+        """
+        )
+
+
+def downgrade():
+    schema = get("schema")
+    bind = op.get_bind()
+    for table_name in list_result_tables(bind, schema, QualityCheck._table_prefix):
+        print(f"Migrate table {table_name}")
+        op.execute(f"ALTER TABLE {schema}.{table_name} DROP COLUMN IF EXISTS last_seen")
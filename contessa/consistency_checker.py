@@ -1,10 +1,25 @@
+import json
 import logging
 import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Optional, List, Union
 
 from datetime import datetime
 
 from contessa.db import Connector
+from contessa.diff import (
+    as_subquery,
+    diff_sets,
+    DigestDiff,
+    FingerprintDiff,
+    HashDiff,
+    key_boundaries,
+    KeyDiff,
+    merge_results,
+    MergeDiff,
+    range_queries,
+    SpillDiff,
+)
 from contessa.failed_examples import default_example_selector, ExampleSelector
 from contessa.models import (
     create_default_check_class,
@@ -13,13 +28,45 @@ from contessa.models import (
     ConsistencyCheck,
     CheckResult,
 )
+from contessa.sinks import ResultSink
 from contessa.time_filter import (
     TimeFilter,
     TimeFilterConjunction,
     TimeFilterColumn,
     parse_time_filter,
 )
-from contessa.utils import AggregatedResult, render_jinja_sql
+from contessa.utils import AggregatedResult, render_jinja_sql, run_concurrently
+
+
+class BatchError(Exception):
+    """
+    Some checks of `ConsistencyChecker.run_batch` failed, results of the others were saved.
+    :param failures: (check, error) of each failed check
+    :param results: saved results of the checks that succeeded
+    """
+
+    def __init__(self, failures: List, results: List):
+        self.failures = failures
+        self.results = results
+        names = ", ".join(
+            Table(**c["right_check_table"]).fullname for c, _ in failures[:10]
+        )
+        super().__init__(
+            f"{len(failures)} of {len(failures) + len(results)} consistency checks "
+            f"failed: {names}"
+        )
+
+
+def pool_capacity(conn: Connector) -> Optional[int]:
+    """
+    Max number of connections of the engine of `conn`, None if it's not limited (or known).
+    """
+    pool = conn.engine.pool
+    if not hasattr(pool, "size") or not hasattr(pool, "_max_overflow"):
+        return None
+    if pool._max_overflow < 0:
+        return None
+    return pool.size() + pool._max_overflow
 
 
 class ConsistencyChecker:
@@ -30,17 +77,55 @@ class ConsistencyChecker:
     model_cls = ConsistencyCheck
 
     COUNT = "count"
+    APPROX_COUNT = "approx_count"
     DIFF = "difference"
+    DIGEST_DIFF = "digest_difference"
+    HASH_DIFF = "hash_difference"
+    MERGE_DIFF = "merge_difference"
+    KEY_DIFF = "key_difference"
+    FINGERPRINT_DIFF = "fingerprint_difference"
+    SPILL_DIFF = "spill_difference"
 
-    def __init__(self, left_conn_uri_or_engine, right_conn_uri_or_engine=None):
+    # methods comparing whole rows, columns are listed explicitly by default
+    ROW_METHODS = (
+        DIFF,
+        DIGEST_DIFF,
+        HASH_DIFF,
+        MERGE_DIFF,
+        KEY_DIFF,
+        FINGERPRINT_DIFF,
+        SPILL_DIFF,
+    )
+
+    # settings of `HashDiff`
+    hash_diff_fanout = 64
+    hash_diff_leaf_rows = 10_000
+    # settings of `SpillDiff`, rows of each side held in memory and number of run files
+    spill_memory_rows = 1_000_000
+    spill_partitions = 64
+    spill_directory = None
+    # relative difference of estimated row counts that `approx_count` tolerates,
+    # exact counts are compared if the estimates differ more
+    approx_count_tolerance = 0.05
+
+    def __init__(
+        self,
+        left_conn_uri_or_engine,
+        right_conn_uri_or_engine=None,
+        engine_options: Optional[Dict] = None,
+    ):
+        """
+        :param engine_options: pool settings etc. for the shared engines, see `get_engine`
+        """
+        engine_options = engine_options or {}
         self.left_conn_uri_or_engine = left_conn_uri_or_engine
-        self.left_conn = Connector(left_conn_uri_or_engine)
+        self.left_conn = Connector(left_conn_uri_or_engine, **engine_options)
         if right_conn_uri_or_engine is None:
             self.right_conn_uri_or_engine = self.left_conn_uri_or_engine
             self.right_conn = self.left_conn
         else:
             self.right_conn_uri_or_engine = right_conn_uri_or_engine
-            self.right_conn = Connector(right_conn_uri_or_engine)
+            self.right_conn = Connector(right_conn_uri_or_engine, **engine_options)
 
     def run(
         self,
@@ -54,20 +139,174 @@ class ConsistencyChecker:
         right_custom_sql: str = None,
         context: Optional[Dict] = None,
         example_selector: ExampleSelector = default_example_selector,
+        sink: Optional[ResultSink] = None,
+        key_columns: Optional[List[str]] = None,
+        key_ranges: Optional[int] = None,
+        max_workers: int = 4,
     ) -> Union[CheckResult, ConsistencyCheck]:
+        """
+        :param sink: write result to `ResultSink` (e.g. `JsonLinesSink`) instead of
+            `result_table`. Open it (`with sink:`) around several runs to write them all
+            to one file.
+        :param key_columns: columns identifying a row, used by `hash_difference` to split
+            rows to buckets and fetched along with digests by `digest_difference`.
+            Whole rows are used if not given. Required by `key_difference`.
+        :param key_ranges: split rows to this number of ranges of the first key column
+            and diff the ranges in parallel, by at most `max_workers` threads. Each side
+            needs a connection per worker, see pool settings of `engine_options`.
+        """
+        if result_table and sink is not None:
+            raise ValueError("Use either `result_table` or `sink`, not both.")
+        result = self.check(
+            method,
+            left_check_table,
+            right_check_table,
+            columns,
+            time_filter,
+            left_custom_sql,
+            right_custom_sql,
+            context,
+            example_selector,
+            key_columns,
+            key_ranges,
+            max_workers,
+        )
+        return self.save_results([result], result_table, sink)[0]
+
+    def run_batch(
+        self,
+        checks: List[Dict],
+        result_table: Optional[Dict] = None,
+        example_selector: ExampleSelector = default_example_selector,
+        sink: Optional[ResultSink] = None,
+        max_workers: int = 4,
+    ) -> List[Union[CheckResult, Dict]]:
+        """
+        Run many consistency checks, e.g. of all the replicated tables, at most `max_workers`
+        at once. Connections are shared, column names of all the right tables are looked up
+        by one query and all the results are saved by one bulk upsert (or written to `sink`).
+
+            consistency_checker.run_batch(
+                [
+                    {
+                        "method": ConsistencyChecker.COUNT,
+                        "left_check_table": {"schema_name": "tmp", "table_name": t},
+                        "right_check_table": {"schema_name": "public", "table_name": t},
+                    }
+                    for t in tables
+                ],
+                result_table={"schema_name": "data_quality", "table_name": "replicas"},
+            )
+
+        :param checks: keyword arguments of `run` for each check, except of `result_table`,
+            `sink` and `example_selector`. `max_workers` of checks with `key_ranges`
+            is lowered, so all the workers (`max_workers` of the batch times `max_workers`
+            of the check) fit into the connection pool of the engine.
+        :return: results in the same order as `checks`
+        :raises BatchError: if some checks failed, after results of the others were saved
+        """
+        if result_table and sink is not None:
+            raise ValueError("Use either `result_table` or `sink`, not both.")
+
+        column_names = self.right_conn.get_column_names_of_tables(
+            [
+                Table(**c["right_check_table"]).fullname
+                for c in checks
+                if c["method"] in self.ROW_METHODS
+                and not c.get("columns")
+                and not (c.get("left_custom_sql") and c.get("right_custom_sql"))
+            ]
+        )
+        range_workers = self.range_workers(max_workers)
+
+        def check(c: Dict):
+            if c.get("key_ranges") and range_workers is not None:
+                c = {**c, "max_workers": min(c.get("max_workers", 4), range_workers)}
+            try:
+                return self.check(
+                    **c,
+                    example_selector=example_selector,
+                    right_columns=column_names.get(
+                        Table(**c["right_check_table"]).fullname
+                    ),
+                )
+            except Exception as e:
+                logging.exception(
+                    f"Consistency check of {Table(**c['right_check_table']).fullname} failed."
+                )
+                return e
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            outcomes = list(executor.map(check, checks))
+        results = [r for r in outcomes if not isinstance(r, Exception)]
+        failures = [
+            (c, r) for c, r in zip(checks, outcomes) if isinstance(r, Exception)
+        ]
+        logging.info(
+            f"Finished {len(results)} consistency checks, {len(failures)} failed."
+        )
+        results = self.save_results(results, result_table, sink)
+        if failures:
+            raise BatchError(failures, results)
+        return results
+
+    def range_workers(self, max_workers: int) -> Optional[int]:
+        """
+        Max workers of each check with key ranges, so `max_workers` checks at once fit
+        into the connection pools. Every range worker holds a connection to both sides.
+        """
+        per_worker = 2 if self.left_conn is self.right_conn else 1
+        capacities = [
+            c
+            for c in (pool_capacity(self.left_conn), pool_capacity(self.right_conn))
+            if c is not None
+        ]
+        if not capacities:
+            return None
+        return max(1, min(capacities) // (per_worker * max_workers))
+
+    def check(
+        self,
+        method: str,
+        left_check_table: Dict,
+        right_check_table: Dict,
+        columns: Optional[List[str]] = None,
+        time_filter: Optional[Union[str, List[Dict], TimeFilter]] = None,
+        left_custom_sql: str = None,
+        right_custom_sql: str = None,
+        context: Optional[Dict] = None,
+        example_selector: ExampleSelector = default_example_selector,
+        key_columns: Optional[List[str]] = None,
+        key_ranges: Optional[int] = None,
+        max_workers: int = 4,
+        right_columns: Optional[List[str]] = None,
+    ) -> Dict:
+        """
+        Validate the arguments of `run` and run the check, without saving the result.
+        :param right_columns: columns of the right table, if they are already known
+        """
         if left_custom_sql and right_custom_sql:
             if columns or time_filter:
                 raise ValueError(
                     "When using custom sqls you cannot change 'columns' or 'time_filter' attribute"
                 )
 
+        if method == self.KEY_DIFF and not key_columns:
+            raise ValueError(f"Method {method} needs `key_columns`.")
+        if key_ranges and (method not in self.ROW_METHODS or not key_columns):
+            raise ValueError(
+                "Key ranges need `key_columns` and one of the methods comparing rows."
+            )
+        if columns and key_columns and not set(key_columns).issubset(columns):
+            raise ValueError("`key_columns` have to be among the selected `columns`.")
+
         time_filter = parse_time_filter(time_filter)
 
         left_check_table = Table(**left_check_table)
         right_check_table = Table(**right_check_table)
         context = self.get_context(left_check_table, right_check_table, context)
 
-        result = self.do_consistency_check(
+        return self.do_consistency_check(
             method,
             columns,
             time_filter,
@@ -77,18 +316,39 @@ class ConsistencyChecker:
             right_custom_sql,
             context,
             example_selector,
+            key_columns,
+            key_ranges,
+            max_workers,
+            right_columns,
         )
 
+    def save_results(
+        self,
+        results: List[Dict],
+        result_table: Optional[Dict] = None,
+        sink: Optional[ResultSink] = None,
+    ) -> List[Union[CheckResult, Dict]]:
+        """
+        Upsert results to `result_table` at once, or return them as `CheckResult`s
+        (written also to `sink` if given).
+        """
         if result_table:
             result_table = ResultTable(**result_table, model_cls=self.model_cls)
             quality_check_class = create_default_check_class(result_table)
             self.right_conn.ensure_table(quality_check_class.__table__)
-            self.upsert(quality_check_class, result)
-            return result
+            self.upsert_many(quality_check_class, results)
+            return results
 
-        obj = CheckResult()
-        obj.init_row_consistency(**result)
-        return obj
+        objs = []
+        for result in results:
+            obj = CheckResult()
+            obj.init_row_consistency(**result)
+            objs.append(obj)
+        if sink is not None:
+            with sink:
+                for obj in objs:
+                    sink.write(obj)
+        return objs
 
     @staticmethod
     def get_context(
@@ -119,6 +379,10 @@ class ConsistencyChecker:
         right_sql: str = None,
         context: Dict = None,
         example_selector: ExampleSelector = default_example_selector,
+        key_columns: Optional[List[str]] = None,
+        key_ranges: Optional[int] = None,
+        max_workers: int = 4,
+        right_columns: Optional[List[str]] = None,
     ):
         """
         Run quality check for all rules. Use `qc_cls` to construct objects that will be inserted
@@ -130,14 +394,19 @@ class ConsistencyChecker:
                     column = f"count({', '.join(columns)})"
                 else:
                     column = "count(*)"
-            elif method == self.DIFF:
+            elif method == self.APPROX_COUNT:
+                column = ", ".join(columns) if columns else "*"
+            elif method in self.ROW_METHODS:
                 if columns:
                     column = ", ".join(columns)
                 else:
                     # List the columns explicitly in case column order of compared tables is not the same.
                     column = ", ".join(
                         sorted(
-                            self.right_conn.get_column_names(right_check_table.fullname)
+                            right_columns
+                            or self.right_conn.get_column_names(
+                                right_check_table.fullname
+                            )
                         )
                     )
             else:
@@ -147,19 +416,48 @@ class ConsistencyChecker:
             left_sql = self.construct_default_query(
                 left_check_table.fullname, column, time_filter, context
             )
-        left_result = self.run_query(self.left_conn, left_sql, context)
         if not right_sql:
             right_sql = self.construct_default_query(
                 right_check_table.fullname, column, time_filter, context
             )
-        right_result = self.run_query(self.right_conn, right_sql, context)
 
-        results = self.compare_results(
-            left_result, right_result, method, example_selector
-        )
+        if key_ranges:
+            results = self.diff_by_key_ranges(
+                method,
+                self.render_sql(left_sql, context),
+                self.render_sql(right_sql, context),
+                key_columns,
+                example_selector,
+                key_ranges,
+                max_workers,
+            )
+        elif method == self.APPROX_COUNT:
+            results = self.approx_count(
+                self.render_sql(left_sql, context), self.render_sql(right_sql, context)
+            )
+        elif method in self.ROW_METHODS:
+            results = self.diff_rendered(
+                method,
+                self.render_sql(left_sql, context),
+                self.render_sql(right_sql, context),
+                key_columns,
+                example_selector,
+            )
+        else:
+            left_result, right_result = run_concurrently(
+                lambda: self.run_query(self.left_conn, left_sql, context),
+                lambda: self.run_query(self.right_conn, right_sql, context),
+            )
+            results = self.compare_results(
+                left_result, right_result, method, example_selector
+            )
 
         return {
-            "check": {"type": method, "description": "", "name": "consistency",},
+            "check": {
+                "type": method,
+                "description": self.describe_results(method, results),
+                "name": "consistency",
+            },
             "results": results,
             "left_table_name": left_check_table.fullname,
             "right_table_name": right_check_table.fullname,
@@ -180,23 +478,155 @@ class ConsistencyChecker:
             )
 
         elif method == self.DIFF:
-            left_set = set(left_result)
-            right_set = set(right_result)
-            common = left_set.intersection(right_set)
-            passed = len(common)
-            failed = (len(left_set) - len(common)) + (len(right_set) - len(common))
-            failed_examples = example_selector.select_examples(
-                left_set.symmetric_difference(right_set)
+            return diff_sets(left_result, right_result, example_selector)
+
+        else:
+            raise NotImplementedError(f"Method {method} not implemented")
+
+    def diff_rendered(
+        self,
+        method: str,
+        left_query: str,
+        right_query: str,
+        key_columns: Optional[List[str]],
+        example_selector: ExampleSelector,
+    ) -> AggregatedResult:
+        """
+        Diff of already rendered queries. Methods except of `difference`,
+        `fingerprint_difference` and `spill_difference` wrap the queries, so the rows
+        are digested (and sorted) in the database.
+        """
+        if method == self.DIFF:
+            left_result, right_result = run_concurrently(
+                lambda: self.fetch_rows(self.left_conn, left_query),
+                lambda: self.fetch_rows(self.right_conn, right_query),
+            )
+            return diff_sets(left_result, right_result, example_selector)
+        if method == self.HASH_DIFF:
+            differ = HashDiff(
+                self.left_conn,
+                self.right_conn,
+                fanout=self.hash_diff_fanout,
+                leaf_rows=self.hash_diff_leaf_rows,
             )
+        elif method == self.SPILL_DIFF:
+            differ = SpillDiff(
+                self.left_conn,
+                self.right_conn,
+                memory_rows=self.spill_memory_rows,
+                partitions=self.spill_partitions,
+                directory=self.spill_directory,
+            )
+        elif method == self.FINGERPRINT_DIFF:
+            differ = FingerprintDiff(self.left_conn, self.right_conn)
+        elif method == self.KEY_DIFF:
+            differ = KeyDiff(self.left_conn, self.right_conn)
+        elif method == self.MERGE_DIFF:
+            differ = MergeDiff(self.left_conn, self.right_conn)
+        else:
+            differ = DigestDiff(self.left_conn, self.right_conn)
+        return differ.diff(left_query, right_query, key_columns, example_selector)
+
+    def diff_by_key_ranges(
+        self,
+        method: str,
+        left_query: str,
+        right_query: str,
+        key_columns: List[str],
+        example_selector: ExampleSelector,
+        key_ranges: int,
+        max_workers: int,
+    ) -> AggregatedResult:
+        """
+        Split rows of both sides to ranges of the first key column, diff each range
+        (short queries) in parallel and sum the results.
+        """
+        column = key_columns[0]
+        boundaries = key_boundaries(
+            self.left_conn, self.right_conn, left_query, right_query, column, key_ranges
+        )
+        ranges = list(
+            zip(
+                range_queries(left_query, column, boundaries),
+                range_queries(right_query, column, boundaries),
+            )
+        )
+        logging.info(f"Diffing {len(ranges)} ranges of {column}.")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(
+                executor.map(
+                    lambda r: self.diff_rendered(
+                        method, r[0], r[1], key_columns, example_selector
+                    ),
+                    ranges,
+                )
+            )
+        return merge_results(results, example_selector)
+
+    def approx_count(self, left_query: str, right_query: str) -> AggregatedResult:
+        """
+        Compare row counts estimated by the planner, counts are compared exactly only
+        if the estimates differ more than `approx_count_tolerance`.
+        `failed_example` holds the estimates.
+        """
+        left_estimate, right_estimate = run_concurrently(
+            lambda: self.estimate_rows(self.left_conn, left_query),
+            lambda: self.estimate_rows(self.right_conn, right_query),
+        )
+        estimates = {"left_estimate": left_estimate, "right_estimate": right_estimate}
+        if abs(left_estimate - right_estimate) <= self.approx_count_tolerance * max(
+            left_estimate, right_estimate
+        ):
             return AggregatedResult(
-                total_records=failed + passed,
-                failed=failed,
-                passed=passed,
-                failed_example=list(failed_examples),
+                total_records=max(left_estimate, right_estimate),
+                failed=0,
+                passed=max(left_estimate, right_estimate),
+                failed_example={**estimates, "exact": False},
             )
 
-        else:
-            raise NotImplementedError(f"Method {method} not implemented")
+        logging.info(
+            f"Estimated counts {left_estimate} and {right_estimate} differ, counting exactly."
+        )
+        left_result, right_result = run_concurrently(
+            lambda: self.fetch_rows(
+                self.left_conn,
+                f"SELECT count(*) FROM ({as_subquery(left_query)}) AS src",
+            ),
+            lambda: self.fetch_rows(
+                self.right_conn,
+                f"SELECT count(*) FROM ({as_subquery(right_query)}) AS src",
+            ),
+        )
+        results = self.compare_results(left_result, right_result, self.COUNT, None)
+        return results._replace(failed_example={**estimates, "exact": True})
+
+    @staticmethod
+    def estimate_rows(conn: Connector, query: str) -> int:
+        """
+        Number of rows of the query estimated by the planner (from table statistics),
+        the query is not executed.
+        """
+        plan = conn.get_records(f"EXPLAIN (FORMAT JSON) {as_subquery(query)}").scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    def describe_results(self, method: str, results: AggregatedResult) -> str:
+        """
+        Description of the check, summary of differences by class for `key_difference`,
+        estimated counts for `approx_count`.
+        """
+        if method == self.KEY_DIFF:
+            return ", ".join(
+                f"{kind}: {v['count']}" for kind, v in results.failed_example.items()
+            )
+        if method == self.APPROX_COUNT:
+            e = results.failed_example
+            return (
+                f"{'exact' if e['exact'] else 'estimated'} count, "
+                f"estimates: {e['left_estimate']}, {e['right_estimate']}"
+            )
+        return ""
 
     def construct_default_query(
         self,
@@ -226,15 +656,19 @@ class ConsistencyChecker:
 
     def run_query(self, conn: Connector, query: str, context):
         query = self.render_sql(query, context)
+        return self.fetch_rows(conn, query)
+
+    @staticmethod
+    def fetch_rows(conn: Connector, query: str):
         logging.debug(query)
-        result = [tuple(r.values()) for r in conn.get_records(query)]
-        return result
+        return [tuple(r.values()) for r in conn.get_records(query)]
 
     def upsert(self, dc_cls, result):
-        obj = dc_cls()
-        obj.init_row(**result)
-        self.right_conn.upsert(
-            [obj,]
+        self.upsert_many(dc_cls, [result])
+
+    def upsert_many(self, dc_cls, results: List[Dict]):
+        self.right_conn.upsert_rows(
+            dc_cls.__table__, [dc_cls.build_row(**result) for result in results]
         )
 
     def construct_automatic_time_filter(
@@ -1,20 +1,106 @@
-from typing import Union, List
+from datetime import date, datetime
+from typing import Any, Dict, Union, List, Optional, Sequence, Tuple
+from uuid import uuid4
+import io
+import json
 import logging
+import threading
+import weakref
 
-from sqlalchemy import create_engine, Table, UniqueConstraint
+from sqlalchemy import (
+    and_,
+    bindparam,
+    column,
+    create_engine,
+    func,
+    select,
+    table as sql_table,
+    text,
+    Table,
+    tuple_,
+    UniqueConstraint,
+)
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.engine.base import Engine
 from sqlalchemy.orm import sessionmaker
 
+from contessa.history import (
+    _naive,
+    HistoryCache,
+    stable_time_filter,
+    stable_time_filter_sql,
+)
+from contessa.partitions import (
+    create_partition,
+    drop_partitions_before,
+    months_for,
+    partition_start,
+    PARTITION_COLUMN,
+)
+from contessa.utils import chunked
+
+# rows per one multi-row insert, keeps number of bind params well under the postgres limit
+UPSERT_CHUNK_SIZE = 1000
+# from this number of rows on, upsert goes through `COPY`
+COPY_THRESHOLD = 5000
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+# Table -> urls of dbs where it's known to exist, see `Connector.ensure_table`
+_ensured_tables = weakref.WeakKeyDictionary()
+_ensured_tables_lock = threading.Lock()
+
+# Table -> (url, month) of partitions known to exist, see `Connector.ensure_partitions`
+_ensured_partitions = weakref.WeakKeyDictionary()
+_ensured_partitions_lock = threading.Lock()
+
+
+def get_engine(conn_uri: str, **engine_options) -> Engine:
+    """
+    Process-wide registry of engines. All the callers asking for the same uri with the same
+    options share one engine and so its connection pool.
+
+    NOTE: Pooled connections can't be shared with forked processes, call `dispose_engines`
+    in the child after fork.
+    """
+    key = (conn_uri, tuple(sorted((k, repr(v)) for k, v in engine_options.items())))
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = create_engine(conn_uri, **engine_options)
+            _engines[key] = engine
+    return engine
+
+
+def dispose_engines():
+    """
+    Close all pooled connections and forget the registered engines.
+    """
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+
 
 class Connector:
     """
     Wrapping sqlachemy engine. Holds some useful methods.
+
+    :param history_cache: optional HistoryCache that will be kept up to date on upsert
+    :param engine_options: passed to `create_engine` if conn uri is given, e.g. `pool_size`,
+        `max_overflow` or `pool_recycle`. See `get_engine`.
     """
 
-    def __init__(self, conn_uri_or_engine: Union[str, Engine]):
+    def __init__(
+        self,
+        conn_uri_or_engine: Union[str, Engine],
+        history_cache: Optional[HistoryCache] = None,
+        **engine_options,
+    ):
         if isinstance(conn_uri_or_engine, str):
-            self.engine = create_engine(conn_uri_or_engine)
+            self.engine = get_engine(conn_uri_or_engine, **engine_options)
         elif isinstance(conn_uri_or_engine, Engine):
             self.engine = conn_uri_or_engine
         else:
@@ -23,6 +109,7 @@ class Connector:
                 f"You can only pass conn str or sqlalchemy `Engine` to `{cls_name}`."
             )
         self.Session = sessionmaker(bind=self.engine)
+        self.history_cache = history_cache
 
     def make_session(self):
         return self.Session()
@@ -45,10 +132,49 @@ class Connector:
     def ensure_table(self, table: Table):
         """
         Create table for given table class if it doesn't exists.
+        The check is done only once per process for each table and database.
         """
-        table.create(bind=self.engine, checkfirst=True)
+        url = str(self.engine.url)
+        with _ensured_tables_lock:
+            urls = _ensured_tables.setdefault(table, set())
+            if url in urls:
+                return
+            table.create(bind=self.engine, checkfirst=True)
+            urls.add(url)
         logging.info(f"Created table {table.name}.")
 
+    def ensure_partitions(self, table: Table, timestamps):
+        """
+        Create monthly partitions of partitioned result table needed to store rows
+        with given `task_ts` values. Each partition is checked only once per process.
+        """
+        url = str(self.engine.url)
+        with _ensured_partitions_lock:
+            known = _ensured_partitions.setdefault(table, set())
+            for month in sorted(months_for(timestamps)):
+                if (url, month) in known:
+                    continue
+                create_partition(self.engine, table.schema, table.name, month)
+                known.add((url, month))
+
+    def drop_expired_partitions(
+        self, table: Table, older_than: Union[date, datetime]
+    ) -> List[str]:
+        """
+        Drop partitions of partitioned result table, that have only rows with `task_ts`
+        older than `older_than`. Unlike delete, it's instant and leaves no bloat behind.
+        :return: names of dropped partitions
+        """
+        dropped = drop_partitions_before(
+            self.engine, table.schema, table.name, older_than
+        )
+        url = str(self.engine.url)
+        with _ensured_partitions_lock:
+            known = _ensured_partitions.get(table, set())
+            for name in dropped:
+                known.discard((url, partition_start(name)))
+        return dropped
+
     @staticmethod
     def model2dict(obj):
         """
@@ -58,28 +184,83 @@ class Connector:
         a.pop("_sa_instance_state", None)
         return a
 
-    def upsert(self, objs):
+    @property
+    def supports_copy(self):
+        return self.engine.dialect.driver == "psycopg2"
+
+    def upsert(
+        self,
+        objs,
+        chunk_size: int = UPSERT_CHUNK_SIZE,
+        use_copy: Optional[bool] = None,
+        delta: bool = False,
+    ):
         """
-        Insert on conflict do update.
+        Insert on conflict do update. See `upsert_rows`.
+        :param delta: see `upsert_rows`, key and compared columns are taken from
+            `_delta_key` and `_delta_columns` of the objects' class
         """
-        logging.info(f"Upserting {len(objs)} results.")
-
+        if not objs:
+            return
         data = []
         for o in objs:
             data.append(self.model2dict(o))
+        delta_options = {}
+        if delta:
+            cls = objs[0].__class__
+            delta_options = {
+                "delta_key": cls._delta_key,
+                "delta_columns": cls._delta_columns,
+            }
+        self.upsert_rows(objs[0].__table__, data, chunk_size, use_copy, **delta_options)
 
-        table = objs[0].__table__
-        stmt = insert(table).values(data)
-        conflicting_cols = get_unique_constraint_names(table)
-        excluded_set = {k: getattr(stmt.excluded, k) for k in data[0].keys()}
+    def upsert_rows(
+        self,
+        table: Table,
+        data: List[dict],
+        chunk_size: int = UPSERT_CHUNK_SIZE,
+        use_copy: Optional[bool] = None,
+        delta_key: Optional[Sequence[str]] = None,
+        delta_columns: Optional[Sequence[str]] = None,
+    ):
+        """
+        Insert plain dicts of column values to `table`, on conflict do update.
 
-        on_update_stmt = stmt.on_conflict_do_update(
-            index_elements=conflicting_cols, set_=excluded_set
-        )
+        Big batches are streamed with `COPY` into a temporary table and merged into the target
+        with one `INSERT ... SELECT ... ON CONFLICT DO UPDATE`. Smaller ones (or if driver
+        doesn't support `COPY`) are inserted in multi-row inserts of `chunk_size` rows.
+        Everything is done in one transaction. Missing partitions of partitioned tables
+        are created beforehand.
+        :param use_copy: force/forbid `COPY`, by default used for COPY_THRESHOLD rows and more
+        :param delta_key: enables delta mode - each row is compared with the latest stored row
+            of the same `delta_key` (e.g. rule). If `delta_columns` are the same, only
+            `last_seen` of the stored row is moved to the row's `task_ts`, nothing is inserted.
+        """
+        if not data:
+            return
+        logging.info(f"Upserting {len(data)} results.")
+
+        if use_copy is None:
+            use_copy = self.supports_copy and len(data) >= COPY_THRESHOLD
+        if table.info.get("partitioned"):
+            self.ensure_partitions(table, {row[PARTITION_COLUMN] for row in data})
 
         session = self.make_session()
         try:
-            session.execute(on_update_stmt)
+            if delta_key:
+                data, unchanged = self._split_unchanged(
+                    session, table, data, delta_key, delta_columns
+                )
+                self._extend_last_seen(session, table, unchanged)
+                logging.info(f"{len(unchanged)} results are unchanged.")
+            if use_copy and data:
+                self._copy_upsert(session, table, data)
+            else:
+                for chunk in chunked(data, chunk_size):
+                    stmt = insert(table).values(chunk)
+                    session.execute(
+                        self._on_conflict_do_update(stmt, table, data[0].keys())
+                    )
             session.commit()
         except:
             session.rollback()
@@ -87,6 +268,127 @@ class Connector:
         finally:
             session.close()
 
+        if self.history_cache is not None:
+            self.history_cache.append(table.fullname, data)
+
+    @staticmethod
+    def _on_conflict_do_update(stmt, table: Table, columns):
+        conflicting_cols = get_unique_constraint_names(table)
+        excluded_set = {k: getattr(stmt.excluded, k) for k in columns}
+        return stmt.on_conflict_do_update(
+            index_elements=conflicting_cols, set_=excluded_set
+        )
+
+    @staticmethod
+    def _split_unchanged(
+        session,
+        table: Table,
+        data: List[dict],
+        key: Sequence[str],
+        columns: Sequence[str],
+    ) -> Tuple[List[dict], List[Tuple[Any, Any]]]:
+        """
+        Split rows to the ones to upsert and the unchanged ones - those that have
+        the same `columns` as the latest stored row of their `key` with older task_ts.
+        `time_filter` in `key` is compared without the time it was evaluated at.
+        :return: (rows to upsert, [(id of stored row, task_ts of the unchanged row)])
+        """
+
+        def identity(row):
+            return tuple(
+                stable_time_filter(row[k]) if k == "time_filter" else row[k]
+                for k in key
+            )
+
+        key_exprs = [
+            stable_time_filter_sql(table.c[k]) if k == "time_filter" else table.c[k]
+            for k in key
+        ]
+        identities = list({identity(row) for row in data})
+        stmt = (
+            select(
+                [
+                    *[table.c[k] for k in key],
+                    table.c.id,
+                    table.c.task_ts,
+                    *[table.c[c] for c in columns],
+                ]
+            )
+            .distinct(*key_exprs)
+            .where(
+                and_(
+                    tuple_(*key_exprs).in_(identities),
+                    table.c.task_ts <= max(row["task_ts"] for row in data),
+                )
+            )
+            .order_by(*key_exprs, table.c.task_ts.desc())
+        )
+        latest = {identity(r): r for r in session.execute(stmt)}
+
+        changed, unchanged = [], []
+        for row in data:
+            stored = latest.get(identity(row))
+            # stored task_ts is tz aware, the one of the run is usually naive
+            if (
+                stored is not None
+                and _naive(stored["task_ts"]) < _naive(row["task_ts"])
+                and all(stored[c] == row.get(c) for c in columns)
+            ):
+                unchanged.append((stored["id"], row["task_ts"]))
+            else:
+                changed.append(row)
+        return changed, unchanged
+
+    @staticmethod
+    def _extend_last_seen(session, table: Table, unchanged: List[Tuple[Any, Any]]):
+        if not unchanged:
+            return
+        stmt = (
+            table.update()
+            .where(table.c.id == bindparam("stored_id"))
+            .values(
+                last_seen=func.greatest(
+                    func.coalesce(table.c.last_seen, table.c.task_ts),
+                    bindparam("seen_ts"),
+                )
+            )
+        )
+        session.execute(
+            stmt, [{"stored_id": id_, "seen_ts": ts} for id_, ts in unchanged]
+        )
+
+    def _copy_upsert(self, session, table: Table, data: List[dict]):
+        """
+        Stream `data` to a temporary table with `COPY` and upsert it from there.
+        """
+        columns = list(data[0].keys())
+        preparer = self.engine.dialect.identifier_preparer
+        quoted_columns = ", ".join(preparer.quote(c) for c in columns)
+        tmp_name = f"contessa_upsert_{uuid4().hex}"
+
+        session.execute(
+            text(
+                f"""
+                CREATE TEMPORARY TABLE {tmp_name} ON COMMIT DROP AS
+                SELECT {quoted_columns} FROM {preparer.format_table(table)} WITH NO DATA
+            """
+            )
+        )
+
+        buffer = io.StringIO()
+        for row in data:
+            buffer.write("\t".join(copy_text_value(row[c]) for c in columns))
+            buffer.write("\n")
+        buffer.seek(0)
+        cursor = session.connection().connection.cursor()
+        cursor.copy_expert(f"COPY {tmp_name} ({quoted_columns}) FROM STDIN", buffer)
+
+        tmp_table = sql_table(tmp_name, *[column(c) for c in columns])
+        stmt = insert(table).from_select(
+            columns, select([tmp_table.c[c] for c in columns])
+        )
+        session.execute(self._on_conflict_do_update(stmt, table, columns))
+
     def get_column_names(self, table_full_name: str) -> List:
         schema_query = f"""
                 SELECT
@@ -98,6 +400,29 @@ class Connector:
 
         return [col[0] for col in self.get_records(schema_query)]
 
+    def get_column_names_of_tables(
+        self, table_full_names: List[str]
+    ) -> Dict[str, List[str]]:
+        """
+        Same as `get_column_names` for many tables by one query.
+        :return: full table name -> column names
+        """
+        if not table_full_names:
+            return {}
+        names = ", ".join(f"'{name}'" for name in sorted(set(table_full_names)))
+        schema_query = f"""
+                SELECT
+                    concat(table_schema, '.', table_name), column_name
+                FROM information_schema.columns
+                WHERE concat(table_schema, '.', table_name) IN ({names})
+                ORDER BY table_schema, table_name, ordinal_position
+            """
+
+        ret = {}
+        for table, column in self.get_records(schema_query):
+            ret.setdefault(table, []).append(column)
+        return ret
+
 
 def get_unique_constraint_names(table):
     """
@@ -116,3 +441,25 @@ def get_unique_constraint_names(table):
     else:  # 1
         u = unique_constraint[0]
         return [c.name for c in u.columns]
+
+
+def copy_text_value(value: Any) -> str:
+    """
+    Format value for `COPY ... FROM STDIN` in postgres text format.
+    """
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        value = "t" if value else "f"
+    elif isinstance(value, date):
+        value = value.isoformat()
+    elif isinstance(value, (dict, list)):
+        value = json.dumps(value, default=str)
+    else:
+        value = str(value)
+    return (
+        value.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
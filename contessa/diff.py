@@ -0,0 +1,914 @@
+"""
+Diff algorithms of `ConsistencyChecker`.
+"""
+import heapq
+import logging
+import os
+import pickle
+import tempfile
+from array import array
+from datetime import date, datetime
+from decimal import Decimal
+from hashlib import blake2b
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from contessa.db import Connector
+from contessa.failed_examples import ExampleSelector
+from contessa.utils import AggregatedResult, chunked, read_ahead, run_concurrently
+
+# digest and 64-bit hash of the whole row of `src`
+ROW_DIGEST_SQL = "md5(src::text)"
+ROW_HASH_SQL = f"('x' || substr({ROW_DIGEST_SQL}, 1, 16))::bit(64)::bigint"
+# text of a row depends on these settings, they are pinned for the transaction on both sides
+# before rows are digested, so the digests of the same rows are the same (as long as both
+# servers are of the same major version, e.g. floats are printed differently before 12)
+DIGEST_SETTINGS_SQL = (
+    "SET LOCAL TimeZone = 'UTC'; "
+    "SET LOCAL DateStyle = 'ISO, MDY'; "
+    "SET LOCAL IntervalStyle = 'postgres'; "
+    "SET LOCAL extra_float_digits = 3; "
+    "SET LOCAL bytea_output = 'hex'"
+)
+# key hashes are non-negative 31-bit, so buckets can be split until the modulus reaches 2^31
+MAX_MODULUS = 2 ** 31
+
+# classes of differences of `key_merge_diff`
+MISSING = "missing"
+EXTRA = "extra"
+CHANGED = "changed"
+
+
+def diff_sets(
+    left_rows: Iterable[Tuple],
+    right_rows: Iterable[Tuple],
+    example_selector: ExampleSelector,
+) -> AggregatedResult:
+    """
+    Compare rows of both sides as sets.
+    """
+    left_set = set(left_rows)
+    right_set = set(right_rows)
+    common = left_set.intersection(right_set)
+    passed = len(common)
+    failed = (len(left_set) - len(common)) + (len(right_set) - len(common))
+    failed_examples = example_selector.select_examples(
+        left_set.symmetric_difference(right_set)
+    )
+    return AggregatedResult(
+        total_records=failed + passed,
+        failed=failed,
+        passed=passed,
+        failed_example=list(failed_examples),
+    )
+
+
+def as_subquery(query: str) -> str:
+    return query.strip().rstrip(";")
+
+
+def distinct_sorted(rows: Iterable[Tuple]) -> Iterator[Tuple]:
+    """
+    Skip rows with the same first item (digest) as the previous one.
+    """
+    previous = None
+    for row in rows:
+        if row[0] != previous:
+            previous = row[0]
+            yield row
+
+
+def merge_diff(
+    left_rows: Iterable[Tuple],
+    right_rows: Iterable[Tuple],
+    example_selector: ExampleSelector,
+) -> AggregatedResult:
+    """
+    Same as `diff_sets`, but both sides are streams of (digest, *row) sorted by digest,
+    walked at once like by merge join. Only current rows and at most `example_selector.limit`
+    failed rows are kept in memory.
+    """
+    left, right = distinct_sorted(left_rows), distinct_sorted(right_rows)
+    failed = passed = 0
+    failed_rows = []
+
+    def fail(row):
+        nonlocal failed
+        failed += 1
+        if example_selector.limit is None or len(failed_rows) < example_selector.limit:
+            failed_rows.append(tuple(row[1:]))
+
+    l, r = next(left, None), next(right, None)
+    while l is not None or r is not None:
+        if r is None or (l is not None and l[0] < r[0]):
+            fail(l)
+            l = next(left, None)
+        elif l is None or r[0] < l[0]:
+            fail(r)
+            r = next(right, None)
+        else:
+            passed += 1
+            l, r = next(left, None), next(right, None)
+
+    return AggregatedResult(
+        total_records=failed + passed,
+        failed=failed,
+        passed=passed,
+        failed_example=list(example_selector.select_examples(set(failed_rows))),
+    )
+
+
+def key_merge_diff(
+    left_rows: Iterable[Tuple],
+    right_rows: Iterable[Tuple],
+    example_selector: ExampleSelector,
+) -> AggregatedResult:
+    """
+    Diff of streams of (key digest, row digest, *row) sorted by key digest. Each key is
+    classified as same, missing (on the right side), extra (on the right side) or changed
+    (on both sides with different rows). Only the first row of duplicated keys is compared.
+
+    `failed_example` is a dict with count and examples of each class, examples of changed
+    keys are pairs (left row, right row).
+    """
+    left, right = distinct_sorted(left_rows), distinct_sorted(right_rows)
+    passed = 0
+    counts = {MISSING: 0, EXTRA: 0, CHANGED: 0}
+    examples = {MISSING: [], EXTRA: [], CHANGED: []}
+
+    def fail(kind, example):
+        counts[kind] += 1
+        limit = example_selector.limit
+        if limit is None or len(examples[kind]) < limit:
+            examples[kind].append(example)
+
+    l, r = next(left, None), next(right, None)
+    while l is not None or r is not None:
+        if r is None or (l is not None and l[0] < r[0]):
+            fail(MISSING, tuple(l[2:]))
+            l = next(left, None)
+        elif l is None or r[0] < l[0]:
+            fail(EXTRA, tuple(r[2:]))
+            r = next(right, None)
+        else:
+            if l[1] == r[1]:
+                passed += 1
+            else:
+                fail(CHANGED, (tuple(l[2:]), tuple(r[2:])))
+            l, r = next(left, None), next(right, None)
+
+    failed = sum(counts.values())
+    return AggregatedResult(
+        total_records=failed + passed,
+        failed=failed,
+        passed=passed,
+        failed_example={
+            kind: {
+                "count": counts[kind],
+                "examples": list(example_selector.select_examples(set(examples[kind]))),
+            }
+            for kind in counts
+        },
+    )
+
+
+def merge_results(
+    results: List[AggregatedResult], example_selector: ExampleSelector
+) -> AggregatedResult:
+    """
+    Sum of results of diffs of parts (e.g. key ranges) of the same tables.
+    """
+    examples = [r.failed_example for r in results if r.failed_example]
+    if examples and isinstance(examples[0], dict):
+        # `key_merge_diff` results
+        failed_example = {
+            kind: {
+                "count": sum(e[kind]["count"] for e in examples),
+                "examples": list(
+                    example_selector.select_examples(
+                        {x for e in examples for x in e[kind]["examples"]}
+                    )
+                ),
+            }
+            for kind in (MISSING, EXTRA, CHANGED)
+        }
+    else:
+        failed_example = list(
+            example_selector.select_examples({x for e in examples for x in e})
+        )
+    return AggregatedResult(
+        total_records=sum(r.total_records for r in results),
+        failed=sum(r.failed for r in results),
+        passed=sum(r.passed for r in results),
+        failed_example=failed_example,
+    )
+
+
+def sql_literal(value: Any) -> str:
+    """
+    Value as sql literal, for boundaries of key ranges. `%` is doubled as in rendered sqls.
+    """
+    if value is None:
+        return "NULL"
+    if isinstance(value, (bool, int, float, Decimal)):
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        return f"'{value.isoformat()}'"
+    return "'{}'".format(str(value).replace("'", "''").replace("%", "%%"))
+
+
+def split_range(lower: Any, upper: Any, count: int) -> List[Any]:
+    """
+    Inner boundaries splitting [lower, upper] to `count` ranges of the same size,
+    for numeric and date/time keys.
+    """
+    boundaries = []
+    for i in range(1, count):
+        if isinstance(lower, int) and not isinstance(lower, bool):
+            b = lower + (upper - lower) * i // count
+        else:
+            b = lower + (upper - lower) * i / count
+        if b > lower and b < upper and (not boundaries or b > boundaries[-1]):
+            boundaries.append(b)
+    return boundaries
+
+
+def _same_type(values: List[Any]) -> List[Any]:
+    """
+    Bounds of both sides converted to one type, if the types of the key differ (e.g. numeric
+    and double precision, or date and timestamp), so they can be subtracted.
+    """
+    numbers = all(
+        isinstance(v, (int, float, Decimal)) and not isinstance(v, bool) for v in values
+    )
+    if numbers and any(isinstance(v, float) for v in values):
+        return [float(v) for v in values]
+    if all(isinstance(v, date) for v in values) and any(
+        isinstance(v, datetime) for v in values
+    ):
+        return [
+            v if isinstance(v, datetime) else datetime.combine(v, datetime.min.time())
+            for v in values
+        ]
+    return values
+
+
+def range_queries(query: str, column: str, boundaries: List[Any]) -> List[str]:
+    """
+    `query` restricted to ranges of `column` between the `boundaries`. Ranges cover all
+    the rows - the first and the last are unbounded and rows with NULL key have own range.
+    """
+    literals = [sql_literal(b) for b in boundaries]
+    conditions = [f"{column} IS NULL"]
+    lower = None
+    for upper in literals + [None]:
+        condition = " AND ".join(
+            c
+            for c in (
+                f"{column} >= {lower}" if lower is not None else None,
+                f"{column} < {upper}" if upper is not None else None,
+            )
+            if c
+        )
+        conditions.append(condition or f"{column} IS NOT NULL")
+        lower = upper
+    return [
+        f"SELECT * FROM ({as_subquery(query)}) AS src WHERE {c}" for c in conditions
+    ]
+
+
+def key_boundaries(
+    left_conn: Connector,
+    right_conn: Connector,
+    left_query: str,
+    right_query: str,
+    column: str,
+    count: int,
+) -> List[Any]:
+    """
+    Boundaries splitting rows of both sides to `count` ranges of `column`. Numeric and
+    date/time keys are split evenly between min and max of both sides, other keys
+    by quantiles of the left side.
+    """
+    left, right = run_concurrently(
+        lambda: left_conn.get_records(
+            f"SELECT min({column}), max({column}) FROM ({as_subquery(left_query)}) AS src"
+        ).first(),
+        lambda: right_conn.get_records(
+            f"SELECT min({column}), max({column}) FROM ({as_subquery(right_query)}) AS src"
+        ).first(),
+    )
+    bounds = _same_type([v for v in (*left, *right) if v is not None])
+    if not bounds:
+        return []
+    lower, upper = min(bounds), max(bounds)
+    if isinstance(lower, (int, float, Decimal, date, datetime)):
+        return split_range(lower, upper, count)
+
+    fractions = ", ".join(str(i / count) for i in range(1, count))
+    quantiles = left_conn.get_records(
+        f"""
+        SELECT percentile_disc(ARRAY[{fractions}]) WITHIN GROUP (ORDER BY {column})
+        FROM ({as_subquery(left_query)}) AS src
+    """
+    ).scalar()
+    return sorted({q for q in quantiles or [] if q is not None})
+
+
+def stream_rows(conn: Connector, sql: str) -> Iterator[Tuple]:
+    """
+    Rows of the query fetched by server-side cursor (if the database supports it).
+    """
+    logging.debug(sql)
+    with conn.engine.connect() as con:
+        for row in con.execution_options(stream_results=True).execute(sql):
+            yield tuple(row)
+
+
+def _canonical(value: Any) -> Any:
+    """
+    Equal numbers of different types (e.g. `1`, `1.0` and `Decimal(1)`, or `1.5`
+    and `Decimal("1.5")`) have the same representation. Integral numbers are ints, others
+    normalized decimals, floats are taken by their shortest repr (so `0.1` is the same
+    as `Decimal("0.1")` of a numeric column).
+    """
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, float):
+        if value != value or value in (float("inf"), float("-inf")):
+            return value
+        value = Decimal(repr(value))
+    if isinstance(value, Decimal):
+        if not value.is_finite():
+            return value
+        if value == value.to_integral_value():
+            return int(value)
+        return value.normalize()
+    if isinstance(value, tuple):
+        return tuple(_canonical(v) for v in value)
+    return value
+
+
+def fingerprint(row: Tuple) -> int:
+    """
+    Unsigned 64-bit fingerprint of the row, blake2b digest of canonical repr of its values.
+    """
+    digest = blake2b(repr(_canonical(row)).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def _sorted_unique(values: Iterable[int], run_size: int = 1_000_000) -> array:
+    """
+    Sorted unique values as `array("Q")`. Values are sorted in runs of `run_size`,
+    which are merged, so only one run is held as python ints at once.
+    """
+    runs = [array("Q", sorted(chunk)) for chunk in chunked(values, run_size)]
+    ret = array("Q")
+    previous = None
+    for value in heapq.merge(*runs):
+        if value != previous:
+            ret.append(value)
+            previous = value
+    return ret
+
+
+def fingerprints(rows: Iterable[Tuple]):
+    """
+    Sorted unique fingerprints of the rows, numpy array if numpy is installed,
+    `array("Q")` otherwise.
+    """
+    try:
+        import numpy
+    except ImportError:
+        return _sorted_unique(fingerprint(r) for r in rows)
+    return numpy.unique(
+        numpy.fromiter((fingerprint(r) for r in rows), dtype=numpy.uint64)
+    )
+
+
+def compare_sorted(
+    left, right, limit: Optional[int]
+) -> Tuple[int, int, int, List[int], List[int]]:
+    """
+    Compare sorted unique fingerprints.
+    :return: number of common, left only and right only fingerprints and at most
+        `limit` (None for all) of left only and right only ones
+    """
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+    if numpy is not None and isinstance(left, numpy.ndarray):
+        common = numpy.intersect1d(left, right, assume_unique=True)
+        left_only = numpy.setdiff1d(left, right, assume_unique=True)
+        right_only = numpy.setdiff1d(right, left, assume_unique=True)
+        return (
+            len(common),
+            len(left_only),
+            len(right_only),
+            [int(x) for x in left_only[:limit]],
+            [int(x) for x in right_only[:limit]],
+        )
+
+    common = 0
+    left_only, right_only = [], []
+    left_count = right_count = 0
+    i = j = 0
+    while i < len(left) or j < len(right):
+        if j == len(right) or (i < len(left) and left[i] < right[j]):
+            left_count += 1
+            if limit is None or len(left_only) < limit:
+                left_only.append(left[i])
+            i += 1
+        elif i == len(left) or right[j] < left[i]:
+            right_count += 1
+            if limit is None or len(right_only) < limit:
+                right_only.append(right[j])
+            j += 1
+        else:
+            common += 1
+            i += 1
+            j += 1
+    return common, left_count, right_count, left_only, right_only
+
+
+def key_hash_sql(key_columns: Optional[List[str]]) -> str:
+    """
+    Non-negative 31-bit hash of the key of `src` row, the whole row if there is no key.
+    """
+    key = f"row({', '.join(key_columns)})" if key_columns else "src"
+    return f"(hashtext({key}::text) & 2147483647)"
+
+
+def with_digest_settings(sql: str) -> str:
+    """
+    `sql` preceded by `DIGEST_SETTINGS_SQL`, in one transaction.
+    """
+    return f"{DIGEST_SETTINGS_SQL};\n{sql}"
+
+
+def fetch_rows_by_digest(
+    conn: Connector, query: str, digests: List[str]
+) -> List[Tuple]:
+    """
+    Full rows of `query` with given `ROW_DIGEST_SQL` digests.
+    """
+    if not digests:
+        return []
+    sql = f"""
+        SELECT src.*
+        FROM ({as_subquery(query)}) AS src
+        WHERE {ROW_DIGEST_SQL} IN ({', '.join(f"'{d}'" for d in digests)})
+    """
+    logging.debug(sql)
+    return [tuple(r.values()) for r in conn.get_records(with_digest_settings(sql))]
+
+
+class DigestDiff:
+    """
+    Diff of two queries that transfers only key and digest of each row, instead of all
+    the columns. Rows are compared as sets of (key, digest), a row with changed columns
+    is counted as missing on one side and extra on the other, same as by `diff_sets`.
+
+    Example selector chooses from (key, digest) tuples, full rows of the chosen examples
+    are fetched afterwards. Both sides have to be postgres.
+    """
+
+    def __init__(self, left_conn: Connector, right_conn: Connector):
+        self.left_conn = left_conn
+        self.right_conn = right_conn
+
+    def diff(
+        self,
+        left_query: str,
+        right_query: str,
+        key_columns: Optional[List[str]],
+        example_selector: ExampleSelector,
+    ) -> AggregatedResult:
+        left, right = run_concurrently(
+            lambda: self.fetch_digests(self.left_conn, left_query, key_columns),
+            lambda: self.fetch_digests(self.right_conn, right_query, key_columns),
+        )
+        result = diff_sets(left, right, example_selector)
+
+        # digest is the last item, the rest is key
+        examples = set(result.failed_example)
+        left_digests = [e[-1] for e in examples if e in left]
+        right_digests = [e[-1] for e in examples if e in right]
+        left_examples, right_examples = run_concurrently(
+            lambda: fetch_rows_by_digest(self.left_conn, left_query, left_digests),
+            lambda: fetch_rows_by_digest(self.right_conn, right_query, right_digests),
+        )
+        failed_example = left_examples + right_examples
+        return AggregatedResult(
+            total_records=result.total_records,
+            failed=result.failed,
+            passed=result.passed,
+            failed_example=failed_example,
+        )
+
+    @staticmethod
+    def digest_query(query: str, key_columns: Optional[List[str]]) -> str:
+        key = f"{', '.join(key_columns)}, " if key_columns else ""
+        return f"SELECT {key}{ROW_DIGEST_SQL} FROM ({as_subquery(query)}) AS src"
+
+    def fetch_digests(
+        self, conn: Connector, query: str, key_columns: Optional[List[str]]
+    ) -> Set[Tuple]:
+        sql = self.digest_query(query, key_columns)
+        logging.debug(sql)
+        return {tuple(r.values()) for r in conn.get_records(with_digest_settings(sql))}
+
+
+class MergeDiff:
+    """
+    Diff of two queries with constant memory. Rows of both sides are ordered by their digest
+    in the database (with "C" collation, so the order is the same as of python strings),
+    read through server-side cursors and compared by `merge_diff`. Both sides have
+    to be postgres.
+    """
+
+    merge = staticmethod(merge_diff)
+
+    def __init__(self, left_conn: Connector, right_conn: Connector):
+        self.left_conn = left_conn
+        self.right_conn = right_conn
+
+    def diff(
+        self,
+        left_query: str,
+        right_query: str,
+        key_columns: Optional[List[str]],
+        example_selector: ExampleSelector,
+    ) -> AggregatedResult:
+        with self.left_conn.engine.connect() as left_con:
+            with self.right_conn.engine.connect() as right_con:
+                # each side is fetched in its own thread, while they are merged
+                return self.merge(
+                    read_ahead(
+                        self.stream(
+                            left_con, self.sorted_query(left_query, key_columns)
+                        )
+                    ),
+                    read_ahead(
+                        self.stream(
+                            right_con, self.sorted_query(right_query, key_columns)
+                        )
+                    ),
+                    example_selector,
+                )
+
+    @staticmethod
+    def sorted_query(query: str, key_columns: Optional[List[str]] = None) -> str:
+        return f"""
+            SELECT {ROW_DIGEST_SQL} AS digest, src.*
+            FROM ({as_subquery(query)}) AS src
+            ORDER BY {ROW_DIGEST_SQL} COLLATE "C"
+        """
+
+    @staticmethod
+    def stream(con, sql: str) -> Iterator[Tuple]:
+        logging.debug(sql)
+        # server-side cursor can't run more statements, settings are set in its transaction
+        con.execute(DIGEST_SETTINGS_SQL)
+        for row in con.execution_options(stream_results=True).execute(sql):
+            yield tuple(row)
+
+
+class KeyDiff(MergeDiff):
+    """
+    Diff of two queries by `key_columns`, see `key_merge_diff`. Rows are ordered by digest
+    of their key in the database and compared in one pass with constant memory.
+    Both sides have to be postgres.
+    """
+
+    merge = staticmethod(key_merge_diff)
+
+    @staticmethod
+    def sorted_query(query: str, key_columns: Optional[List[str]] = None) -> str:
+        if not key_columns:
+            raise ValueError("Key diff needs `key_columns`.")
+        key_digest = f"md5(row({', '.join(key_columns)})::text)"
+        return f"""
+            SELECT {key_digest} AS key_digest, {ROW_DIGEST_SQL} AS digest, src.*
+            FROM ({as_subquery(query)}) AS src
+            ORDER BY {key_digest} COLLATE "C"
+        """
+
+
+class FingerprintDiff:
+    """
+    Same as `diff_sets`, but rows are kept as sorted 64-bit fingerprints (8 bytes per row
+    instead of a tuple of python objects). Works with any database. Rows of the selected
+    failed examples are fetched again by their fingerprint.
+
+    Set operations are vectorized if numpy is installed (`pip install contessa[numpy]`).
+    Different rows can have the same fingerprint with a negligible probability (2^-64
+    per pair of rows).
+    """
+
+    def __init__(self, left_conn: Connector, right_conn: Connector):
+        self.left_conn = left_conn
+        self.right_conn = right_conn
+
+    def diff(
+        self,
+        left_query: str,
+        right_query: str,
+        key_columns: Optional[List[str]],
+        example_selector: ExampleSelector,
+    ) -> AggregatedResult:
+        left, right = run_concurrently(
+            lambda: fingerprints(stream_rows(self.left_conn, left_query)),
+            lambda: fingerprints(stream_rows(self.right_conn, right_query)),
+        )
+        passed, left_failed, right_failed, left_only, right_only = compare_sorted(
+            left, right, example_selector.limit
+        )
+        left_rows, right_rows = run_concurrently(
+            lambda: self.fetch_by_fingerprint(self.left_conn, left_query, left_only),
+            lambda: self.fetch_by_fingerprint(self.right_conn, right_query, right_only),
+        )
+        return AggregatedResult(
+            total_records=passed + left_failed + right_failed,
+            failed=left_failed + right_failed,
+            passed=passed,
+            failed_example=list(
+                example_selector.select_examples(set(left_rows + right_rows))
+            ),
+        )
+
+    @staticmethod
+    def fetch_by_fingerprint(
+        conn: Connector, query: str, wanted: List[int]
+    ) -> List[Tuple]:
+        if not wanted:
+            return []
+        wanted = set(wanted)
+        return [r for r in stream_rows(conn, query) if fingerprint(r) in wanted]
+
+
+class SpillDiff:
+    """
+    Same as `diff_sets` for row sets larger than memory. Both sides are hash-partitioned
+    to temporary run files (`partitions` of them) and compared partition by partition.
+    A partition with more than `memory_rows` rows on one side is partitioned again,
+    so at most about `memory_rows` rows of each side are held in memory. Works with
+    any database.
+    """
+
+    # limit of re-partitioning, partitions of many equal rows can't get smaller
+    max_level = 4
+
+    def __init__(
+        self,
+        left_conn: Connector,
+        right_conn: Connector,
+        memory_rows: int = 1_000_000,
+        partitions: int = 64,
+        directory: Optional[str] = None,
+    ):
+        """
+        :param directory: where to create the run files, system temp dir by default
+        """
+        self.left_conn = left_conn
+        self.right_conn = right_conn
+        self.memory_rows = memory_rows
+        self.partitions = partitions
+        self.directory = directory
+
+    def diff(
+        self,
+        left_query: str,
+        right_query: str,
+        key_columns: Optional[List[str]],
+        example_selector: ExampleSelector,
+    ) -> AggregatedResult:
+        with tempfile.TemporaryDirectory(dir=self.directory) as tmp:
+            left, right = run_concurrently(
+                lambda: self.spill(
+                    stream_rows(self.left_conn, left_query), tmp, "left", 0
+                ),
+                lambda: self.spill(
+                    stream_rows(self.right_conn, right_query), tmp, "right", 0
+                ),
+            )
+            return self.diff_partitions(left, right, tmp, 0, example_selector)
+
+    def spill(
+        self, rows: Iterable[Tuple], directory: str, prefix: str, level: int
+    ) -> List[Tuple[str, int]]:
+        """
+        Write rows to run files by their hash.
+        :return: path and number of rows of each partition
+        """
+        paths = [
+            os.path.join(directory, f"{prefix}_{level}_{i}")
+            for i in range(self.partitions)
+        ]
+        counts = [0] * self.partitions
+        files = [open(path, "wb") for path in paths]
+        try:
+            for row in rows:
+                # hash is salted by level, so rows are split differently on each level
+                i = fingerprint((level, row)) % self.partitions
+                pickle.dump(row, files[i], pickle.HIGHEST_PROTOCOL)
+                counts[i] += 1
+        finally:
+            for f in files:
+                f.close()
+        return list(zip(paths, counts))
+
+    @staticmethod
+    def read(path: str) -> Iterator[Tuple]:
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
+
+    def diff_partitions(
+        self,
+        left: List[Tuple[str, int]],
+        right: List[Tuple[str, int]],
+        directory: str,
+        level: int,
+        example_selector: ExampleSelector,
+    ) -> AggregatedResult:
+        results = []
+        for i, ((left_path, left_count), (right_path, right_count)) in enumerate(
+            zip(left, right)
+        ):
+            if (
+                max(left_count, right_count) <= self.memory_rows
+                or level >= self.max_level
+            ):
+                results.append(
+                    diff_sets(
+                        self.read(left_path), self.read(right_path), example_selector
+                    )
+                )
+            else:
+                prefix = f"{i}_{level}"
+                results.append(
+                    self.diff_partitions(
+                        self.spill(
+                            self.read(left_path), directory, f"left_{prefix}", level + 1
+                        ),
+                        self.spill(
+                            self.read(right_path),
+                            directory,
+                            f"right_{prefix}",
+                            level + 1,
+                        ),
+                        directory,
+                        level + 1,
+                        example_selector,
+                    )
+                )
+            os.remove(left_path)
+            os.remove(right_path)
+        return merge_results(results, example_selector)
+
+
+class HashDiff:
+    """
+    Diff of two queries without transferring the rows. Rows of each side are hashed
+    to buckets by their key and each side computes digest of every bucket (count and sum
+    of 64-bit row hashes) in the database. Buckets that are the same on both sides are
+    counted as passed. Mismatched buckets are split to `fanout` smaller buckets and
+    compared again, until they hold at most `leaf_rows` rows in total. Only rows
+    of those are fetched and compared as sets.
+
+    So transfer scales with number of differences, not with the size of the tables.
+    Both sides have to be postgres. Rows are compared as sets, same as by `diff_sets`,
+    so duplicated rows are counted once.
+    """
+
+    def __init__(
+        self,
+        left_conn: Connector,
+        right_conn: Connector,
+        fanout: int = 64,
+        leaf_rows: int = 10_000,
+    ):
+        self.left_conn = left_conn
+        self.right_conn = right_conn
+        self.fanout = fanout
+        self.leaf_rows = leaf_rows
+
+    def diff(
+        self,
+        left_query: str,
+        right_query: str,
+        key_columns: Optional[List[str]],
+        example_selector: ExampleSelector,
+    ) -> AggregatedResult:
+        left_query, right_query = as_subquery(left_query), as_subquery(right_query)
+        key_hash = key_hash_sql(key_columns)
+        passed = 0
+        modulus, parent_modulus, parents = self.fanout, None, None
+        while True:
+            left, right = run_concurrently(
+                lambda: self.bucket_digests(
+                    self.left_conn,
+                    left_query,
+                    key_hash,
+                    modulus,
+                    parent_modulus,
+                    parents,
+                ),
+                lambda: self.bucket_digests(
+                    self.right_conn,
+                    right_query,
+                    key_hash,
+                    modulus,
+                    parent_modulus,
+                    parents,
+                ),
+            )
+            mismatched = []
+            mismatched_rows = 0
+            for bucket in left.keys() | right.keys():
+                left_digest, right_digest = left.get(bucket), right.get(bucket)
+                if left_digest == right_digest:
+                    passed += left_digest[0]
+                else:
+                    mismatched.append(bucket)
+                    mismatched_rows += max(
+                        left_digest[0] if left_digest else 0,
+                        right_digest[0] if right_digest else 0,
+                    )
+            logging.info(
+                f"Hash diff: {len(mismatched)} of {modulus} buckets differ "
+                f"({mismatched_rows} rows)."
+            )
+            if not mismatched:
+                return AggregatedResult(
+                    total_records=passed, failed=0, passed=passed, failed_example=[]
+                )
+            if mismatched_rows <= self.leaf_rows or modulus * self.fanout > MAX_MODULUS:
+                break
+            modulus, parent_modulus, parents = (
+                modulus * self.fanout,
+                modulus,
+                mismatched,
+            )
+
+        left_rows, right_rows = run_concurrently(
+            lambda: self.bucket_rows(
+                self.left_conn, left_query, key_hash, modulus, mismatched
+            ),
+            lambda: self.bucket_rows(
+                self.right_conn, right_query, key_hash, modulus, mismatched
+            ),
+        )
+        leaves = diff_sets(left_rows, right_rows, example_selector)
+        return AggregatedResult(
+            total_records=passed + leaves.total_records,
+            failed=leaves.failed,
+            passed=passed + leaves.passed,
+            failed_example=leaves.failed_example,
+        )
+
+    @staticmethod
+    def bucket_digests(
+        conn: Connector,
+        query: str,
+        key_hash: str,
+        modulus: int,
+        parent_modulus: Optional[int] = None,
+        parents: Optional[List[int]] = None,
+    ) -> Dict[int, Tuple[int, int]]:
+        """
+        :return: bucket -> (count, sum of row hashes) of distinct rows, only buckets
+            of `parents` (buckets of the previous level) if given
+        """
+        where = ""
+        if parents is not None:
+            where = (
+                f"WHERE mod(k, {parent_modulus}) IN ({', '.join(map(str, parents))})"
+            )
+        sql = f"""
+            SELECT mod(k, {modulus}) AS bucket, count(*) AS cnt, sum(h) AS digest
+            FROM (
+                SELECT DISTINCT {key_hash} AS k, {ROW_HASH_SQL}::numeric AS h
+                FROM ({query}) AS src
+            ) hashed
+            {where}
+            GROUP BY 1
+        """
+        logging.debug(sql)
+        return {r[0]: (r[1], r[2]) for r in conn.get_records(with_digest_settings(sql))}
+
+    @staticmethod
+    def bucket_rows(
+        conn: Connector, query: str, key_hash: str, modulus: int, buckets: List[int]
+    ) -> List[Tuple]:
+        sql = f"""
+            SELECT src.*
+            FROM ({query}) AS src
+            WHERE mod({key_hash}, {modulus}) IN ({', '.join(map(str, buckets))})
+        """
+        logging.debug(sql)
+        return [tuple(r.values()) for r in conn.get_records(with_digest_settings(sql))]
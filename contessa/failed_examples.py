@@ -5,6 +5,10 @@ from typing import Set, Tuple
 
 
 class ExampleSelector:
+    # how many failed rows the selector needs to see at most, None for all of them.
+    # rules don't keep more failed rows in memory than that.
+    limit = None
+
     @abstractmethod
     def select_examples(self, failed_rows: Set[Tuple]) -> Set[Tuple]:
         pass
@@ -13,6 +17,7 @@ class ExampleSelector:
 class FirstNExampleSelector(ExampleSelector):
     def __init__(self, n):
         self.n = n
+        self.limit = n
 
     def select_examples(self, failed_rows: Set[Tuple]) -> Set[Tuple]:
         return set(islice(failed_rows, self.n))
@@ -0,0 +1,176 @@
+import logging
+import re
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, time
+from typing import Callable, Dict, Iterable, List, Tuple, Union
+
+from sqlalchemy import func, Table
+
+RULE_IDENTITY = ("attribute", "rule_name", "rule_type", "time_filter")
+
+# stored time filters end with the time they were evaluated at, e.g.
+# "<TimeFilter created_at between 30 days, 0:00:00 and now relative to 2018-09-12 12:00:00>"
+TIME_FILTER_RELATIVE_PATTERN = r" relative to [^>]*>$"
+TIME_FILTER_RELATIVE_RE = re.compile(TIME_FILTER_RELATIVE_PATTERN)
+# `stable_time_filter` in sql, e.g. for expression indexes
+STABLE_TIME_FILTER_SQL = (
+    f"regexp_replace(time_filter, '{TIME_FILTER_RELATIVE_PATTERN}', '>')"
+)
+
+
+def stable_time_filter(time_filter: str) -> str:
+    """
+    Stored time filter without the time it was evaluated at (" relative to ..."),
+    so time filters of different runs of the same rule can be compared.
+    """
+    return TIME_FILTER_RELATIVE_RE.sub(">", time_filter)
+
+
+def stable_time_filter_sql(column):
+    """
+    Same as `stable_time_filter`, computed by the db.
+    """
+    return func.regexp_replace(column, TIME_FILTER_RELATIVE_PATTERN, ">")
+
+
+def stable_identity(row: Dict) -> tuple:
+    """
+    `RULE_IDENTITY` of a result row, same for all the runs of the rule.
+    """
+    return (
+        *(row[k] for k in RULE_IDENTITY[:3]),
+        stable_time_filter(row["time_filter"]),
+    )
+
+
+def stable_identity_columns(table: Table) -> List:
+    """
+    Expressions of `RULE_IDENTITY` of `table` rows, same as `stable_identity`.
+    """
+    return [
+        *(table.c[k] for k in RULE_IDENTITY[:3]),
+        stable_time_filter_sql(table.c.time_filter),
+    ]
+
+
+def _naive(ts: Union[date, datetime]) -> datetime:
+    """
+    History rows can come both from the db (tz aware) and from the context of the current run
+    (usually naive). Compare them all as naive local time.
+    """
+    if not isinstance(ts, datetime):
+        return datetime.combine(ts, time())
+    if ts.tzinfo is not None:
+        return ts.astimezone().replace(tzinfo=None)
+    return ts
+
+
+class _TableHistory:
+    def __init__(self, since: datetime):
+        self.since = since
+        # (rule identity, task_ts) -> (failed, passed), same key as unique constraint of the table
+        self.rows = {}
+
+    def add(self, row: Dict):
+        identity = tuple(row.get(k) for k in RULE_IDENTITY)
+        task_ts = _naive(row["task_ts"])
+        if task_ts >= self.since:
+            self.rows[(identity, task_ts)] = (row["failed"], row["passed"])
+
+    def prune(self, since: datetime):
+        self.rows = {k: v for k, v in self.rows.items() if k[1] >= since}
+        self.since = since
+
+
+class HistoryCache:
+    """
+    In-process cache of recent results per result table, used to compute baselines (medians)
+    without reading the history from db for every rule.
+
+    Table is loaded from db on first access (warm-up), after that it's served from memory and
+    kept up to date by `Connector.upsert`. Least recently used tables are evicted when there
+    is more than `max_rows` rows cached in total, the most recently used one is kept even
+    if it is larger.
+
+    NOTE: Results written by other processes after the warm-up are not visible to the cache.
+    """
+
+    def __init__(self, max_rows: int = 100_000):
+        self.max_rows = max_rows
+        self._tables = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(t.rows) for t in self._tables.values())
+
+    def __contains__(self, table_fullname: str):
+        return table_fullname in self._tables
+
+    def get(
+        self,
+        table_fullname: str,
+        since: Union[date, datetime],
+        until: Union[date, datetime],
+        loader: Callable[[date], Iterable[Dict]],
+    ) -> List[Tuple[int, int]]:
+        """
+        Return (failed, passed) of all results with `since` <= task_ts <= `until`.
+        :param loader: callable that reads rows of the table with task_ts >= since from db
+        """
+        since, until = _naive(since), _naive(until)
+        with self._lock:
+            history = self._tables.get(table_fullname)
+            if history is None or since < history.since:
+                history = _TableHistory(since)
+                for row in loader(since):
+                    history.add(row)
+                self._tables[table_fullname] = history
+                logging.info(
+                    f"Loaded {len(history.rows)} history rows of {table_fullname} to cache."
+                )
+            elif since > history.since:
+                history.prune(since)
+            self._tables.move_to_end(table_fullname)
+            result = [v for (_, task_ts), v in history.rows.items() if task_ts <= until]
+            self._evict()
+        return result
+
+    def append(self, table_fullname: str, rows: Iterable[Dict]):
+        """
+        Add freshly written rows. Tables that are not cached are skipped, they will be loaded
+        with the rows from db on their first access.
+        """
+        with self._lock:
+            history = self._tables.get(table_fullname)
+            if history is None:
+                return
+            for row in rows:
+                history.add(row)
+            self._evict()
+
+    def invalidate(self, table_fullname: str):
+        with self._lock:
+            self._tables.pop(table_fullname, None)
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+
+    def _evict(self):
+        """
+        Evict least recently used tables, but never the most recently used one - it's the one
+        that is being read, so it would be loaded from db again on every access.
+        """
+        total = sum(len(t.rows) for t in self._tables.values())
+        while total > self.max_rows and len(self._tables) > 1:
+            name, history = self._tables.popitem(last=False)
+            total -= len(history.rows)
+            logging.info(f"Evicted history of {name} from cache.")
+        if total > self.max_rows:
+            name = next(iter(self._tables))
+            logging.warning(
+                f"History of {name} has {total} rows, more than max_rows={self.max_rows} "
+                f"of the cache."
+            )
@@ -0,0 +1,61 @@
+import json
+import os
+from typing import Dict
+
+from contessa.models import CheckResult
+from contessa.sinks import FileSink, result_to_dict
+
+
+class RunJournal(FileSink):
+    """
+    Local journal of finished rules of runs without result table. Each result is appended
+    as one json line and flushed right away, so results of a failed run survive, and
+    `ContessaRunner.run(..., journal=path, resume=True)` executes only the unfinished rules.
+
+    Lines are kept for all the runs (`task_ts`), delete the file when it's not needed.
+    """
+
+    def open(self):
+        self._file = open(self.path, "a")
+
+    def write(self, obj, identity: tuple = None):
+        context = obj.context or {}
+        line = {
+            "identity": list(identity),
+            "task_ts": str(context.get("task_ts")),
+            "result": result_to_dict(obj),
+        }
+        self._file.write(json.dumps(line, default=str))
+        self._file.write("\n")
+        self._file.flush()
+
+    def load(self, context: Dict) -> Dict[tuple, CheckResult]:
+        """
+        Results of rules journaled for `task_ts` of the context, by rule identity.
+        """
+        ret = {}
+        if not os.path.exists(self.path):
+            return ret
+        task_ts = str(context["task_ts"])
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # the last line can be cut off if the process was killed
+                    continue
+                if entry["task_ts"] != task_ts:
+                    continue
+                ret[tuple(entry["identity"])] = self._to_result(
+                    entry["result"], context
+                )
+        return ret
+
+    @staticmethod
+    def _to_result(data: Dict, context: Dict) -> CheckResult:
+        obj = CheckResult()
+        obj._set(
+            **{k: data.get(k) for k in CheckResult.__slots__ if k != "context"},
+            context=context,
+        )
+        return obj
@@ -29,7 +29,14 @@ alembic_ini_path = os.path.join(here, "alembic.ini")
     Force migration. Used for the package migration that differs from the current package version.""",
     is_flag=True,
 )
-def main(url, schema, version, force):
+@click.option(
+    "--partition-results",
+    help="""
+    Re-create result tables as partitioned by task_ts (monthly). Used only by the migration
+    to 0.2.13.""",
+    is_flag=True,
+)
+def main(url, schema, version, force, partition_results):
     if version != contessa.__version__ and not force:
         raise Exception(
             f"""
@@ -52,6 +59,8 @@ def main(url, schema, version, force):
         f"sqlalchemy_url={url}",
         "-x",
         f"schema={schema}",
+        "-x",
+        f"partition_results={str(partition_results).lower()}",
         "-c",
         alembic_ini_path,
         command[0],
@@ -1,13 +1,25 @@
 from datetime import datetime, timedelta
 from statistics import median
-from typing import Dict, Any
+from typing import Dict, Any, List, Set
 import json
-
-from sqlalchemy import and_, Column, DateTime, MetaData, text, UniqueConstraint
+import threading
+
+from sqlalchemy import (
+    and_,
+    Column,
+    Date,
+    DateTime,
+    func,
+    Index,
+    MetaData,
+    text,
+    UniqueConstraint,
+)
 from sqlalchemy.dialects.postgresql import (
     BIGINT,
     DOUBLE_PRECISION,
     INTEGER,
+    JSONB,
     TEXT,
     TIMESTAMP,
 )
@@ -19,6 +31,12 @@ from sqlalchemy.ext.declarative import (
 
 from contessa.base_rules import Rule
 from contessa.db import Connector
+from contessa.history import (
+    RULE_IDENTITY,
+    STABLE_TIME_FILTER_SQL,
+    stable_time_filter,
+)
+from contessa.partitions import PARTITION_COLUMN
 from contessa.utils import AggregatedResult
 
 # default schema for results is `data_quality`, but it can be overridden by passing
@@ -28,6 +46,38 @@ DQBase = declarative_base(metadata=MetaData(schema="data_quality"))
 
 TIME_FILTER_DEFAULT = "not_set"
 
+# keyset pagination of history of one rule (and latest result per rule), rules
+# are identified by time filter without the time it was evaluated at
+HISTORY_INDEX_COLUMNS = (
+    "attribute",
+    "rule_name",
+    "rule_type",
+    f"({STABLE_TIME_FILTER_SQL})",
+    "task_ts",
+    "id",
+)
+# keyset pagination of invalid results since given time
+INVALID_INDEX_COLUMNS = ("task_ts", "id")
+INVALID_INDEX_WHERE = "status = 'invalid'"
+
+
+def partition_options(cls) -> Dict:
+    """
+    Table options of result table classes. Classes created with `partitioned` result table
+    are range-partitioned by `task_ts`, see `contessa.partitions`.
+    """
+    if not getattr(cls, "_partitioned", False):
+        return {}
+    return {
+        "postgresql_partition_by": f"RANGE ({PARTITION_COLUMN})",
+        "info": {"partitioned": True},
+    }
+
+
+# (model_cls, schema_name, table_name, partitioned) -> class, see `create_default_check_class`
+_check_classes = {}
+_check_classes_lock = threading.Lock()
+
 
 class QualityCheck(AbstractConcreteBase, DQBase):
     """
@@ -60,6 +110,8 @@ class QualityCheck(AbstractConcreteBase, DQBase):
         nullable=False,
     )
     task_ts = Column(TIMESTAMP(timezone=True), nullable=False, index=True)
+    # with delta persistence, the last task_ts the same result was seen (if not in this row)
+    last_seen = Column(TIMESTAMP(timezone=True))
     created_at = Column(
         DateTime(timezone=True),
         server_default=text("NOW()"),
@@ -67,6 +119,11 @@ class QualityCheck(AbstractConcreteBase, DQBase):
         index=True,
     )
 
+    # delta persistence (see `Connector.upsert_rows`) - the result is unchanged if these
+    # columns are the same as in the latest stored result of the rule
+    _delta_key = RULE_IDENTITY
+    _delta_columns = ("total_records", "failed", "passed", "status")
+
     @declared_attr
     def __table_args__(cls):
         """
@@ -84,6 +141,17 @@ class QualityCheck(AbstractConcreteBase, DQBase):
                 "time_filter",
                 name=f"{cls.__tablename__}_unique",
             ),
+            # indexes used by `ResultReader`
+            Index(
+                f"{cls.__tablename__}_history_idx",
+                *(text(c) if c.startswith("(") else c for c in HISTORY_INDEX_COLUMNS),
+            ),
+            Index(
+                f"{cls.__tablename__}_invalid_idx",
+                *INVALID_INDEX_COLUMNS,
+                postgresql_where=text(INVALID_INDEX_WHERE),
+            ),
+            partition_options(cls),
         )
 
     def init_row(
@@ -96,29 +164,44 @@ class QualityCheck(AbstractConcreteBase, DQBase):
         """
         Count metrics we want to measure and set them to quality check object.
         """
+        for k, v in self.build_row(rule, results, conn, context).items():
+            setattr(self, k, v)
 
+    @classmethod
+    def build_row(
+        cls,
+        rule: Rule,
+        results: AggregatedResult,
+        conn: Connector,
+        context: Dict = None,
+    ) -> Dict:
+        """
+        Same as `init_row`, but returns plain dict of column values, that can be inserted
+        without instantiating the (orm) class.
+        """
         # todo - add to doc
-        self.task_ts = context["task_ts"]
-        self.attribute = rule.attribute
-        self.rule_name = rule.name
-        self.rule_type = rule.type
-        self.rule_description = rule.description
-
-        self.total_records = results.total_records
-        self.failed = results.failed
-        self.passed = results.passed
-
-        self.set_medians(conn)
-
-        if rule.time_filter:
-            self.time_filter = str(rule.time_filter)
-        else:
-            self.time_filter = TIME_FILTER_DEFAULT
-        self.failed_percentage = self._perc(self.failed, self.total_records)
-        self.passed_percentage = self._perc(self.passed, self.total_records)
-        self.status = "invalid" if self.failed > 0 else "valid"
-
-    def _perc(self, a, b):
+        median_failed, median_passed = cls.get_medians(conn)
+        return {
+            "task_ts": context["task_ts"],
+            "attribute": rule.attribute,
+            "rule_name": rule.name,
+            "rule_type": rule.type,
+            "rule_description": rule.description,
+            "total_records": results.total_records,
+            "failed": results.failed,
+            "passed": results.passed,
+            "median_30_day_failed": median_failed,
+            "median_30_day_passed": median_passed,
+            "time_filter": str(rule.time_filter)
+            if rule.time_filter
+            else TIME_FILTER_DEFAULT,
+            "failed_percentage": cls._perc(results.failed, results.total_records),
+            "passed_percentage": cls._perc(results.passed, results.total_records),
+            "status": "invalid" if results.failed > 0 else "valid",
+        }
+
+    @staticmethod
+    def _perc(a, b):
         res = 0
         try:
             res = (a / b) * 100
@@ -130,25 +213,95 @@ class QualityCheck(AbstractConcreteBase, DQBase):
         """
         Calculate median of passed/failed quality checks from last 30 days.
         """
+        self.median_30_day_failed, self.median_30_day_passed = self.get_medians(
+            conn, days
+        )
+
+    @classmethod
+    def get_medians(cls, conn: Connector, days=30):
+        """
+        Median of failed and passed of quality checks from last 30 days.
+        :return: tuple (median failed, median passed), None if there is no history
+        """
         now = datetime.today().date()
         past = now - timedelta(days=days)
-        cls = self.__class__
 
+        if conn.history_cache is not None:
+            checks = conn.history_cache.get(
+                cls.__table__.fullname,
+                past,
+                now,
+                loader=lambda since: cls.load_history(conn, since),
+            )
+        else:
+            session = conn.make_session()
+            checks = (
+                session.query(cls.failed, cls.passed)
+                .filter(and_(cls.task_ts <= str(now), cls.task_ts >= str(past)))
+                .all()
+            )
+            session.expunge_all()
+            session.commit()
+            session.close()
+
+        failed = [ch[0] for ch in checks]
+        passed = [ch[1] for ch in checks]
+        return (
+            median(failed) if failed else None,
+            median(passed) if passed else None,
+        )
+
+    @classmethod
+    def load_history(cls, conn: Connector, since) -> List[Dict]:
+        """
+        Read results with task_ts >= `since` that are needed to fill in the history cache.
+        """
         session = conn.make_session()
-        checks = (
-            session.query(cls.failed, cls.passed)
-            .filter(and_(cls.task_ts <= str(now), cls.task_ts >= str(past)))
+        rows = (
+            session.query(
+                cls.attribute,
+                cls.rule_name,
+                cls.rule_type,
+                cls.time_filter,
+                cls.task_ts,
+                cls.failed,
+                cls.passed,
+            )
+            .filter(cls.task_ts >= str(since))
             .all()
         )
         session.expunge_all()
         session.commit()
         session.close()
+        return [r._asdict() for r in rows]
 
-        failed = [ch.failed for ch in checks]
-        self.median_30_day_failed = median(failed) if failed else None
+    @classmethod
+    def load_existing(cls, conn: Connector, task_ts) -> Set[tuple]:
+        """
+        Identities (`RULE_IDENTITY`) of rules that have result for `task_ts`. Results stored
+        in delta mode are valid from their `task_ts` until `last_seen`.
+        """
+        session = conn.make_session()
+        rows = (
+            session.query(*[getattr(cls, k) for k in RULE_IDENTITY])
+            .filter(
+                cls.task_ts <= task_ts,
+                func.coalesce(cls.last_seen, cls.task_ts) >= task_ts,
+            )
+            .all()
+        )
+        session.expunge_all()
+        session.commit()
+        session.close()
+        return {(*r[:3], stable_time_filter(r[3])) for r in rows}
 
-        passed = [ch.passed for ch in checks]
-        self.median_30_day_passed = median(passed) if passed else None
+    @staticmethod
+    def rule_identity(rule: Rule) -> tuple:
+        """
+        Identity (`RULE_IDENTITY`) of the result of the rule, comparable with `load_existing`.
+        """
+        time_filter = str(rule.time_filter) if rule.time_filter else TIME_FILTER_DEFAULT
+        return rule.attribute, rule.name, rule.type, stable_time_filter(time_filter)
 
     def __repr__(self):
         return f"Rule ({self.attribute} - {self.rule_name} - {self.rule_type} - {self.task_ts})"
@@ -202,6 +355,7 @@ class ConsistencyCheck(AbstractConcreteBase, DQBase):
                 "time_filter",
                 name=f"{cls.__tablename__}_unique",
             ),
+            partition_options(cls),
         )
 
     def init_row(
@@ -217,22 +371,158 @@ class ConsistencyCheck(AbstractConcreteBase, DQBase):
         """
         Set result to consistency check object.
         """
-        self.type = check["type"]
-        self.task_ts = context["task_ts"]
-        self.name = check["name"]
-        self.description = check["description"]
-        self.left_table = left_table_name
-        self.right_table = right_table_name
-        if isinstance(time_filter, str):
-            self.time_filter = time_filter
-        else:
-            self.time_filter = json.dumps(time_filter)
-        self.status = "valid" if results.failed == 0 else "invalid"
+        for k, v in self.build_row(
+            check, results, left_table_name, right_table_name, time_filter, context
+        ).items():
+            setattr(self, k, v)
+
+    @classmethod
+    def build_row(
+        cls,
+        check: Dict,
+        results: AggregatedResult,
+        left_table_name: str,
+        right_table_name: str,
+        time_filter=None,
+        context: Dict = None,
+        **_,
+    ) -> Dict:
+        """
+        Same as `init_row`, but returns plain dict of column values.
+        """
+        return {
+            "type": check["type"],
+            "task_ts": context["task_ts"],
+            "name": check["name"],
+            "description": check["description"],
+            "left_table": left_table_name,
+            "right_table": right_table_name,
+            "time_filter": time_filter
+            if isinstance(time_filter, str)
+            else json.dumps(time_filter),
+            "status": "valid" if results.failed == 0 else "invalid",
+        }
 
     def __repr__(self):
         return f"Rule ({self.type} - {self.name} - {self.task_ts})"
 
 
+class FailedExample(AbstractConcreteBase, DQBase):
+    """
+    Representation of abstract table with failed examples of quality checks. It has the same
+    unique key as the quality check table, so examples can be joined to their results.
+    """
+
+    __abstract__ = True
+    _table_prefix = "failed_example"
+
+    id = Column(BIGINT, primary_key=True)
+    attribute = Column(TEXT, nullable=False)
+    rule_name = Column(TEXT, nullable=False)
+    rule_type = Column(TEXT, nullable=False)
+    time_filter = Column(
+        TEXT,
+        default=TIME_FILTER_DEFAULT,
+        server_default=TIME_FILTER_DEFAULT,
+        nullable=False,
+    )
+    task_ts = Column(TIMESTAMP(timezone=True), nullable=False, index=True)
+    examples = Column(JSONB)
+    created_at = Column(
+        DateTime(timezone=True),
+        server_default=text("NOW()"),
+        nullable=False,
+        index=True,
+    )
+
+    @declared_attr
+    def __table_args__(cls):
+        return (
+            UniqueConstraint(
+                "attribute",
+                "rule_name",
+                "rule_type",
+                "task_ts",
+                "time_filter",
+                name=f"{cls.__tablename__}_unique",
+            ),
+            partition_options(cls),
+        )
+
+    @classmethod
+    def build_row(
+        cls, rule: Rule, results: AggregatedResult, context: Dict = None,
+    ) -> Dict:
+        """
+        Plain dict of column values with examples of the rule.
+        """
+        return {
+            "task_ts": context["task_ts"],
+            "attribute": rule.attribute,
+            "rule_name": rule.name,
+            "rule_type": rule.type,
+            "time_filter": str(rule.time_filter)
+            if rule.time_filter
+            else TIME_FILTER_DEFAULT,
+            # rows can contain anything (dates, decimals..), make them json friendly
+            "examples": json.loads(json.dumps(results.failed_example, default=str)),
+        }
+
+    def __repr__(self):
+        return f"FailedExample ({self.attribute} - {self.rule_name} - {self.rule_type} - {self.task_ts})"
+
+
+class QualityCheckRollup(AbstractConcreteBase, DQBase):
+    """
+    Representation of abstract table with results of quality checks aggregated per rule
+    and period (day or week). Rows are re-computed from the quality check table for
+    the periods and rules touched by the run, see `contessa.rollups`.
+
+    `pass_rate` is sum of passed divided by sum of total records (0 - 1).
+    """
+
+    __abstract__ = True
+    _table_prefix = "quality_rollup"
+
+    id = Column(BIGINT, primary_key=True)
+    period = Column(TEXT, nullable=False)
+    period_start = Column(Date, nullable=False)
+    attribute = Column(TEXT, nullable=False)
+    rule_name = Column(TEXT, nullable=False)
+    rule_type = Column(TEXT, nullable=False)
+    time_filter = Column(
+        TEXT,
+        default=TIME_FILTER_DEFAULT,
+        server_default=TIME_FILTER_DEFAULT,
+        nullable=False,
+    )
+    total_records = Column(BIGINT)
+    failed = Column(BIGINT)
+    passed = Column(BIGINT)
+    pass_rate = Column(DOUBLE_PRECISION)
+    run_count = Column(INTEGER, nullable=False)
+    updated_at = Column(
+        DateTime(timezone=True), server_default=text("NOW()"), nullable=False,
+    )
+
+    @declared_attr
+    def __table_args__(cls):
+        return (
+            UniqueConstraint(
+                "period",
+                "period_start",
+                "attribute",
+                "rule_name",
+                "rule_type",
+                "time_filter",
+                name=f"{cls.__tablename__}_unique",
+            ),
+        )
+
+    def __repr__(self):
+        return f"Rollup ({self.period} {self.period_start} - {self.attribute} - {self.rule_name} - {self.rule_type})"
+
+
 class Table:
     def __init__(self, schema_name, table_name):
         self.schema_name = schema_name
@@ -248,10 +538,14 @@ class ResultTable(Table):
     """
     Name will be constructed as "quality_check_{load_table_name}", e.g. "quality_check_my_table".
     Can be overridden by `table_name`.
+
+    If `partitioned`, the table is created range-partitioned by `task_ts`, one partition
+    per month. Partitions are created as needed on upsert.
     """
 
-    def __init__(self, schema_name, table_name, model_cls):
+    def __init__(self, schema_name, table_name, model_cls, partitioned=False):
         self.model_cls = model_cls
+        self.partitioned = partitioned
         prefix = model_cls._table_prefix
         table_name = f"{prefix}_{table_name}"
         super().__init__(schema_name, table_name)
@@ -283,9 +577,29 @@ def create_default_check_class(result_table: ResultTable):
             ...
 
     But it has dynamic name - MyTable is replaced for the table we are doing quality check for.
+
+    Classes are created only once per process and reused by the next calls (mapping a new
+    class for every run would leak mappers). It's thread-safe.
     :return: class with dynamically created name
     """
+    key = (
+        result_table.model_cls,
+        result_table.schema_name,
+        result_table.table_name,
+        result_table.partitioned,
+    )
+    with _check_classes_lock:
+        cls = _check_classes.get(key)
+        # after `DQBase.metadata.clear()` the table is gone, so the class has to be re-created
+        if cls is None or not any(
+            t is cls.__table__ for t in cls.metadata.tables.values()
+        ):
+            cls = _build_check_class(result_table)
+            _check_classes[key] = cls
+    return cls
 
+
+def _build_check_class(result_table: ResultTable):
     attributedict = {
         "__tablename__": result_table.table_name,
         "id": Column(BIGINT, primary_key=True),
@@ -294,6 +608,17 @@ def create_default_check_class(result_table: ResultTable):
             "concrete": True,
         },
     }
+    if result_table.partitioned:
+        # postgres needs the partition key to be part of primary key
+        attributedict.update(
+            {
+                "_partitioned": True,
+                "id": Column(BIGINT, primary_key=True, autoincrement=True),
+                PARTITION_COLUMN: Column(
+                    TIMESTAMP(timezone=True), primary_key=True, index=True
+                ),
+            }
+        )
     cls = type(result_table.clsname, (result_table.model_cls,), attributedict)
     cls.metadata.schema = result_table.schema_name
     cls.__table__.schema = result_table.schema_name
@@ -301,6 +626,26 @@ def create_default_check_class(result_table: ResultTable):
 
 
 class CheckResult:
+    """
+    Result of a check that is not persisted, but returned to the caller.
+
+    It's slotted and immutable once initialized to keep memory footprint of big runs low.
+    Percentages and status are computed on access. `context` is the same dict for all
+    the results of one run, it's not copied.
+    """
+
+    __slots__ = (
+        "rule_name",
+        "rule_type",
+        "rule_description",
+        "total_records",
+        "failed",
+        "passed",
+        "time_filter",
+        "failed_example",
+        "context",
+    )
+
     rule_name: str
     rule_type: str
     rule_description: str
@@ -314,6 +659,17 @@ class CheckResult:
     failed_example: Any
     context: Dict
 
+    def __setattr__(self, key, value):
+        raise AttributeError(f"`{self.__class__.__name__}` is immutable.")
+
+    def _set(self, **values):
+        if hasattr(self, "rule_name"):
+            raise AttributeError(
+                f"`{self.__class__.__name__}` is immutable, it's already initialized."
+            )
+        for k in self.__slots__:
+            object.__setattr__(self, k, values.get(k))
+
     def init_row(
         self,
         rule: Rule,
@@ -321,21 +677,17 @@ class CheckResult:
         conn: Connector,
         context: Dict = None,
     ):
-        self.rule_name = rule.name
-        self.rule_type = rule.type
-        self.rule_description = rule.description
-
-        self.total_records = results.total_records
-        self.failed = results.failed
-        self.passed = results.passed
-        self.failed_example = results.failed_example
-
-        if rule.time_filter:
-            self.time_filter = str(rule.time_filter)
-        self.failed_percentage = self._perc(self.failed, self.total_records)
-        self.passed_percentage = self._perc(self.passed, self.total_records)
-        self.status = "invalid" if self.failed > 0 else "valid"
-        self.context = context
+        self._set(
+            rule_name=rule.name,
+            rule_type=rule.type,
+            rule_description=rule.description,
+            total_records=results.total_records,
+            failed=results.failed,
+            passed=results.passed,
+            failed_example=results.failed_example,
+            time_filter=str(rule.time_filter) if rule.time_filter else None,
+            context=context,
+        )
 
     def init_row_consistency(
         self,
@@ -346,27 +698,36 @@ class CheckResult:
         time_filter=None,
         context: Dict = None,
     ):
-        self.rule_type = check["type"]
-        self.rule_name = check["name"]
-        self.rule_description = check["description"]
-
-        self.total_records = results.total_records
-        self.failed = results.failed
-        self.passed = results.passed
-        self.failed_example = results.failed_example
-
-        if time_filter:
-            self.time_filter = time_filter
-        self.failed_percentage = self._perc(abs(self.failed), self.total_records)
-        self.passed_percentage = self._perc(self.passed, self.total_records)
-        self.status = "valid" if results.failed == 0 else "invalid"
-
+        self._set(
+            rule_type=check["type"],
+            rule_name=check["name"],
+            rule_description=check["description"],
+            total_records=results.total_records,
+            failed=results.failed,
+            passed=results.passed,
+            failed_example=results.failed_example,
+            time_filter=time_filter or None,
+            context=context,
+        )
         context.update(
             {"left_table_name": left_table_name, "right_table_name": right_table_name}
         )
-        self.context = context
 
-    def _perc(self, a, b):
+    @property
+    def failed_percentage(self) -> float:
+        # consistency check of counts can end up with negative number of failed
+        return self._perc(abs(self.failed), self.total_records)
+
+    @property
+    def passed_percentage(self) -> float:
+        return self._perc(self.passed, self.total_records)
+
+    @property
+    def status(self) -> str:
+        return "valid" if self.failed == 0 else "invalid"
+
+    @staticmethod
+    def _perc(a, b):
         res = 0
         try:
             res = (a / b) * 100
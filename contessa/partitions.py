@@ -0,0 +1,213 @@
+"""
+Helpers for result tables that are range-partitioned by `task_ts`, one partition per month.
+Partitions are named `{table_name}_pYYYYMM`.
+
+Functions take `bind` - sqlalchemy engine or connection, so they can be used both
+by `Connector` and by the alembic migrations.
+"""
+import logging
+import re
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Set, Union
+
+PARTITION_COLUMN = "task_ts"
+PARTITION_SUFFIX_RE = re.compile(r"_p(\d{4})(\d{2})$")
+
+
+def month_start(d: Union[date, datetime]) -> date:
+    return date(d.year, d.month, 1)
+
+
+def next_month(d: date) -> date:
+    if d.month == 12:
+        return date(d.year + 1, 1, 1)
+    return date(d.year, d.month + 1, 1)
+
+
+def partition_name(table_name: str, start: date) -> str:
+    return f"{table_name}_p{start:%Y%m}"
+
+
+def partition_start(partition: str):
+    """
+    Start of the month the partition is for, None if it's not named by contessa.
+    """
+    m = PARTITION_SUFFIX_RE.search(partition)
+    if not m:
+        return None
+    return date(int(m.group(1)), int(m.group(2)), 1)
+
+
+def months_for(timestamps: Iterable[Union[date, datetime]]) -> Set[date]:
+    """
+    Months that need a partition to store rows with given timestamps. Neighbouring months
+    are included as well, the db can see the timestamp in a different timezone than python.
+    """
+    months = set()
+    for ts in timestamps:
+        if isinstance(ts, str):
+            # only the date matters, the neighbouring months cover the time and offset
+            ts = datetime.strptime(ts[:10], "%Y-%m-%d")
+        for d in (ts - timedelta(days=1), ts, ts + timedelta(days=1)):
+            months.add(month_start(d))
+    return months
+
+
+def create_partition(bind, schema: str, table_name: str, start: date):
+    name = partition_name(table_name, start)
+    bind.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {schema}.{name}
+        PARTITION OF {schema}.{table_name}
+        FOR VALUES FROM ('{start.isoformat()}') TO ('{next_month(start).isoformat()}')
+    """
+    )
+    return name
+
+
+def is_partitioned(bind, schema: str, table_name: str) -> bool:
+    result = bind.execute(
+        f"""
+        SELECT EXISTS (
+            SELECT 1
+            FROM pg_partitioned_table pt
+            JOIN pg_class c ON c.oid = pt.partrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = '{schema}' AND c.relname = '{table_name}'
+        )
+    """
+    )
+    return result.first()[0]
+
+
+def list_result_tables(bind, schema: str, table_prefix: str) -> List[str]:
+    """
+    Tables in `schema` starting with `table_prefix`, without partitions of them.
+    """
+    result = bind.execute(
+        f"""
+        SELECT c.relname
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = '{schema}' AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+        ORDER BY c.relname
+    """
+    )
+    return [r[0] for r in result if r[0].startswith(table_prefix)]
+
+
+def list_partitions(bind, schema: str, table_name: str) -> List[str]:
+    result = bind.execute(
+        f"""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        JOIN pg_namespace n ON n.oid = p.relnamespace
+        WHERE n.nspname = '{schema}' AND p.relname = '{table_name}'
+        ORDER BY c.relname
+    """
+    )
+    return [r[0] for r in result]
+
+
+def drop_partitions_before(
+    bind, schema: str, table_name: str, before: Union[date, datetime]
+) -> List[str]:
+    """
+    Drop partitions with all the rows older than `before`. It's a catalog operation only,
+    no rows are deleted one by one.
+    :return: names of dropped partitions
+    """
+    before = before.date() if isinstance(before, datetime) else before
+    dropped = []
+    for partition in list_partitions(bind, schema, table_name):
+        start = partition_start(partition)
+        if start is None or next_month(start) > before:
+            continue
+        bind.execute(f"DROP TABLE {schema}.{partition}")
+        logging.info(f"Dropped partition {schema}.{partition}.")
+        dropped.append(partition)
+    return dropped
+
+
+def _create_partitions_for_data(bind, schema: str, table_name: str, source: str):
+    first, last = bind.execute(
+        f"SELECT min({PARTITION_COLUMN}), max({PARTITION_COLUMN}) FROM {schema}.{source}"
+    ).first()
+    if first is None:
+        return
+    start = month_start(first - timedelta(days=1))
+    end = month_start(last + timedelta(days=1))
+    while start <= end:
+        create_partition(bind, schema, table_name, start)
+        start = next_month(start)
+
+
+def _move_table(
+    bind, schema: str, table_name: str, unique_columns: List[str], partitioned: bool,
+):
+    old = f"{table_name}_old"
+    bind.execute(f"ALTER TABLE {schema}.{table_name} RENAME TO {old}")
+    # free the names of the constraints (and their indexes), old table is dropped anyway
+    bind.execute(
+        f"""
+        ALTER TABLE {schema}.{old}
+        DROP CONSTRAINT IF EXISTS {table_name}_pkey,
+        DROP CONSTRAINT IF EXISTS {table_name}_unique
+    """
+    )
+
+    partition_by = f"PARTITION BY RANGE ({PARTITION_COLUMN})" if partitioned else ""
+    primary_key = f"id, {PARTITION_COLUMN}" if partitioned else "id"
+    bind.execute(
+        f"""
+        CREATE TABLE {schema}.{table_name}
+        (LIKE {schema}.{old} INCLUDING DEFAULTS) {partition_by}
+    """
+    )
+    bind.execute(
+        f"""
+        ALTER TABLE {schema}.{table_name}
+        ADD CONSTRAINT {table_name}_pkey PRIMARY KEY ({primary_key})
+    """
+    )
+    bind.execute(
+        f"""
+        ALTER TABLE {schema}.{table_name}
+        ADD CONSTRAINT {table_name}_unique UNIQUE ({', '.join(unique_columns)})
+    """
+    )
+    bind.execute(f"CREATE INDEX ON {schema}.{table_name} ({PARTITION_COLUMN})")
+    bind.execute(f"CREATE INDEX ON {schema}.{table_name} (created_at)")
+    if partitioned:
+        _create_partitions_for_data(bind, schema, table_name, old)
+
+    bind.execute(f"INSERT INTO {schema}.{table_name} SELECT * FROM {schema}.{old}")
+    sequence = bind.execute(
+        f"SELECT pg_get_serial_sequence('{schema}.{old}', 'id')"
+    ).scalar()
+    if sequence:
+        bind.execute(f"ALTER SEQUENCE {sequence} OWNED BY {schema}.{table_name}.id")
+    bind.execute(f"DROP TABLE {schema}.{old}")
+
+
+def convert_to_partitioned(
+    bind, schema: str, table_name: str, unique_columns: List[str]
+):
+    """
+    Re-create existing plain result table as partitioned one, with all the data.
+    Primary key is extended by `task_ts`, as postgres needs partition key to be part of it.
+    """
+    logging.info(f"Partitioning table {schema}.{table_name}.")
+    _move_table(bind, schema, table_name, unique_columns, partitioned=True)
+
+
+def convert_to_unpartitioned(
+    bind, schema: str, table_name: str, unique_columns: List[str]
+):
+    """
+    Re-create partitioned result table as plain one, with all the data.
+    """
+    logging.info(f"Un-partitioning table {schema}.{table_name}.")
+    _move_table(bind, schema, table_name, unique_columns, partitioned=False)
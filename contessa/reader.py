@@ -0,0 +1,136 @@
+from datetime import date, datetime
+from typing import Dict, Iterator, Optional, Sequence, Union
+
+from sqlalchemy import and_, select, tuple_
+
+from contessa.db import Connector
+from contessa.history import (
+    stable_identity,
+    stable_identity_columns,
+    stable_time_filter,
+    stable_time_filter_sql,
+)
+from contessa.models import (
+    create_default_check_class,
+    QualityCheck,
+    ResultTable,
+    TIME_FILTER_DEFAULT,
+)
+
+
+class ResultReader:
+    """
+    Read API for quality check results. All the queries are keyset-paginated and served
+    by indexes of the result table (see `QualityCheck.__table_args__`). Rules are identified
+    by time filter without the time it was evaluated at, so all the runs of a time filtered
+    rule are results of the same rule.
+
+    Rows are yielded as dicts, fetched from db in chunks of `chunk_size`. To continue
+    reading where the previous page ended, pass key of its last row (see `key_of`)
+    as `after`.
+
+        reader = ResultReader(engine, {"schema_name": "dq", "table_name": "my_table"})
+        page = list(islice(reader.invalid_since(since), 50))
+        next_page = list(islice(reader.invalid_since(since, after=reader.key_of(page[-1])), 50))
+    """
+
+    def __init__(
+        self,
+        conn_uri_or_engine,
+        result_table: Dict,
+        model_cls=QualityCheck,
+        chunk_size: int = 1000,
+    ):
+        self.conn = Connector(conn_uri_or_engine)
+        self.check_cls = create_default_check_class(
+            ResultTable(**result_table, model_cls=model_cls)
+        )
+        self.table = self.check_cls.__table__
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def key_of(row: Dict, key: Sequence[str] = ("task_ts", "id")) -> tuple:
+        """
+        Keyset cursor of the row. Use `identity_of` for rows of `latest`.
+        """
+        return tuple(row[k] for k in key)
+
+    # keyset cursor of rows of `latest`
+    identity_of = staticmethod(stable_identity)
+
+    def latest(self, after: Optional[tuple] = None) -> Iterator[Dict]:
+        """
+        Latest result of each rule, ordered by rule (`stable_identity`) descending, so all
+        the columns are ordered the same way and the index can be scanned backwards.
+        """
+        t = self.table
+        identity = stable_identity_columns(t)
+        stmt = select([t]).distinct(*identity)
+        return self._paginate(
+            stmt,
+            identity,
+            after,
+            descending=True,
+            tiebreak=[t.c.task_ts.desc(), t.c.id.desc()],
+            key_of=self.identity_of,
+        )
+
+    def rule_history(
+        self,
+        attribute: str,
+        rule_name: str,
+        rule_type: str,
+        time_filter: Optional[str] = None,
+        since: Optional[Union[date, datetime]] = None,
+        after: Optional[tuple] = None,
+    ) -> Iterator[Dict]:
+        """
+        Results of one rule, newest first. `time_filter` can be given with or without
+        the time it was evaluated at, results of all the runs are returned.
+        """
+        t = self.table
+        conditions = [
+            t.c.attribute == attribute,
+            t.c.rule_name == rule_name,
+            t.c.rule_type == rule_type,
+            stable_time_filter_sql(t.c.time_filter)
+            == stable_time_filter(time_filter or TIME_FILTER_DEFAULT),
+        ]
+        if since is not None:
+            conditions.append(t.c.task_ts >= since)
+        stmt = select([t]).where(and_(*conditions))
+        return self._paginate(stmt, [t.c.task_ts, t.c.id], after, descending=True)
+
+    def invalid_since(
+        self, since: Union[date, datetime], after: Optional[tuple] = None
+    ) -> Iterator[Dict]:
+        """
+        Invalid results with task_ts >= `since`, oldest first.
+        """
+        t = self.table
+        stmt = select([t]).where(and_(t.c.status == "invalid", t.c.task_ts >= since))
+        return self._paginate(stmt, [t.c.task_ts, t.c.id], after, descending=False)
+
+    def _paginate(
+        self, stmt, key, after, descending: bool, tiebreak=(), key_of=None
+    ) -> Iterator[Dict]:
+        """
+        Run `stmt` page by page, each page continues after the last key of the previous one.
+        :param tiebreak: order by after the key, e.g. to pick the row of DISTINCT ON `key`
+        :param key_of: computes the key of a row, if `key` aren't plain columns
+        """
+        order_by = [c.desc() for c in key] if descending else list(key)
+        while True:
+            page = stmt.order_by(*order_by, *tiebreak).limit(self.chunk_size)
+            if after is not None:
+                cond = tuple_(*key) < after if descending else tuple_(*key) > after
+                page = page.where(cond)
+            rows = [dict(r) for r in self.conn.execute(page)]
+            yield from rows
+            if len(rows) < self.chunk_size:
+                return
+            after = (
+                key_of(rows[-1])
+                if key_of
+                else self.key_of(rows[-1], [c.name for c in key])
+            )
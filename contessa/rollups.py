@@ -0,0 +1,97 @@
+"""
+Rollups of quality check results per rule and day/week.
+
+Rollup rows are not incremented, but re-computed from the quality check table for the groups
+(period, rule) touched by the new results. So upserting the same results again (re-run of
+a task) doesn't count them twice.
+"""
+import logging
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, cast, Date, func, literal, select, Table, tuple_
+from sqlalchemy.dialects.postgresql import DOUBLE_PRECISION, insert, TIMESTAMP
+
+from contessa.db import Connector
+from contessa.history import stable_identity, stable_identity_columns
+
+ROLLUP_PERIODS = ("day", "week")
+
+# rows with task_ts outside of this margin around the new results can't belong to
+# the same day/week, it only narrows the scan (and prunes partitions)
+_SCAN_MARGIN = timedelta(days=8)
+
+
+def rollup_select(source: Table, period: str, rows: Optional[List[Dict]] = None):
+    """
+    Select aggregating `source` quality check table per `period` and rule. If `rows` are given,
+    only the groups they belong to are selected.
+
+    Rules are grouped by time filter without the time it was evaluated at, so all the runs
+    of a time filtered rule are in the same group.
+    """
+    period_start = func.date_trunc(period, source.c.task_ts)
+    identity = stable_identity_columns(source)
+    total_records = func.sum(source.c.total_records)
+    passed = func.sum(source.c.passed)
+
+    stmt = select(
+        [
+            literal(period).label("period"),
+            cast(period_start, Date).label("period_start"),
+            *identity[:3],
+            identity[3].label("time_filter"),
+            total_records.label("total_records"),
+            func.sum(source.c.failed).label("failed"),
+            passed.label("passed"),
+            (cast(passed, DOUBLE_PRECISION) / func.nullif(total_records, 0)).label(
+                "pass_rate"
+            ),
+            func.count().label("run_count"),
+            func.now().label("updated_at"),
+        ]
+    ).group_by(period_start, *identity)
+
+    if rows is not None:
+        timestamps = {row["task_ts"] for row in rows}
+        identities = {stable_identity(row) for row in rows}
+        stmt = stmt.where(
+            and_(
+                source.c.task_ts >= min(timestamps) - _SCAN_MARGIN,
+                source.c.task_ts < max(timestamps) + _SCAN_MARGIN,
+                period_start.in_(
+                    [
+                        func.date_trunc(period, cast(ts, TIMESTAMP(timezone=True)))
+                        for ts in timestamps
+                    ]
+                ),
+                tuple_(*identity).in_(list(identities)),
+            )
+        )
+    return stmt
+
+
+def update_rollups(
+    conn: Connector, source: Table, rollup: Table, rows: Optional[List[Dict]] = None
+):
+    """
+    Re-compute daily and weekly rollups of the groups that `rows` (just upserted results
+    of `source` table) belong to. Without `rows`, all the rollups are re-computed.
+    """
+    if rows is not None and not rows:
+        return
+    session = conn.make_session()
+    try:
+        for period in ROLLUP_PERIODS:
+            select_stmt = rollup_select(source, period, rows)
+            columns = list(select_stmt.c.keys())
+            stmt = insert(rollup).from_select(columns, select_stmt)
+            session.execute(conn._on_conflict_do_update(stmt, rollup, columns))
+        session.commit()
+    except:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+    logging.info(f"Updated rollups of {source.fullname}.")
@@ -77,9 +77,14 @@ class SqlRule(Rule):
         with conn.engine.connect() as con:
             result = con.execution_options(stream_results=True).execute(sql)
             for row in result:
+                keep_example = (
+                    example_selector.limit is None
+                    or len(failed_rows) < example_selector.limit
+                )
                 if self.only_failures_mode:
                     failed += 1
-                    failed_rows.add(tuple(row))
+                    if keep_example:
+                        failed_rows.add(tuple(row))
                 else:
                     if not isinstance(row[0], bool) and not row[0] is None:
                         raise ValueError(
@@ -90,7 +95,8 @@ class SqlRule(Rule):
                         passed += 1
                     if row[0] is False:
                         failed += 1
-                        failed_rows.add(tuple(islice(row.values(), 1, None)))
+                        if keep_example:
+                            failed_rows.add(tuple(islice(row.values(), 1, None)))
 
         failed_examples = example_selector.select_examples(failed_rows)
 
@@ -1,29 +1,50 @@
 import logging
-from typing import List, Dict, Optional, Union
+import sys
+from typing import Iterable, List, Dict, Optional, Union
 
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from contessa.base_rules import Rule
 from contessa.db import Connector
 from contessa.executor import get_executor, refresh_executors
 from contessa.failed_examples import ExampleSelector, default_example_selector
+from contessa.history import HistoryCache
+from contessa.journal import RunJournal
 from contessa.models import (
     create_default_check_class,
+    FailedExample,
     Table,
     ResultTable,
     QualityCheck,
+    QualityCheckRollup,
     CheckResult,
 )
 from contessa.normalizer import RuleNormalizer
+from contessa.sinks import ResultSink, WriteBehindSink
+from contessa.utils import AggregatedResult, chunked
+from contessa.rollups import update_rollups
 from contessa.rules import get_rule_cls
 
 
 class ContessaRunner:
     model_cls = QualityCheck
 
-    def __init__(self, conn_uri_or_engine, special_qc_map=None):
+    def __init__(
+        self,
+        conn_uri_or_engine,
+        special_qc_map=None,
+        history_cache: Optional[HistoryCache] = None,
+        engine_options: Optional[Dict] = None,
+    ):
+        """
+        :param history_cache: HistoryCache to serve history of results (for medians) from
+            memory. Useful for long-living processes that run many checks.
+        :param engine_options: pool settings etc. for the shared engine, see `get_engine`
+        """
         self.conn_uri_or_engine = conn_uri_or_engine
-        self.conn = Connector(conn_uri_or_engine)
+        self.conn = Connector(
+            conn_uri_or_engine, history_cache=history_cache, **(engine_options or {})
+        )
 
         # todo - allow cfg
         self.special_qc_map = special_qc_map or {}
@@ -37,13 +58,64 @@ class ContessaRunner:
         ] = None,  # todo - docs for quality name, maybe defaults..
         context: Optional[Dict] = None,
         example_selector: ExampleSelector = default_example_selector,
-    ) -> List[Union[CheckResult, QualityCheck]]:
+        write_behind: bool = False,
+        sink: Optional[ResultSink] = None,
+        return_objects: bool = True,
+        store_failed_examples: bool = False,
+        rollups: bool = False,
+        delta: bool = False,
+        skip_existing: bool = False,
+        checkpoint_every: Optional[int] = None,
+        resume: bool = False,
+        journal: Optional[str] = None,
+    ) -> List[Union[CheckResult, QualityCheck, Dict]]:
+        """
+        :param write_behind: with `result_table`, write results from a background thread as
+            the rules finish (see `WriteBehindSink`), instead of one upsert at the end
+        :param sink: stream results to `ResultSink` (e.g. `JsonLinesSink`) instead of
+            `result_table`. Results are not kept in memory and empty list is returned.
+            Open it (`with sink:`) around several runs to write them all to one file.
+        :param return_objects: with `result_table`, return `QualityCheck` objects. If False,
+            plain dicts of column values are returned, it spares instantiating of orm objects.
+        :param store_failed_examples: with `result_table`, write failed examples of each rule
+            to `failed_example_*` table as soon as the rule finishes
+        :param rollups: with `result_table`, update daily and weekly rollups of results
+            in `quality_rollup_*` table, see `contessa.rollups`
+        :param delta: with `result_table`, don't insert results that are the same as
+            the latest stored result of the rule, only move its `last_seen`
+            (see `Connector.upsert_rows`). Can't be used with `rollups`.
+        :param skip_existing: with `result_table`, run only rules that don't have result
+            for `task_ts` yet (e.g. retry of a task). Only the new results are returned.
+        :param checkpoint_every: with `result_table`, upsert results in batches of this
+            number of rules as they finish, so they are not lost if the run fails
+        :param resume: continue a failed run with the same `task_ts`. With `result_table` it's
+            the same as `skip_existing`, otherwise it needs `journal`.
+        :param journal: without `result_table`, path of local file where the results are
+            journaled as the rules finish (see `RunJournal`)
+        """
+        if result_table and sink is not None:
+            raise ValueError("Use either `result_table` or `sink`, not both.")
+        if store_failed_examples and not result_table:
+            raise ValueError("`store_failed_examples` needs `result_table`.")
+        if rollups and not result_table:
+            raise ValueError("`rollups` needs `result_table`.")
+        if rollups and delta:
+            # unchanged results are not stored, rollups would miss their runs
+            raise ValueError("`rollups` can't be used with `delta`.")
+        if skip_existing and not result_table:
+            raise ValueError("`skip_existing` needs `result_table`.")
+        if journal is not None and (result_table or sink is not None):
+            raise ValueError("`journal` can't be used with `result_table` or `sink`.")
+        if resume and not result_table and journal is None:
+            raise ValueError("`resume` needs `result_table` or `journal`.")
+        skip_existing = skip_existing or (resume and bool(result_table))
         check_table = Table(**check_table)
         context = self.get_context(check_table, context)
 
         normalized_rules = self.normalize_rules(raw_rules)
         refresh_executors(check_table, self.conn, context, example_selector)
 
+        result_table_def = result_table
         if result_table:
             result_table = ResultTable(**result_table, model_cls=self.model_cls)
             quality_check_class = self.get_quality_check_class(result_table)
@@ -52,11 +124,165 @@ class ContessaRunner:
             quality_check_class = CheckResult
 
         rules = self.build_rules(normalized_rules)
-        objs = self.do_quality_checks(quality_check_class, rules, context)
+        if skip_existing:
+            rules = self.skip_existing_rules(quality_check_class, rules, context)
+        if sink is not None:
+            with sink:
+                for obj in self.iter_quality_checks(
+                    quality_check_class, rules, context
+                ):
+                    sink.write(obj)
+            return []
 
-        if result_table:
-            self.conn.upsert(objs)
-        return objs
+        if journal is not None:
+            return self.do_journaled_quality_checks(
+                rules, context, RunJournal(journal), resume
+            )
+        if not result_table:
+            return self.do_quality_checks(quality_check_class, rules, context)
+
+        if result_table.fullname in self.special_qc_map:
+            if store_failed_examples or rollups:
+                raise ValueError(
+                    "`store_failed_examples` and `rollups` can't be used with special "
+                    "quality check class."
+                )
+            # special classes can have their own `init_row`, stick with the orm objects
+            return self.persist(
+                self.iter_quality_checks(quality_check_class, rules, context),
+                write_behind,
+                delta=delta,
+                checkpoint_every=checkpoint_every,
+            )
+
+        if store_failed_examples:
+            examples_cls = create_default_check_class(
+                ResultTable(**result_table_def, model_cls=FailedExample)
+            )
+            self.conn.ensure_table(examples_cls.__table__)
+            with WriteBehindSink(self.conn, examples_cls.__table__) as examples_sink:
+                rows = self.persist(
+                    self.iter_quality_rows(
+                        quality_check_class,
+                        rules,
+                        context,
+                        examples_cls,
+                        examples_sink,
+                    ),
+                    write_behind,
+                    quality_check_class.__table__,
+                    delta,
+                    checkpoint_every,
+                )
+        else:
+            rows = self.persist(
+                self.iter_quality_rows(quality_check_class, rules, context),
+                write_behind,
+                quality_check_class.__table__,
+                delta,
+                checkpoint_every,
+            )
+        if rollups:
+            self.refresh_rollups(result_table_def, quality_check_class.__table__, rows)
+        if return_objects:
+            return [quality_check_class(**row) for row in rows]
+        return rows
+
+    def skip_existing_rules(
+        self, dq_cls, rules: List[Rule], context: Dict
+    ) -> List[Rule]:
+        """
+        Leave out rules that already have result for `task_ts` in the result table.
+        """
+        existing = dq_cls.load_existing(self.conn, context["task_ts"])
+        ret = [r for r in rules if dq_cls.rule_identity(r) not in existing]
+        logging.info(f"Skipping {len(rules) - len(ret)} rules with existing results.")
+        return ret
+
+    def persist(
+        self,
+        objs: Iterable,
+        write_behind: bool = False,
+        table=None,
+        delta: bool = False,
+        checkpoint_every: Optional[int] = None,
+    ) -> List:
+        """
+        Upsert results to the result table. Results are orm objects, or plain dicts
+        of column values if `table` is given.
+        :param delta: skip unchanged results, see `Connector.upsert_rows`
+        :param checkpoint_every: upsert in batches of this size as the results come
+        :return: list of results (including the unchanged ones)
+        """
+        upsert_options = {}
+        if delta and table is None:
+            upsert_options = {"delta": True}
+        elif delta:
+            upsert_options = {
+                "delta_key": self.model_cls._delta_key,
+                "delta_columns": self.model_cls._delta_columns,
+            }
+
+        if not write_behind:
+            ret = []
+            for batch in chunked(objs, checkpoint_every or sys.maxsize):
+                if table is None:
+                    self.conn.upsert(batch, **upsert_options)
+                else:
+                    self.conn.upsert_rows(table, batch, **upsert_options)
+                ret.extend(batch)
+            return ret
+
+        ret = []
+        with WriteBehindSink(self.conn, table, upsert_options=upsert_options) as sink:
+            for obj in objs:
+                sink.write(obj)
+                ret.append(obj)
+        return ret
+
+    def get_rollup_class(self, result_table: Dict):
+        table = ResultTable(
+            result_table["schema_name"],
+            result_table["table_name"],
+            model_cls=QualityCheckRollup,
+        )
+        rollup_cls = create_default_check_class(table)
+        self.conn.ensure_table(rollup_cls.__table__)
+        return rollup_cls
+
+    def refresh_rollups(self, result_table: Dict, source, rows: Optional[List[Dict]]):
+        rollup_cls = self.get_rollup_class(result_table)
+        update_rollups(self.conn, source, rollup_cls.__table__, rows)
+
+    def rebuild_rollups(self, result_table: Dict):
+        """
+        Re-compute all the rollups of the result table, e.g. to backfill them for results
+        written before rollups were turned on.
+        """
+        quality_check_class = self.get_quality_check_class(
+            ResultTable(**result_table, model_cls=self.model_cls)
+        )
+        self.refresh_rollups(result_table, quality_check_class.__table__, None)
+
+    def drop_expired_results(
+        self, result_table: Dict, retention: timedelta
+    ) -> List[str]:
+        """
+        Drop monthly partitions of partitioned result table (and its failed examples table)
+        that contain only results older than `retention`. Results in the partition of
+        the oldest retained day are kept, so up to one more month of history can remain.
+        :return: names of dropped partitions
+        """
+        older_than = datetime.now() - retention
+        dropped = []
+        for model_cls in (self.model_cls, FailedExample):
+            table = ResultTable(**result_table, model_cls=model_cls)
+            if model_cls is self.model_cls:
+                cls = self.get_quality_check_class(table)
+            else:
+                cls = create_default_check_class(table)
+            dropped.extend(self.conn.drop_expired_partitions(cls.__table__, older_than))
+        return dropped
 
     @staticmethod
     def get_context(check_table: Table, context: Optional[Dict] = None) -> Dict:
@@ -79,20 +305,69 @@ class ContessaRunner:
         Run quality check for all rules. Use `qc_cls` to construct objects that will be inserted
         afterwards.
         """
+        return list(self.iter_quality_checks(dq_cls, rules, context))
+
+    def do_journaled_quality_checks(
+        self, rules: List[Rule], context: Dict, journal: RunJournal, resume: bool
+    ) -> List[CheckResult]:
+        """
+        Same as `do_quality_checks` with `CheckResult`, but every result is written
+        to the journal as soon as the rule finishes. If `resume`, results of the rules
+        journaled for the same `task_ts` are taken from the journal instead.
+        """
+        done = journal.load(context) if resume else {}
+        if done:
+            logging.info(f"Resuming, {len(done)} rules are done already.")
         ret = []
-        for rule in rules:
-            obj = self.apply_rule(context, dq_cls, rule)
-            ret.append(obj)
+        with journal:
+            for rule in rules:
+                identity = QualityCheck.rule_identity(rule)
+                obj = done.get(identity)
+                if obj is None:
+                    obj = self.apply_rule(context, CheckResult, rule)
+                    journal.write(obj, identity)
+                ret.append(obj)
         return ret
 
+    def iter_quality_checks(self, dq_cls, rules: List[Rule], context: Dict = None):
+        """
+        Same as `do_quality_checks`, but yields objects one by one as the rules finish.
+        """
+        for rule in rules:
+            yield self.apply_rule(context, dq_cls, rule)
+
+    def iter_quality_rows(
+        self,
+        dq_cls,
+        rules: List[Rule],
+        context: Dict = None,
+        examples_cls=None,
+        examples_sink: Optional[ResultSink] = None,
+    ):
+        """
+        Same as `iter_quality_checks`, but yields plain dicts of column values (see
+        `QualityCheck.build_row`) instead of orm objects.
+        :param examples_cls: `FailedExample` class, rows of it are written to `examples_sink`
+            as soon as the rule is finished, so examples are not held in memory
+        """
+        for rule in rules:
+            results = self.execute_rule(rule)
+            if examples_sink is not None and results.failed_example:
+                examples_sink.write(examples_cls.build_row(rule, results, context))
+            yield dq_cls.build_row(rule, results, self.conn, context)
+
     def apply_rule(self, context, dq_cls, rule):
-        e = get_executor(rule)
-        logging.info(f"Executing rule `{rule}`.")
-        results = e.execute(rule)
+        results = self.execute_rule(rule)
         obj = dq_cls()
         obj.init_row(rule, results, self.conn, context)
         return obj
 
+    @staticmethod
+    def execute_rule(rule: Rule) -> AggregatedResult:
+        e = get_executor(rule)
+        logging.info(f"Executing rule `{rule}`.")
+        return e.execute(rule)
+
     @staticmethod
     def build_rules(normalized_rules):
         """
@@ -0,0 +1,296 @@
+import abc
+import csv
+import json
+import logging
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import Table
+
+from contessa.db import Connector
+
+_STOP = object()
+
+# keys of the run context that identify the result, others are left out from the files
+CONTEXT_FIELDS = ("task_ts", "table_fullname", "left_table_name", "right_table_name")
+
+
+class ResultSink(metaclass=abc.ABCMeta):
+    """
+    Destination of results. It receives them one by one, as the rules are finished.
+    Use it as context manager, so it's properly opened and closed (flushed).
+
+    Nested `with` blocks reuse the opened sink, it's closed when the outermost one exits.
+    So runs that get the sink (`ContessaRunner.run(sink=...)`) write to the same file
+    if the caller opens it around all of them.
+    """
+
+    # depth of nested `with` blocks
+    _depth = 0
+
+    def __enter__(self):
+        if self._depth == 0:
+            self.open()
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._depth -= 1
+        if self._depth:
+            return
+        if exc_type is None:
+            self.close()
+            return
+        # don't hide the original error
+        try:
+            self.close()
+        except Exception:
+            logging.exception(f"Failed to close {self.__class__.__name__}.")
+
+    def open(self):
+        pass
+
+    @abc.abstractmethod
+    def write(self, obj):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class WriteBehindSink(ResultSink):
+    """
+    Upserts results to db from a background thread, so writing overlaps with execution
+    of the next rules. Results are written in batches of `batch_size`, or after `flush_interval`
+    seconds since the first result of the batch was received. Everything is flushed on close.
+
+    If a write fails, the error is raised by the next `write` (or `close`) call.
+
+    :param table: if given, results are plain dicts of column values of this table
+        (see `QualityCheck.build_row`), otherwise orm objects
+    :param upsert_options: passed to `Connector.upsert` (`upsert_rows`), e.g. for delta mode
+    """
+
+    def __init__(
+        self,
+        conn: Connector,
+        table: Table = None,
+        batch_size: int = 500,
+        flush_interval: float = 5.0,
+        max_queue_size: int = None,
+        upsert_options: Optional[Dict] = None,
+    ):
+        self.conn = conn
+        self.table = table
+        self.upsert_options = upsert_options or {}
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        if max_queue_size is None:
+            max_queue_size = batch_size * 10
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = None
+        self._error = None
+
+    def open(self):
+        self._thread = threading.Thread(
+            target=self._consume, name="contessa-write-behind", daemon=True
+        )
+        self._thread.start()
+
+    def write(self, obj):
+        self._raise_error()
+        self._queue.put(obj)
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def _consume(self):
+        batch = []
+        deadline = None
+        stop = False
+        while not stop:
+            timeout = None if not batch else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                stop = True
+            elif item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+
+            if batch and (stop or item is None or len(batch) >= self.batch_size):
+                self._write(batch)
+                batch = []
+
+    def _write(self, batch):
+        # after a failure the rest is thrown away, the run is going to fail anyway
+        if self._error is not None:
+            return
+        try:
+            if self.table is None:
+                self.conn.upsert(batch, **self.upsert_options)
+            else:
+                self.conn.upsert_rows(self.table, batch, **self.upsert_options)
+        except Exception as e:
+            logging.exception(f"Writing of {len(batch)} results failed.")
+            self._error = e
+
+
+def result_to_dict(obj) -> Dict:
+    """
+    Flat dict of the result, either `CheckResult` or persistent model (e.g. `QualityCheck`).
+    """
+    if isinstance(obj, dict):
+        return dict(obj)
+    if hasattr(obj, "__table__"):
+        return Connector.model2dict(obj)
+    data = {k: getattr(obj, k, None) for k in obj.__annotations__ if k != "context"}
+    context = getattr(obj, "context", None) or {}
+    data.update({k: context[k] for k in CONTEXT_FIELDS if k in context})
+    return data
+
+
+class FileSink(ResultSink):
+    """
+    Base for sinks that stream results to a local file. The file is truncated when the sink
+    is opened for the first time, results are appended to it if it's opened again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._reopened = False
+
+    def open(self):
+        self._file = open(self.path, "a" if self._reopened else "w", newline="")
+        self._reopened = True
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class JsonLinesSink(FileSink):
+    """
+    Writes one json object per result.
+    """
+
+    def write(self, obj):
+        self._file.write(json.dumps(result_to_dict(obj), default=str))
+        self._file.write("\n")
+
+
+class CsvSink(FileSink):
+    """
+    Writes results as csv with header. Columns are taken from the first result,
+    `failed_example` is json encoded.
+    """
+
+    def __init__(self, path: str, **fmtparams):
+        super().__init__(path)
+        self.fmtparams = fmtparams
+        self._writer = None
+        self._fieldnames = None
+
+    def write(self, obj):
+        data = result_to_dict(obj)
+        if "failed_example" in data:
+            data["failed_example"] = json.dumps(data["failed_example"], default=str)
+        if self._writer is None:
+            # header is written once, appended results have the same columns
+            header = self._fieldnames is None
+            if header:
+                self._fieldnames = list(data.keys())
+            self._writer = csv.DictWriter(
+                self._file, fieldnames=self._fieldnames, **self.fmtparams
+            )
+            if header:
+                self._writer.writeheader()
+        self._writer.writerow(data)
+
+    def close(self):
+        self._writer = None
+        super().close()
+
+
+class ParquetSink(ResultSink):
+    """
+    Writes results to a parquet file, one row group per `row_group_size` results, so only
+    one row group is held in memory. Schema is inferred from the first row group,
+    `failed_example` is json encoded. Needs `pyarrow` (`pip install contessa[parquet]`).
+
+    Parquet file can't be appended to, so the sink can be opened only once. To write results
+    of several runs, open it around all of them.
+    """
+
+    def __init__(self, path: str, row_group_size: int = 10_000):
+        self.path = path
+        self.row_group_size = row_group_size
+        self._rows = []
+        self._writer = None
+        self._closed = False
+
+    def open(self):
+        if self._closed:
+            raise ValueError(
+                f"ParquetSink of {self.path} was already closed, open it around all the runs."
+            )
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError(
+                "ParquetSink needs `pyarrow`, install it with `pip install contessa[parquet]`."
+            )
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+
+    def write(self, obj):
+        data = result_to_dict(obj)
+        if "failed_example" in data:
+            data["failed_example"] = json.dumps(data["failed_example"], default=str)
+        self._rows.append(data)
+        if len(self._rows) >= self.row_group_size:
+            self._write_row_group()
+
+    def close(self):
+        if self._rows:
+            self._write_row_group()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._closed = True
+
+    def _write_row_group(self):
+        rows: List[Dict] = self._rows
+        self._rows = []
+        columns = {k: [r.get(k) for r in rows] for k in rows[0].keys()}
+        if self._writer is None:
+            table = self._pa.Table.from_pydict(columns)
+            # columns that are empty in the first row group (e.g. time_filter) can't stay null
+            schema = self._pa.schema(
+                [
+                    f.with_type(self._pa.string()) if f.type == self._pa.null() else f
+                    for f in table.schema
+                ]
+            )
+            table = table.cast(schema)
+            self._writer = self._pq.ParquetWriter(self.path, schema)
+        else:
+            table = self._pa.Table.from_pydict(columns, schema=self._writer.schema)
+        self._writer.write_table(table)
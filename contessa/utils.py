@@ -1,12 +1,19 @@
+import queue
 import re
-from dataclasses import dataclass
-from typing import Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, List, NamedTuple
 
 import jinja2
 
 
-@dataclass
-class AggregatedResult:
+class AggregatedResult(NamedTuple):
+    """
+    Aggregated result of one rule or consistency check. Immutable and without
+    per-instance dict.
+    """
+
     total_records: int
     failed: int
     passed: int
@@ -21,3 +28,71 @@ def render_jinja_sql(sql, ctx):
     rendered = t.render(**ctx)
     rendered = re.sub(r"%", "%%", rendered)
     return rendered
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    """
+    Split iterable to lists of `size` items, the last one can be shorter.
+    """
+    it = iter(iterable)
+    chunk = list(islice(it, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(it, size))
+
+
+def run_concurrently(*fns: Callable) -> List:
+    """
+    Call `fns` each in its own thread, e.g. queries of left and right side of a consistency
+    check, which can be on different servers.
+    :return: results in the same order as `fns`, first exception is re-raised
+    """
+    with ThreadPoolExecutor(max_workers=len(fns)) as executor:
+        futures = [executor.submit(fn) for fn in fns]
+        return [f.result() for f in futures]
+
+
+_END = object()
+
+
+def read_ahead(
+    iterable: Iterable, chunk_size: int = 1000, chunks: int = 10
+) -> Iterator:
+    """
+    Iterate `iterable` in a background thread, so e.g. two db cursors can be fetched
+    concurrently. At most `chunks` chunks of `chunk_size` items are buffered.
+    """
+    buffer = queue.Queue(maxsize=chunks)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for chunk in chunked(iterable, chunk_size):
+                if not put(chunk):
+                    return
+            put(_END)
+        except Exception as e:
+            put(e)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield from item
+    finally:
+        stop.set()
+        thread.join()
@@ -21,6 +21,7 @@ setup(
         "click>=7.0",
         "packaging>=19.2",
     ],
+    extras_require={"parquet": ["pyarrow"], "numpy": ["numpy"]},
     tests_require=["pytest"],
     python_requires=">=3.6",
     entry_points={
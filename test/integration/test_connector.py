@@ -48,3 +48,28 @@ def test_upsert_qualitycheck(conn: Connector):
     assert row[0].price == 42
 
     s.close()
+
+
+def test_upsert_copy(conn: Connector):
+    from sqlalchemy import Column, UniqueConstraint
+    from sqlalchemy.dialects.postgresql import TEXT, INTEGER, BIGINT
+
+    class B(DQBase):
+        id = Column(BIGINT, primary_key=True)
+        name = Column(TEXT, nullable=False)
+        price = Column(INTEGER)
+
+        __tablename__ = "my_copy_table"
+        __table_args__ = (UniqueConstraint("name", name=f"unique_copy_test",),)
+
+    conn.ensure_table(B.__table__)
+    conn.upsert([B(name=f"name {i}\t", price=i) for i in range(10)], use_copy=True)
+    conn.upsert([B(name="name 1\t", price=42)], use_copy=True)
+    conn.upsert([B(name=f"chunk {i}", price=i) for i in range(5)], chunk_size=2)
+
+    rows = conn.get_records(
+        "select name, price from data_quality.my_copy_table order by id"
+    ).fetchall()
+    assert len(rows) == 15
+    assert rows[1]["name"] == "name 1\t"
+    assert rows[1]["price"] == 42
@@ -5,6 +5,8 @@ from test.integration.conftest import TEST_DB_URI
 import unittest
 from unittest import mock
 
+from sqlalchemy import create_engine
+
 from contessa import ConsistencyChecker
 
 
@@ -230,3 +232,260 @@ class TestConsistencyChecker(unittest.TestCase):
         )
 
         self.assertEqual("invalid", result.status)
+
+    @mock.patch("contessa.executor.datetime", FakedDatetime)
+    def test_execute_consistency_hash_diff(self):
+        self.consistency_checker.hash_diff_fanout = 2
+        self.consistency_checker.hash_diff_leaf_rows = 1
+        result = self.consistency_checker.run(
+            self.consistency_checker.HASH_DIFF,
+            left_check_table={"schema_name": "tmp", "table_name": self.left_table_name},
+            right_check_table={
+                "schema_name": "hello",
+                "table_name": self.right_table_name,
+            },
+            key_columns=["id"],
+            context={"task_ts": self.now},
+        )
+
+        self.assertEqual("invalid", result.status)
+        self.assertEqual(result.total_records, 4)
+        self.assertEqual(result.passed, 3)
+        self.assertEqual(result.failed, 1)
+        self.assertEqual(len(result.failed_example), 1)
+
+        self.conn.execute(
+            f"""
+            INSERT INTO hello.{self.right_table_name}
+                (src, dst, price, turnover_after_refunds, initial_price, created_at)
+            VALUES
+                ('VIE', 'VIE', 4, 0.0, 0.0, '2018-09-11T11:50:00')
+        """
+        )
+        result = self.consistency_checker.run(
+            self.consistency_checker.HASH_DIFF,
+            left_check_table={"schema_name": "tmp", "table_name": self.left_table_name},
+            right_check_table={
+                "schema_name": "hello",
+                "table_name": self.right_table_name,
+            },
+            key_columns=["id"],
+            context={"task_ts": self.now},
+        )
+        self.assertEqual("valid", result.status)
+        self.assertEqual(result.passed, 4)
+
+    @mock.patch("contessa.executor.datetime", FakedDatetime)
+    def test_execute_consistency_digest_diff(self):
+        result = self.consistency_checker.run(
+            self.consistency_checker.DIGEST_DIFF,
+            left_check_table={"schema_name": "tmp", "table_name": self.left_table_name},
+            right_check_table={
+                "schema_name": "hello",
+                "table_name": self.right_table_name,
+            },
+            key_columns=["id"],
+            context={"task_ts": self.now},
+        )
+
+        self.assertEqual("invalid", result.status)
+        self.assertEqual(result.passed, 3)
+        self.assertEqual(result.failed, 1)
+        # full row of the missing record, columns are sorted by name: created_at, dst, id, ...
+        self.assertEqual(result.failed_example[0][1:3], ("VIE", 4))
+
+    @mock.patch("contessa.executor.datetime", FakedDatetime)
+    def test_execute_consistency_merge_diff(self):
+        result = self.consistency_checker.run(
+            self.consistency_checker.MERGE_DIFF,
+            left_check_table={"schema_name": "tmp", "table_name": self.left_table_name},
+            right_check_table={
+                "schema_name": "hello",
+                "table_name": self.right_table_name,
+            },
+            context={"task_ts": self.now},
+        )
+
+        self.assertEqual("invalid", result.status)
+        self.assertEqual(result.total_records, 4)
+        self.assertEqual(result.passed, 3)
+        self.assertEqual(result.failed, 1)
+
+    @mock.patch("contessa.executor.datetime", FakedDatetime)
+    def test_execute_consistency_digests_with_different_session_settings(self):
+        # timestamptz and double precision columns are printed by session settings
+        right_engine = create_engine(
+            TEST_DB_URI,
+            connect_args={"options": "-c TimeZone=Asia/Tokyo -c extra_float_digits=0"},
+        )
+        checker = ConsistencyChecker(TEST_DB_URI, right_engine)
+        for method in (
+            checker.DIGEST_DIFF,
+            checker.MERGE_DIFF,
+            checker.KEY_DIFF,
+            checker.HASH_DIFF,
+        ):
+            result = checker.run(
+                method,
+                left_check_table={
+                    "schema_name": "tmp",
+                    "table_name": self.left_table_name,
+                },
+                right_check_table={
+                    "schema_name": "hello",
+                    "table_name": self.right_table_name,
+                },
+                key_columns=["id"],
+                context={"task_ts": self.now},
+            )
+            self.assertEqual(result.passed, 3, method)
+            self.assertEqual(result.failed, 1, method)
+
+    @mock.patch("contessa.executor.datetime", FakedDatetime)
+    def test_execute_consistency_key_diff(self):
+        self.conn.execute(
+            f"UPDATE hello.{self.right_table_name} SET price = 2 WHERE src = 'BTS'"
+        )
+        self.consistency_checker.run(
+            self.consistency_checker.KEY_DIFF,
+            left_check_table={"schema_name": "tmp", "table_name": self.left_table_name},
+            right_check_table={
+                "schema_name": "hello",
+                "table_name": self.right_table_name,
+            },
+            result_table={
+                "schema_name": "data_quality",
+                "table_name": self.result_table_name,
+            },
+            key_columns=["id"],
+            context={"task_ts": self.now},
+        )
+
+        rows = self.conn.get_records(
+            f"SELECT * from data_quality.consistency_check_{self.result_table_name}"
+        )
+        row = rows.fetchone()
+        self.assertEqual(row["status"], "invalid")
+        self.assertEqual(row["description"], "missing: 1, extra: 0, changed: 1")
+
+    @mock.patch("contessa.executor.datetime", FakedDatetime)
+    def test_execute_consistency_key_ranges(self):
+        for method in (
+            self.consistency_checker.DIFF,
+            self.consistency_checker.KEY_DIFF,
+        ):
+            result = self.consistency_checker.run(
+                method,
+                left_check_table={
+                    "schema_name": "tmp",
+                    "table_name": self.left_table_name,
+                },
+                right_check_table={
+                    "schema_name": "hello",
+                    "table_name": self.right_table_name,
+                },
+                key_columns=["id"],
+                key_ranges=3,
+                max_workers=2,
+                context={"task_ts": self.now},
+            )
+
+            self.assertEqual("invalid", result.status)
+            self.assertEqual(result.total_records, 4)
+            self.assertEqual(result.passed, 3)
+            self.assertEqual(result.failed, 1)
+
+    @mock.patch("contessa.executor.datetime", FakedDatetime)
+    def test_execute_consistency_approx_count(self):
+        self.conn.execute(f"ANALYZE tmp.{self.left_table_name}")
+        self.conn.execute(f"ANALYZE hello.{self.right_table_name}")
+        self.consistency_checker.approx_count_tolerance = 0
+        result = self.consistency_checker.run(
+            self.consistency_checker.APPROX_COUNT,
+            left_check_table={"schema_name": "tmp", "table_name": self.left_table_name},
+            right_check_table={
+                "schema_name": "hello",
+                "table_name": self.right_table_name,
+            },
+            context={"task_ts": self.now},
+        )
+
+        self.assertEqual("invalid", result.status)
+        self.assertTrue(result.failed_example["exact"])
+        self.assertEqual(result.total_records, 4)
+        self.assertEqual(result.passed, 3)
+
+    @mock.patch("contessa.executor.datetime", FakedDatetime)
+    def test_execute_consistency_fingerprint_diff(self):
+        result = self.consistency_checker.run(
+            self.consistency_checker.FINGERPRINT_DIFF,
+            left_check_table={"schema_name": "tmp", "table_name": self.left_table_name},
+            right_check_table={
+                "schema_name": "hello",
+                "table_name": self.right_table_name,
+            },
+            context={"task_ts": self.now},
+        )
+
+        self.assertEqual("invalid", result.status)
+        self.assertEqual(result.passed, 3)
+        self.assertEqual(result.failed, 1)
+        # columns are sorted by name: created_at, dst, id, ...
+        self.assertEqual(result.failed_example[0][1:3], ("VIE", 4))
+
+    @mock.patch("contessa.executor.datetime", FakedDatetime)
+    def test_execute_consistency_spill_diff(self):
+        self.consistency_checker.spill_memory_rows = 1
+        self.consistency_checker.spill_partitions = 2
+        result = self.consistency_checker.run(
+            self.consistency_checker.SPILL_DIFF,
+            left_check_table={"schema_name": "tmp", "table_name": self.left_table_name},
+            right_check_table={
+                "schema_name": "hello",
+                "table_name": self.right_table_name,
+            },
+            context={"task_ts": self.now},
+        )
+
+        self.assertEqual("invalid", result.status)
+        self.assertEqual(result.passed, 3)
+        self.assertEqual(result.failed, 1)
+
+    @mock.patch("contessa.executor.datetime", FakedDatetime)
+    def test_execute_consistency_batch(self):
+        checks = [
+            {
+                "method": method,
+                "left_check_table": {
+                    "schema_name": "tmp",
+                    "table_name": self.left_table_name,
+                },
+                "right_check_table": {
+                    "schema_name": "hello",
+                    "table_name": self.right_table_name,
+                },
+                "context": {"task_ts": self.now},
+            }
+            for method in (
+                self.consistency_checker.COUNT,
+                self.consistency_checker.DIFF,
+            )
+        ]
+        self.consistency_checker.run_batch(
+            checks,
+            result_table={
+                "schema_name": "data_quality",
+                "table_name": self.result_table_name,
+            },
+            max_workers=2,
+        )
+
+        rows = self.conn.get_records(
+            f"""
+            SELECT type, status from data_quality.consistency_check_{self.result_table_name}
+            order by type
+        """
+        ).fetchall()
+        self.assertEqual(
+            [tuple(r) for r in rows], [("count", "invalid"), ("difference", "invalid")]
+        )
@@ -8,10 +8,12 @@ from contessa.alembic.packages_migrations import migration_map
 
 from contessa.db import Connector
 from contessa.models import TIME_FILTER_DEFAULT
+from contessa.partitions import is_partitioned, list_partitions
 
 from test.conftest import FakedDatetime
 from test.integration.conftest import TEST_DB_URI, ALEMBIC_INI_PATH
 from contessa.models import (
+    create_default_check_class,
     DQBase,
     QualityCheck,
     ConsistencyCheck,
@@ -36,20 +38,27 @@ class MigrationTestCase(unittest.TestCase):
         Mock sqlalchemy version table to be migration 1 before latest.
         Then apply latest migration.
         """
-        idx = list(migration_map.keys())[-2]
-        before_last = migration_map[idx]
+        self.migrate_from_previous(list(migration_map.keys())[-1])
+
+    def migrate_from_previous(self, version, *args):
+        """
+        Mock sqlalchemy version table to be migration 1 before `version`.
+        Then apply migration of `version`.
+        """
+        versions = list(migration_map.keys())
+        before = migration_map[versions[versions.index(version) - 1]]
 
         self.conn.execute(
             f"create table {self.migration_table.fullname}(version_num text);"
         )
         self.conn.execute(
-            f"insert into {self.migration_table.fullname}(version_num) values('{before_last}')"
+            f"insert into {self.migration_table.fullname}(version_num) values('{before}')"
         )
 
-        last_version = list(migration_map.keys())[-1]
         try:
             migration.main(
-                ["-u", TEST_DB_URI, "-s", DATA_QUALITY_SCHEMA, "-v", last_version, "-f"]
+                ["-u", TEST_DB_URI, "-s", DATA_QUALITY_SCHEMA, "-v", version, "-f"]
+                + list(args)
             )
         except SystemExit as e:
             print(e.args[0])
@@ -441,7 +450,7 @@ class TestMigrationTo025(MigrationTestCase):
         )
         assert [d[0] for d in data] == [None]
 
-        self.migrate_to_latest()
+        self.migrate_from_previous("0.2.5")
 
         # quality check - attribute, rule_name, rule_type, time_filter
         metadata = self._get_metadata(
@@ -484,7 +493,7 @@ class TestMigrationTo025(MigrationTestCase):
         assert [d[0] for d in data] == [TIME_FILTER_DEFAULT]
 
     def test_migration_downgrade_to_0_2_4(self):
-        self.migrate_to_latest()
+        self.migrate_from_previous("0.2.5")
         self.migrate_to("0.2.4")
 
         # quality check
@@ -522,3 +531,99 @@ class TestMigrationTo025(MigrationTestCase):
             f"select time_filter from {self.CONSISTENCY_TABLE_1.fullname}"
         )
         assert [d[0] for d in data] == [None]
+
+
+class TestMigrationTo0213(MigrationTestCase):
+    def setUp(self):
+        """
+        Init a 0.2.5 quality check table with results from two months.
+        """
+        self.QUALITY_TABLE_1 = ResultTable(DATA_QUALITY_SCHEMA, "table_1", QualityCheck)
+        self.conn.execute(f"DROP SCHEMA IF EXISTS {DATA_QUALITY_SCHEMA} CASCADE;")
+        self.conn.execute(f"CREATE SCHEMA IF NOT EXISTS {DATA_QUALITY_SCHEMA};")
+        cls = create_default_check_class(self.QUALITY_TABLE_1)
+        cls.__table__.create(bind=self.conn.engine)
+        # remove what 0.2.13 added to the table
+        table_name = cls.__tablename__
+        self.conn.execute(
+            f"""
+            ALTER TABLE {self.QUALITY_TABLE_1.fullname} DROP COLUMN last_seen;
+            DROP INDEX {DATA_QUALITY_SCHEMA}.{table_name}_history_idx;
+            DROP INDEX {DATA_QUALITY_SCHEMA}.{table_name}_invalid_idx;
+        """
+        )
+        for task_ts in ("2021-01-15 10:00:00+00", "2021-02-15 10:00:00+00"):
+            self.conn.execute(
+                f"""
+                INSERT INTO {self.QUALITY_TABLE_1.fullname}(
+                    attribute, rule_name, rule_type, total_records, failed, passed, task_ts)
+                VALUES('a', 'not_null_name', 'not_null', 10, 1, 9, '{task_ts}');
+            """
+            )
+        DQBase.metadata.clear()
+
+    def tearDown(self):
+        self.conn.execute(f"DROP schema {DATA_QUALITY_SCHEMA} CASCADE;")
+        DQBase.metadata.clear()
+
+    def test_migration_without_partitioning(self):
+        self.migrate_from_previous("0.2.13")
+
+        assert not is_partitioned(
+            self.conn.engine, DATA_QUALITY_SCHEMA, self.QUALITY_TABLE_1.table_name
+        )
+
+    def test_migration_adds_last_seen(self):
+        self.migrate_from_previous("0.2.13")
+
+        columns = self.conn.get_column_names(self.QUALITY_TABLE_1.fullname)
+        assert "last_seen" in columns
+
+    def test_migration_of_table_created_by_0_2_13(self):
+        table = ResultTable(DATA_QUALITY_SCHEMA, "table_2", QualityCheck)
+        create_default_check_class(table).__table__.create(bind=self.conn.engine)
+
+        self.migrate_from_previous("0.2.13")
+
+        columns = self.conn.get_column_names(table.fullname)
+        assert columns.count("last_seen") == 1
+
+    def test_migration_upgrade_to_0_2_13_partitioned(self):
+        self.migrate_from_previous("0.2.13", "--partition-results")
+
+        schema, table_name = DATA_QUALITY_SCHEMA, self.QUALITY_TABLE_1.table_name
+        assert is_partitioned(self.conn.engine, schema, table_name)
+        assert list_partitions(self.conn.engine, schema, table_name) == [
+            f"{table_name}_p202012",
+            f"{table_name}_p202101",
+            f"{table_name}_p202102",
+            f"{table_name}_p202103",
+        ]
+        data = self.conn.get_records(
+            f"select id, failed from {self.QUALITY_TABLE_1.fullname} order by id"
+        )
+        assert [tuple(d) for d in data] == [(1, 1), (2, 1)]
+
+        # sequence is kept
+        self.conn.execute(
+            f"""
+            INSERT INTO {self.QUALITY_TABLE_1.fullname}(
+                attribute, rule_name, rule_type, task_ts)
+            VALUES('b', 'not_null_name', 'not_null', '2021-02-16 10:00:00+00');
+        """
+        )
+        data = self.conn.get_records(
+            f"select max(id) from {self.QUALITY_TABLE_1.fullname}"
+        )
+        assert data.first()[0] == 3
+
+    def test_migration_downgrade_to_0_2_5(self):
+        self.migrate_from_previous("0.2.13", "--partition-results")
+        self.migrate_to("0.2.5")
+
+        schema, table_name = DATA_QUALITY_SCHEMA, self.QUALITY_TABLE_1.table_name
+        assert not is_partitioned(self.conn.engine, schema, table_name)
+        data = self.conn.get_records(
+            f"select count(*) from {self.QUALITY_TABLE_1.fullname}"
+        )
+        assert data.first()[0] == 2
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+
+from contessa.db import Connector
+from contessa.models import create_default_check_class, QualityCheck, ResultTable
+from contessa.reader import ResultReader
+from test.integration.conftest import TEST_DB_URI
+
+
+def test_reader(conn: Connector):
+    result_table = {"schema_name": "data_quality", "table_name": "reader"}
+    cls = create_default_check_class(
+        ResultTable(**result_table, model_cls=QualityCheck)
+    )
+    conn.ensure_table(cls.__table__)
+
+    now = datetime(2021, 3, 3, 12)
+    rows = []
+    for days in range(5):
+        for attribute in ("src", "dst"):
+            rows.append(
+                {
+                    "attribute": attribute,
+                    "rule_name": "not_null_name",
+                    "rule_type": "not_null",
+                    "time_filter": "not_set",
+                    "task_ts": now - timedelta(days=days),
+                    "failed": days % 2,
+                    "passed": 1,
+                    "status": "invalid" if days % 2 else "valid",
+                }
+            )
+    conn.upsert_rows(cls.__table__, rows)
+
+    reader = ResultReader(TEST_DB_URI, result_table, chunk_size=2)
+
+    latest = list(reader.latest())
+    assert [r["attribute"] for r in latest] == ["src", "dst"]
+    assert all(r["task_ts"].replace(tzinfo=None) == now for r in latest)
+
+    history = list(reader.rule_history("src", "not_null_name", "not_null"))
+    assert len(history) == 5
+    assert [r["task_ts"] for r in history] == sorted(
+        (r["task_ts"] for r in history), reverse=True
+    )
+
+    invalid = list(reader.invalid_since(now - timedelta(days=3)))
+    assert len(invalid) == 4
+    assert {r["status"] for r in invalid} == {"invalid"}
+
+    after = reader.key_of(invalid[1])
+    assert (
+        list(reader.invalid_since(now - timedelta(days=3), after=after)) == invalid[2:]
+    )
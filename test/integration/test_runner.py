@@ -1,7 +1,9 @@
 from contessa.db import Connector
 from contessa.models import DQBase
+from contessa.partitions import list_partitions
 from test.conftest import FakedDatetime
 from test.integration.conftest import TEST_DB_URI
+from datetime import timedelta
 import unittest
 from unittest import mock
 
@@ -225,3 +227,202 @@ class TestDataQualityOperator(unittest.TestCase):
             """
         ).fetchall()
         self.assertEqual(len(rows), 1)
+
+    @mock.patch("contessa.executor.datetime", FakedDatetime)
+    def test_store_failed_examples(self):
+        rules = [
+            {"name": "not_null_name", "type": "not_null", "column": "dst"},
+            {"name": "not_null_name", "type": "not_null", "column": "price"},
+        ]
+        self.contessa_runner.run(
+            check_table={"schema_name": "tmp", "table_name": self.tmp_table_name},
+            result_table={"schema_name": "data_quality", "table_name": self.table_name},
+            raw_rules=rules,
+            context={"task_ts": self.now},
+            store_failed_examples=True,
+        )
+
+        rows = self.conn.get_records(
+            f"""
+            SELECT * from data_quality.failed_example_{self.table_name}
+        """
+        ).fetchall()
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["attribute"], "dst")
+        self.assertEqual(rows[0]["examples"], [[None]])
+
+    @mock.patch("contessa.executor.datetime", FakedDatetime)
+    def test_partitioned_result_table(self):
+        rules = [{"name": "not_null_name", "type": "not_null", "column": "dst"}]
+        result_table = {
+            "schema_name": "data_quality",
+            "table_name": self.table_name,
+            "partitioned": True,
+        }
+        for task_ts in (self.now - timedelta(days=100), self.now):
+            self.contessa_runner.run(
+                check_table={"schema_name": "tmp", "table_name": self.tmp_table_name},
+                result_table=result_table,
+                raw_rules=rules,
+                context={"task_ts": task_ts},
+            )
+
+        table_name = f"quality_check_{self.table_name}"
+        partitions = list_partitions(self.conn.engine, "data_quality", table_name)
+        self.assertIn(f"{table_name}_p{self.now:%Y%m}", partitions)
+        rows = self.conn.get_records(
+            f"SELECT count(*) from data_quality.{table_name}"
+        ).first()
+        self.assertEqual(rows[0], 2)
+
+        dropped = self.contessa_runner.drop_expired_results(
+            result_table, retention=timedelta(days=60)
+        )
+        self.assertTrue(dropped)
+        rows = self.conn.get_records(
+            f"SELECT task_ts from data_quality.{table_name}"
+        ).fetchall()
+        self.assertEqual(len(rows), 1)
+
+    @mock.patch("contessa.executor.datetime", FakedDatetime)
+    def test_rollups(self):
+        rules = [
+            {"name": "not_null_name", "type": "not_null", "column": "dst"},
+            {
+                "name": "not_null_name",
+                "type": "not_null",
+                "column": "src",
+                "time_filter": "created_at",
+            },
+        ]
+        result_table = {"schema_name": "data_quality", "table_name": self.table_name}
+        for hours in (0, 1):
+            self.contessa_runner.run(
+                check_table={"schema_name": "tmp", "table_name": self.tmp_table_name},
+                result_table=result_table,
+                raw_rules=rules,
+                context={"task_ts": self.now.replace(hour=hours)},
+                rollups=True,
+            )
+
+        rows = self.conn.get_records(
+            f"""
+            SELECT period, total_records, failed, passed, pass_rate, run_count
+            FROM data_quality.quality_rollup_{self.table_name}
+            WHERE period = 'day' AND time_filter = 'not_set'
+        """
+        ).fetchall()
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(tuple(rows[0]), ("day", 8, 2, 6, 0.75, 2))
+
+        # runs of time filtered rule are grouped, whatever time they were evaluated at
+        rows = self.conn.get_records(
+            f"""
+            SELECT time_filter, run_count
+            FROM data_quality.quality_rollup_{self.table_name}
+            WHERE period = 'day' AND time_filter != 'not_set'
+        """
+        ).fetchall()
+        self.assertEqual(len(rows), 1)
+        self.assertNotIn("relative to", rows[0]["time_filter"])
+        self.assertEqual(rows[0]["run_count"], 2)
+
+        self.conn.execute(f"DELETE FROM data_quality.quality_rollup_{self.table_name}")
+        self.contessa_runner.rebuild_rollups(result_table)
+        rows = self.conn.get_records(
+            f"SELECT count(*) FROM data_quality.quality_rollup_{self.table_name}"
+        ).first()
+        self.assertEqual(rows[0], 4)
+
+    @mock.patch("contessa.executor.datetime", FakedDatetime)
+    def test_delta(self):
+        rules = [{"name": "not_null_name", "type": "not_null", "column": "dst"}]
+        for task_ts in (self.now - timedelta(days=1), self.now):
+            self.contessa_runner.run(
+                check_table={"schema_name": "tmp", "table_name": self.tmp_table_name},
+                result_table={
+                    "schema_name": "data_quality",
+                    "table_name": self.table_name,
+                },
+                raw_rules=rules,
+                context={"task_ts": task_ts},
+                delta=True,
+            )
+
+        rows = self.conn.get_records(
+            f"SELECT task_ts, last_seen from data_quality.quality_check_{self.table_name}"
+        ).fetchall()
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["last_seen"].timestamp(), self.now.timestamp())
+
+        # the unchanged result of the second run is stored as the first row
+        results = self.contessa_runner.run(
+            check_table={"schema_name": "tmp", "table_name": self.tmp_table_name},
+            result_table={"schema_name": "data_quality", "table_name": self.table_name},
+            raw_rules=rules,
+            context={"task_ts": self.now},
+            delta=True,
+            skip_existing=True,
+        )
+        self.assertEqual(results, [])
+
+    @mock.patch("contessa.executor.datetime", FakedDatetime)
+    def test_skip_existing(self):
+        rules = [
+            {"name": "not_null_name", "type": "not_null", "column": "dst"},
+            {
+                "name": "not_null_name",
+                "type": "not_null",
+                "column": "src",
+                "time_filter": "created_at",
+            },
+        ]
+        kwargs = dict(
+            check_table={"schema_name": "tmp", "table_name": self.tmp_table_name},
+            result_table={"schema_name": "data_quality", "table_name": self.table_name},
+            context={"task_ts": self.now},
+        )
+        self.contessa_runner.run(raw_rules=rules[:1], **kwargs)
+
+        results = self.contessa_runner.run(
+            raw_rules=rules, skip_existing=True, **kwargs
+        )
+        self.assertEqual([r.attribute for r in results], ["src"])
+
+        results = self.contessa_runner.run(
+            raw_rules=rules, skip_existing=True, **kwargs
+        )
+        self.assertEqual(results, [])
+
+    @mock.patch("contessa.executor.datetime", FakedDatetime)
+    def test_checkpoint_and_resume(self):
+        rules = [
+            {"name": "not_null_name", "type": "not_null", "column": "dst"},
+            {"name": "not_null_name", "type": "not_null", "column": "src"},
+        ]
+        kwargs = dict(
+            check_table={"schema_name": "tmp", "table_name": self.tmp_table_name},
+            result_table={"schema_name": "data_quality", "table_name": self.table_name},
+            raw_rules=rules,
+            context={"task_ts": self.now},
+        )
+        execute_rule = ContessaRunner.execute_rule
+
+        def failing_execute_rule(rule):
+            if rule.attribute == "src":
+                raise RuntimeError("connection lost")
+            return execute_rule(rule)
+
+        with mock.patch.object(
+            ContessaRunner, "execute_rule", side_effect=failing_execute_rule
+        ):
+            with self.assertRaises(RuntimeError):
+                self.contessa_runner.run(checkpoint_every=1, **kwargs)
+
+        rows = self.conn.get_records(
+            f"SELECT attribute from data_quality.quality_check_{self.table_name}"
+        ).fetchall()
+        self.assertEqual([r[0] for r in rows], ["dst"])
+
+        results = self.contessa_runner.run(resume=True, **kwargs)
+        self.assertEqual([r.attribute for r in results], ["src"])
@@ -0,0 +1,196 @@
+import json
+from unittest import mock
+
+import pytest
+
+from contessa import BatchError, ConsistencyChecker
+from contessa.sinks import JsonLinesSink
+from contessa.utils import AggregatedResult
+
+
+@pytest.fixture
+def checker(dummy_engine):
+    return ConsistencyChecker(dummy_engine)
+
+
+def test_approx_count_within_tolerance(checker):
+    estimates = {"left": 1000, "right": 990}
+    with mock.patch.object(
+        checker, "estimate_rows", side_effect=lambda conn, q: estimates[q]
+    ), mock.patch.object(checker, "fetch_rows") as fetch_rows:
+        result = checker.approx_count("left", "right")
+
+    fetch_rows.assert_not_called()
+    assert (result.total_records, result.passed, result.failed) == (1000, 1000, 0)
+    assert checker.describe_results(checker.APPROX_COUNT, result) == (
+        "estimated count, estimates: 1000, 990"
+    )
+
+
+def test_approx_count_escalates_to_exact_count(checker):
+    estimates = {"left": 1000, "right": 500}
+    with mock.patch.object(
+        checker, "estimate_rows", side_effect=lambda conn, q: estimates[q]
+    ), mock.patch.object(
+        checker,
+        "fetch_rows",
+        side_effect=lambda conn, q: [(1000,)] if "(left)" in q else [(999,)],
+    ):
+        result = checker.approx_count("left", "right")
+
+    assert (result.total_records, result.passed, result.failed) == (1000, 999, 1)
+    assert checker.describe_results(checker.APPROX_COUNT, result) == (
+        "exact count, estimates: 1000, 500"
+    )
+
+
+def test_estimate_rows():
+    conn = mock.Mock()
+    conn.get_records.return_value.scalar.return_value = [
+        {"Plan": {"Node Type": "Seq Scan", "Plan Rows": 1234}}
+    ]
+    assert ConsistencyChecker.estimate_rows(conn, "SELECT * FROM t;") == 1234
+    conn.get_records.assert_called_once_with("EXPLAIN (FORMAT JSON) SELECT * FROM t")
+
+
+def test_run_batch(checker):
+    checks = [
+        {
+            "method": method,
+            "left_check_table": {"schema_name": "tmp", "table_name": table},
+            "right_check_table": {"schema_name": "public", "table_name": table},
+        }
+        for table, method in (("a", checker.DIFF), ("b", checker.COUNT))
+    ]
+    column_names = {"public.a": ["id", "name"]}
+    with mock.patch.object(
+        checker.right_conn, "get_column_names_of_tables", return_value=column_names
+    ) as get_column_names, mock.patch.object(
+        checker, "check", side_effect=lambda **kw: kw
+    ) as check, mock.patch.object(
+        checker, "upsert_many"
+    ) as upsert_many, mock.patch.object(
+        checker.right_conn, "ensure_table"
+    ):
+        results = checker.run_batch(
+            checks, result_table={"schema_name": "dq", "table_name": "replicas"}
+        )
+
+    get_column_names.assert_called_once_with(["public.a"])
+    assert check.call_count == 2
+    assert [r["right_columns"] for r in results] == [["id", "name"], None]
+    upsert_many.assert_called_once()
+    assert upsert_many.call_args[0][1] == results
+
+
+def test_run_batch_saves_results_of_succeeded_checks(checker):
+    checks = [
+        {
+            "method": checker.COUNT,
+            "left_check_table": {"schema_name": "tmp", "table_name": table},
+            "right_check_table": {"schema_name": "public", "table_name": table},
+        }
+        for table in ("a", "dropped", "c")
+    ]
+
+    def check(**kw):
+        if kw["right_check_table"]["table_name"] == "dropped":
+            raise ValueError("relation does not exist")
+        return kw
+
+    with mock.patch.object(
+        checker.right_conn, "get_column_names_of_tables", return_value={}
+    ), mock.patch.object(checker, "check", side_effect=check), mock.patch.object(
+        checker, "upsert_many"
+    ) as upsert_many, mock.patch.object(
+        checker.right_conn, "ensure_table"
+    ):
+        with pytest.raises(BatchError, match="1 of 3 .* public.dropped") as e:
+            checker.run_batch(
+                checks, result_table={"schema_name": "dq", "table_name": "replicas"}
+            )
+
+    saved = upsert_many.call_args[0][1]
+    assert [r["right_check_table"]["table_name"] for r in saved] == ["a", "c"]
+    assert e.value.results == saved
+    assert [c["right_check_table"]["table_name"] for c, _ in e.value.failures] == [
+        "dropped"
+    ]
+
+
+def test_run_batch_caps_range_workers(checker):
+    checks = [
+        {
+            "method": checker.KEY_DIFF,
+            "left_check_table": {"schema_name": "tmp", "table_name": "a"},
+            "right_check_table": {"schema_name": "public", "table_name": "a"},
+            "key_columns": ["id"],
+            "key_ranges": 32,
+            "max_workers": 16,
+        }
+    ]
+    with mock.patch.object(
+        checker.right_conn, "get_column_names_of_tables", return_value={}
+    ), mock.patch.object(
+        checker, "check", side_effect=lambda **kw: kw
+    ) as check, mock.patch.object(
+        checker, "range_workers", return_value=3
+    ), mock.patch.object(
+        checker, "save_results"
+    ):
+        checker.run_batch(checks, max_workers=2)
+
+    assert check.call_args[1]["max_workers"] == 3
+
+
+def test_range_workers(checker):
+    # default pool of 5 connections and 10 overflow, shared by both sides
+    assert checker.range_workers(1) == 7
+    assert checker.range_workers(4) == 1
+
+
+def test_run_batch_result_table_or_sink(checker):
+    with pytest.raises(ValueError):
+        checker.run_batch([], result_table={"schema_name": "dq"}, sink=mock.Mock())
+
+
+def consistency_result(table):
+    return {
+        "check": {"type": "count", "name": "count", "description": ""},
+        "results": AggregatedResult(
+            total_records=1, failed=0, passed=1, failed_example=[]
+        ),
+        "left_table_name": f"tmp.{table}",
+        "right_table_name": f"public.{table}",
+        "context": {},
+    }
+
+
+def test_runs_write_to_one_sink(checker, tmp_path):
+    path = tmp_path / "results.jsonl"
+    sink = JsonLinesSink(str(path))
+    for table in ("a", "b"):
+        with mock.patch.object(
+            checker, "check", return_value=consistency_result(table)
+        ):
+            checker.run(
+                checker.COUNT,
+                left_check_table={"schema_name": "tmp", "table_name": table},
+                right_check_table={"schema_name": "public", "table_name": table},
+                sink=sink,
+            )
+
+    rows = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [r["right_table_name"] for r in rows] == ["public.a", "public.b"]
+
+
+def test_key_columns_have_to_be_selected(checker):
+    with pytest.raises(ValueError, match="`key_columns` have to be among"):
+        checker.check(
+            checker.KEY_DIFF,
+            left_check_table={"schema_name": "tmp", "table_name": "a"},
+            right_check_table={"schema_name": "public", "table_name": "a"},
+            columns=["name"],
+            key_columns=["id"],
+            key_ranges=4,
+        )
@@ -0,0 +1,147 @@
+from datetime import datetime, timezone
+from unittest import mock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from contessa.db import copy_text_value, dispose_engines, get_engine, Connector
+from contessa.models import create_default_check_class, QualityCheck, ResultTable
+from contessa.utils import chunked
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        (None, "\\N"),
+        (True, "t"),
+        (12, "12"),
+        (0.5, "0.5"),
+        ("", ""),
+        ("a\tb\nc\\d", "a\\tb\\nc\\\\d"),
+        (datetime(2018, 9, 12, 12, 0, 0), "2018-09-12T12:00:00"),
+        ({"a": [1]}, '{"a": [1]}'),
+    ],
+)
+def test_copy_text_value(value, expected):
+    assert copy_text_value(value) == expected
+
+
+def test_chunked():
+    assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(chunked([], 2)) == []
+
+
+def test_get_engine_is_shared():
+    uri = "postgresql://:@postgres:5432/shared"
+    engine = get_engine(uri)
+    assert get_engine(uri) is engine
+    assert Connector(uri).engine is engine
+    assert get_engine(uri, pool_size=2) is not engine
+
+    dispose_engines()
+    assert get_engine(uri) is not engine
+
+
+def test_ensure_partitions_is_called_once(dummy_engine):
+    cls = create_default_check_class(
+        ResultTable("tmp", "ensure_partitions", QualityCheck, partitioned=True)
+    )
+    conn = Connector(dummy_engine)
+    with mock.patch("contessa.db.create_partition") as create_partition:
+        conn.ensure_partitions(cls.__table__, [datetime(2021, 3, 15)])
+        conn.ensure_partitions(cls.__table__, [datetime(2021, 3, 16)])
+
+    assert create_partition.call_count == 1
+
+
+def test_split_unchanged():
+    # stored task_ts is tz aware (timestamptz), the one of the run is naive
+    table = create_default_check_class(
+        ResultTable("tmp", "delta", QualityCheck)
+    ).__table__
+    rule = {
+        "attribute": "src",
+        "rule_name": "not_null_name",
+        "rule_type": "not_null",
+        "time_filter": "not_set",
+    }
+    stored_ts = datetime(2021, 3, 1, tzinfo=timezone.utc)
+    stored = [
+        {**rule, "id": 1, "task_ts": stored_ts, "failed": 1, "passed": 9},
+        {
+            **rule,
+            "attribute": "dst",
+            "id": 2,
+            "task_ts": stored_ts,
+            "failed": 0,
+            "passed": 10,
+        },
+    ]
+    session = mock.Mock(execute=mock.Mock(return_value=stored))
+    new_ts = datetime(2021, 3, 2)
+    data = [
+        {**rule, "task_ts": new_ts, "failed": 1, "passed": 9},
+        {**rule, "attribute": "dst", "task_ts": new_ts, "failed": 1, "passed": 9},
+        {**rule, "attribute": "price", "task_ts": new_ts, "failed": 1, "passed": 9},
+    ]
+
+    changed, unchanged = Connector._split_unchanged(
+        session, table, data, QualityCheck._delta_key, ("failed", "passed")
+    )
+
+    assert [r["attribute"] for r in changed] == ["dst", "price"]
+    assert unchanged == [(1, new_ts)]
+
+
+def test_get_column_names_of_tables(dummy_engine):
+    conn = Connector(dummy_engine)
+    with mock.patch.object(
+        conn,
+        "get_records",
+        return_value=[("public.a", "id"), ("public.a", "name"), ("public.b", "id")],
+    ) as get_records:
+        assert conn.get_column_names_of_tables(
+            ["public.b", "public.a", "public.a"]
+        ) == {"public.a": ["id", "name"], "public.b": ["id"],}
+    assert "IN ('public.a', 'public.b')" in get_records.call_args[0][0]
+    assert conn.get_column_names_of_tables([]) == {}
+
+
+def test_split_unchanged_of_time_filtered_rule():
+    table = create_default_check_class(
+        ResultTable("tmp", "delta", QualityCheck)
+    ).__table__
+    rule = {
+        "attribute": "created_at",
+        "rule_name": "not_null_created_at",
+        "rule_type": "not_null",
+    }
+    stored = [
+        {
+            **rule,
+            "time_filter": "<created_at 1 day relative to 2021-03-01 00:00:00>",
+            "id": 1,
+            "task_ts": datetime(2021, 3, 1, tzinfo=timezone.utc),
+            "failed": 1,
+        }
+    ]
+    session = mock.Mock(execute=mock.Mock(return_value=stored))
+    new_ts = datetime(2021, 3, 2)
+    data = [
+        {
+            **rule,
+            "time_filter": "<created_at 1 day relative to 2021-03-02 00:00:00>",
+            "task_ts": new_ts,
+            "failed": 1,
+        }
+    ]
+
+    changed, unchanged = Connector._split_unchanged(
+        session, table, data, QualityCheck._delta_key, ("failed",)
+    )
+
+    assert changed == []
+    assert unchanged == [(1, new_ts)]
+    stmt = session.execute.call_args[0][0].compile(dialect=postgresql.dialect())
+    assert "DISTINCT ON (" in str(stmt)
+    assert "regexp_replace(tmp.quality_check_delta.time_filter" in str(stmt)
@@ -0,0 +1,401 @@
+import zlib
+from array import array
+from datetime import date, datetime
+from decimal import Decimal
+from unittest import mock
+
+import pytest
+
+from contessa.diff import (
+    _sorted_unique,
+    as_subquery,
+    diff_sets,
+    compare_sorted,
+    DigestDiff,
+    DIGEST_SETTINGS_SQL,
+    fingerprint,
+    FingerprintDiff,
+    fingerprints,
+    HashDiff,
+    key_boundaries,
+    key_hash_sql,
+    key_merge_diff,
+    KeyDiff,
+    merge_diff,
+    MergeDiff,
+    merge_results,
+    range_queries,
+    split_range,
+    SpillDiff,
+    sql_literal,
+    with_digest_settings,
+)
+from contessa.utils import AggregatedResult
+from contessa.failed_examples import FirstNExampleSelector
+
+
+class InMemoryHashDiff(HashDiff):
+    """
+    `HashDiff` with buckets computed in python, "connections" are lists of rows
+    and the first column is the key.
+    """
+
+    queries = []
+
+    @staticmethod
+    def _key(row):
+        return zlib.crc32(repr(row[0]).encode()) & 2147483647
+
+    @classmethod
+    def bucket_digests(
+        cls, conn, query, key_hash, modulus, parent_modulus=None, parents=None
+    ):
+        cls.queries.append(modulus)
+        ret = {}
+        # distinct rows, as `SELECT DISTINCT` of `HashDiff.bucket_digests`
+        for row in set(conn):
+            k = cls._key(row)
+            if parents is not None and k % parent_modulus not in parents:
+                continue
+            count, digest = ret.get(k % modulus, (0, 0))
+            ret[k % modulus] = (count + 1, digest + hash(row))
+        return ret
+
+    @classmethod
+    def bucket_rows(cls, conn, query, key_hash, modulus, buckets):
+        return [row for row in conn if cls._key(row) % modulus in buckets]
+
+
+@pytest.fixture
+def rows():
+    return [(i, f"name {i}") for i in range(1000)]
+
+
+def test_hash_diff_same(rows):
+    InMemoryHashDiff.queries = []
+    result = InMemoryHashDiff(rows, list(rows), fanout=4, leaf_rows=10).diff(
+        "", "", ["id"], FirstNExampleSelector(5)
+    )
+    assert (result.total_records, result.passed, result.failed) == (1000, 1000, 0)
+    assert InMemoryHashDiff.queries == [4, 4]
+
+
+def test_hash_diff_differences(rows):
+    right = list(rows)
+    right[10] = (10, "changed")
+    del right[500]
+    right.append((1000, "extra"))
+
+    result = InMemoryHashDiff(rows, right, fanout=4, leaf_rows=10).diff(
+        "", "", ["id"], FirstNExampleSelector(10)
+    )
+    assert result.failed == 4
+    assert result.passed == 998
+    assert result.total_records == 1002
+    assert set(result.failed_example) == {
+        (10, "name 10"),
+        (10, "changed"),
+        (500, "name 500"),
+        (1000, "extra"),
+    }
+
+
+def test_hash_diff_counts_duplicates_once(rows):
+    right = rows + rows[:10]
+    right[5] = (5, "changed")
+
+    result = InMemoryHashDiff(rows, right, fanout=4, leaf_rows=10).diff(
+        "", "", ["id"], FirstNExampleSelector(10)
+    )
+    expected = diff_sets(rows, right, FirstNExampleSelector(10))
+    assert (result.total_records, result.passed, result.failed) == (
+        expected.total_records,
+        expected.passed,
+        expected.failed,
+    )
+
+    # buckets that differ only by duplicates are the same
+    result = InMemoryHashDiff(rows, rows + rows[:10], fanout=4).diff(
+        "", "", ["id"], FirstNExampleSelector(10)
+    )
+    assert (result.total_records, result.passed, result.failed) == (1000, 1000, 0)
+
+
+def test_hash_diff_digests_distinct_rows():
+    conn = mock.Mock(get_records=mock.Mock(return_value=[]))
+    HashDiff.bucket_digests(conn, "SELECT 1", key_hash_sql(None), 64)
+    assert "SELECT DISTINCT (hashtext(src::text)" in conn.get_records.call_args[0][0]
+
+
+def test_hash_diff_splits_until_leaf_rows(rows):
+    right = list(rows)
+    right[10] = (10, "changed")
+
+    InMemoryHashDiff.queries = []
+    result = InMemoryHashDiff(rows, right, fanout=4, leaf_rows=10).diff(
+        "", "", ["id"], FirstNExampleSelector(10)
+    )
+    assert (result.passed, result.failed) == (999, 2)
+    # 1000 rows / 4^n buckets, a bucket has at most 10 rows at level 4^4
+    assert InMemoryHashDiff.queries == [4, 4, 16, 16, 64, 64, 256, 256]
+
+
+def test_diff_sets():
+    result = diff_sets([(1,), (2,)], [(2,), (3,)], FirstNExampleSelector(5))
+    assert (result.total_records, result.passed, result.failed) == (3, 1, 2)
+    assert sorted(result.failed_example) == [(1,), (3,)]
+
+
+def test_key_hash_sql():
+    assert key_hash_sql(["a", "b"]) == "(hashtext(row(a, b)::text) & 2147483647)"
+    assert key_hash_sql(None) == "(hashtext(src::text) & 2147483647)"
+
+
+def test_as_subquery():
+    assert as_subquery(" SELECT 1; \n") == "SELECT 1"
+
+
+def test_digest_query():
+    assert DigestDiff.digest_query("SELECT id, name FROM t;", ["id"]) == (
+        "SELECT id, md5(src::text) FROM (SELECT id, name FROM t) AS src"
+    )
+    assert DigestDiff.digest_query("SELECT 1", None) == (
+        "SELECT md5(src::text) FROM (SELECT 1) AS src"
+    )
+
+
+def test_digests_are_computed_with_pinned_settings():
+    conn = mock.Mock(get_records=mock.Mock(return_value=[]))
+    DigestDiff(conn, conn).fetch_digests(conn, "SELECT 1", None)
+    HashDiff.bucket_digests(conn, "SELECT 1", key_hash_sql(None), 64)
+    HashDiff.bucket_rows(conn, "SELECT 1", key_hash_sql(None), 64, [1])
+    for call in conn.get_records.call_args_list:
+        assert call[0][0].startswith("SET LOCAL TimeZone = 'UTC';")
+    assert with_digest_settings("SELECT 1") == f"{DIGEST_SETTINGS_SQL};\nSELECT 1"
+
+    con = mock.MagicMock()
+    con.execution_options.return_value.execute.return_value = [("d", 1)]
+    assert list(MergeDiff.stream(con, "SELECT 1")) == [("d", 1)]
+    con.execute.assert_called_once_with(DIGEST_SETTINGS_SQL)
+
+
+def test_digest_diff_fetches_examples_by_digest():
+    digests = {
+        "left": {(1, "a"), (2, "b"), (3, "c")},
+        "right": {(1, "a"), (2, "B"), (4, "d")},
+    }
+    differ = DigestDiff("left", "right")
+    with mock.patch.object(
+        differ, "fetch_digests", side_effect=lambda conn, q, k: digests[conn]
+    ), mock.patch("contessa.diff.fetch_rows_by_digest") as fetch_rows:
+        fetch_rows.side_effect = lambda conn, q, d: [(conn, x) for x in sorted(d)]
+        result = differ.diff("", "", ["id"], FirstNExampleSelector(10))
+
+    assert (result.total_records, result.passed, result.failed) == (5, 1, 4)
+    assert sorted(result.failed_example) == [
+        ("left", "b"),
+        ("left", "c"),
+        ("right", "B"),
+        ("right", "d"),
+    ]
+
+
+def test_merge_diff():
+    left = [("a", 1), ("b", 2), ("b", 2), ("d", 4)]
+    right = [("a", 1), ("c", 3), ("d", 4), ("e", 5)]
+    result = merge_diff(iter(left), iter(right), FirstNExampleSelector(10))
+    assert (result.total_records, result.passed, result.failed) == (5, 2, 3)
+    assert sorted(result.failed_example) == [(2,), (3,), (5,)]
+
+
+def test_merge_diff_keeps_limited_examples():
+    left = [(f"{i:05}", i) for i in range(1000)]
+    result = merge_diff(iter(left), iter([]), FirstNExampleSelector(3))
+    assert (result.passed, result.failed) == (0, 1000)
+    assert sorted(result.failed_example) == [(0,), (1,), (2,)]
+
+
+def test_merge_diff_matches_diff_sets(rows):
+    right = rows[5:] + [(2000, "extra")]
+    selector = FirstNExampleSelector(None)
+    expected = diff_sets(rows, right, selector)
+    result = merge_diff(
+        sorted((repr(r), *r) for r in rows),
+        sorted((repr(r), *r) for r in right),
+        selector,
+    )
+    assert result.total_records == expected.total_records
+    assert result.passed == expected.passed
+    assert sorted(result.failed_example) == sorted(expected.failed_example)
+
+
+def test_key_merge_diff():
+    left = [("k1", "a", 1, "a"), ("k2", "b", 2, "b"), ("k3", "c", 3, "c")]
+    right = [("k1", "a", 1, "a"), ("k2", "B", 2, "B"), ("k4", "d", 4, "d")]
+    result = key_merge_diff(iter(left), iter(right), FirstNExampleSelector(10))
+    assert (result.total_records, result.passed, result.failed) == (4, 1, 3)
+    assert result.failed_example == {
+        "missing": {"count": 1, "examples": [(3, "c")]},
+        "extra": {"count": 1, "examples": [(4, "d")]},
+        "changed": {"count": 1, "examples": [((2, "b"), (2, "B"))]},
+    }
+
+
+def test_key_diff_needs_key_columns():
+    assert 'ORDER BY md5(row(id, day)::text) COLLATE "C"' in KeyDiff.sorted_query(
+        "SELECT * FROM t", ["id", "day"]
+    )
+    with pytest.raises(ValueError):
+        KeyDiff.sorted_query("SELECT * FROM t", None)
+
+
+def test_split_range():
+    assert split_range(0, 100, 4) == [25, 50, 75]
+    assert split_range(0, 2, 4) == [1]
+    assert split_range(5, 5, 4) == []
+    assert split_range(date(2021, 1, 1), date(2021, 1, 5), 2) == [date(2021, 1, 3)]
+
+
+def bounds_conn(lower, upper):
+    conn = mock.Mock()
+    conn.get_records.return_value.first.return_value = (lower, upper)
+    return conn
+
+
+def test_key_boundaries_of_different_types():
+    # numeric on one side, double precision on the other
+    assert key_boundaries(
+        bounds_conn(Decimal("0"), Decimal("50")),
+        bounds_conn(10.0, 100.0),
+        "SELECT 1",
+        "SELECT 1",
+        "id",
+        4,
+    ) == [25.0, 50.0, 75.0]
+    assert key_boundaries(
+        bounds_conn(date(2021, 1, 1), date(2021, 1, 2)),
+        bounds_conn(datetime(2021, 1, 1), datetime(2021, 1, 5)),
+        "SELECT 1",
+        "SELECT 1",
+        "created_at",
+        2,
+    ) == [datetime(2021, 1, 3)]
+
+
+def test_sql_literal():
+    assert sql_literal(10) == "10"
+    assert sql_literal(date(2021, 1, 1)) == "'2021-01-01'"
+    assert sql_literal("it's 100%") == "'it''s 100%%'"
+    assert sql_literal(None) == "NULL"
+
+
+def test_range_queries():
+    queries = range_queries("SELECT * FROM t;", "id", [10, 20])
+    conditions = [q.split(" WHERE ")[1] for q in queries]
+    assert conditions == [
+        "id IS NULL",
+        "id < 10",
+        "id >= 10 AND id < 20",
+        "id >= 20",
+    ]
+    assert queries[0].startswith("SELECT * FROM (SELECT * FROM t) AS src")
+    assert [q.split(" WHERE ")[1] for q in range_queries("q", "id", [])] == [
+        "id IS NULL",
+        "id IS NOT NULL",
+    ]
+
+
+def test_merge_results():
+    selector = FirstNExampleSelector(10)
+    result = merge_results(
+        [
+            AggregatedResult(3, 1, 2, [(1,)]),
+            AggregatedResult(2, 0, 2, []),
+            AggregatedResult(4, 2, 2, [(5,), (6,)]),
+        ],
+        selector,
+    )
+    assert (result.total_records, result.failed, result.passed) == (9, 3, 6)
+    assert sorted(result.failed_example) == [(1,), (5,), (6,)]
+
+    kinds = ("missing", "extra", "changed")
+    result = merge_results(
+        [
+            AggregatedResult(
+                2, 1, 1, {k: {"count": 1, "examples": [(k, i)]} for k in kinds}
+            )
+            for i in range(2)
+        ],
+        selector,
+    )
+    assert result.failed_example["changed"]["count"] == 2
+    assert sorted(result.failed_example["missing"]["examples"]) == [
+        ("missing", 0),
+        ("missing", 1),
+    ]
+
+
+def test_fingerprint():
+    assert fingerprint((1, "a")) == fingerprint((Decimal(1), "a"))
+    assert fingerprint((1, "a")) == fingerprint((1.0, "a"))
+    assert 0 <= fingerprint((-1, None)) < 2 ** 64
+    # equal python hashes
+    assert fingerprint((-1,)) != fingerprint((-2,))
+    assert fingerprint((0,)) != fingerprint((2 ** 61 - 1,))
+    assert fingerprint((Decimal("0.10"),)) == fingerprint((Decimal("0.1"),))
+    assert fingerprint((1.5,)) != fingerprint((1,))
+    # numeric and float columns
+    assert fingerprint((1.5, "a")) == fingerprint((Decimal("1.5"), "a"))
+    assert fingerprint((0.1,)) == fingerprint((Decimal("0.100"),))
+    assert fingerprint((1e-20,)) == fingerprint((Decimal("1E-20"),))
+    assert fingerprint((float("nan"),)) != fingerprint((0,))
+
+
+def test_sorted_unique():
+    values = [5, 3, 5, 1, 2 ** 64 - 1, 3, 0]
+    result = _sorted_unique(values, run_size=3)
+    assert result == array("Q", [0, 1, 3, 5, 2 ** 64 - 1])
+    assert result.typecode == "Q"
+    assert list(fingerprints([(2,), (1,), (2,)])) == sorted(
+        {fingerprint((1,)), fingerprint((2,))}
+    )
+
+
+def test_compare_sorted():
+    left = array("Q", [1, 2, 4, 6])
+    right = array("Q", [2, 3, 6, 7, 8])
+    assert compare_sorted(left, right, None) == (2, 2, 3, [1, 4], [3, 7, 8])
+    assert compare_sorted(left, right, 1) == (2, 2, 3, [1], [3])
+
+
+def test_fingerprint_diff(rows):
+    right = rows[5:] + [(2000, "extra")]
+    data = {"left": rows, "right": right}
+    with mock.patch(
+        "contessa.diff.stream_rows", side_effect=lambda conn, q: iter(data[conn])
+    ):
+        result = FingerprintDiff("left", "right").diff(
+            "", "", None, FirstNExampleSelector(10)
+        )
+    expected = diff_sets(rows, right, FirstNExampleSelector(10))
+    assert result.total_records == expected.total_records == 1001
+    assert (result.passed, result.failed) == (995, 6)
+    assert sorted(result.failed_example) == sorted(expected.failed_example)
+
+
+@pytest.mark.parametrize("memory_rows", [10_000, 50, 1])
+def test_spill_diff(rows, tmp_path, memory_rows):
+    right = rows[5:] + [(2000, "extra")] + [(1, "name 1")] * 100
+    data = {"left": rows, "right": right}
+    differ = SpillDiff(
+        "left", "right", memory_rows=memory_rows, partitions=4, directory=tmp_path
+    )
+    with mock.patch(
+        "contessa.diff.stream_rows", side_effect=lambda conn, q: iter(data[conn])
+    ):
+        result = differ.diff("", "", None, FirstNExampleSelector(None))
+
+    expected = diff_sets(rows, right, FirstNExampleSelector(None))
+    assert (result.total_records, result.passed, result.failed) == (1001, 996, 5)
+    assert sorted(result.failed_example) == sorted(expected.failed_example)
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,87 @@
+from datetime import date, datetime
+
+from contessa.history import HistoryCache
+
+
+def make_row(rule_name, task_ts, failed, passed):
+    return {
+        "attribute": "a",
+        "rule_name": rule_name,
+        "rule_type": "not_null",
+        "time_filter": "not_set",
+        "task_ts": task_ts,
+        "failed": failed,
+        "passed": passed,
+    }
+
+
+class FakeLoader:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = 0
+
+    def __call__(self, since):
+        self.calls += 1
+        return [r for r in self.rows if r["task_ts"] >= since]
+
+
+def test_history_cache_loads_once():
+    loader = FakeLoader(
+        [
+            make_row("a", datetime(2018, 9, 10, 13), 3, 22),
+            make_row("a", datetime(2018, 9, 11, 13), 10, 200),
+            make_row("a", datetime(2018, 7, 12, 13), 77, 309),
+        ]
+    )
+    cache = HistoryCache()
+
+    result = cache.get("dq.t", date(2018, 8, 13), date(2018, 9, 12), loader)
+    assert sorted(result) == [(3, 22), (10, 200)]
+
+    cache.append("dq.t", [make_row("b", datetime(2018, 9, 11, 14), 1, 2)])
+    result = cache.get("dq.t", date(2018, 8, 13), date(2018, 9, 12), loader)
+    assert sorted(result) == [(1, 2), (3, 22), (10, 200)]
+    assert loader.calls == 1
+
+    # upsert of the same result replaces the old one
+    cache.append("dq.t", [make_row("b", datetime(2018, 9, 11, 14), 5, 6)])
+    result = cache.get("dq.t", date(2018, 8, 13), date(2018, 9, 12), loader)
+    assert sorted(result) == [(3, 22), (5, 6), (10, 200)]
+
+    # window older than the loaded one has to be read from db again
+    result = cache.get("dq.t", date(2018, 7, 1), date(2018, 9, 12), loader)
+    assert sorted(result) == [(3, 22), (10, 200), (77, 309)]
+    assert loader.calls == 2
+
+
+def test_history_cache_skips_cold_tables():
+    cache = HistoryCache()
+    cache.append("dq.t", [make_row("a", datetime(2018, 9, 11, 14), 1, 2)])
+    assert "dq.t" not in cache
+    assert len(cache) == 0
+
+
+def test_history_cache_evicts_least_recently_used():
+    rows = [make_row(str(i), datetime(2018, 9, 11), i, i) for i in range(3)]
+    cache = HistoryCache(max_rows=5)
+
+    cache.get("dq.a", date(2018, 9, 1), date(2018, 9, 12), FakeLoader(rows))
+    cache.get("dq.b", date(2018, 9, 1), date(2018, 9, 12), FakeLoader(rows))
+
+    assert "dq.a" not in cache
+    assert "dq.b" in cache
+    assert len(cache) == 3
+
+
+def test_history_cache_keeps_table_larger_than_max_rows(caplog):
+    rows = [make_row(str(i), datetime(2018, 9, 11), i, i) for i in range(3)]
+    loader = FakeLoader(rows)
+    cache = HistoryCache(max_rows=2)
+
+    cache.get("dq.a", date(2018, 9, 1), date(2018, 9, 12), loader)
+    result = cache.get("dq.a", date(2018, 9, 1), date(2018, 9, 12), loader)
+
+    assert sorted(result) == [(0, 0), (1, 1), (2, 2)]
+    assert loader.calls == 1
+    assert "dq.a" in cache
+    assert "more than max_rows=2" in caplog.text
@@ -0,0 +1,151 @@
+import tracemalloc
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+import pytest
+from sqlalchemy import Table
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+from contessa.db import Connector
+from contessa.history import HistoryCache
+from contessa.models import (
+    CheckResult,
+    create_default_check_class,
+    DQBase,
+    FailedExample,
+    QualityCheck,
+    ResultTable,
+    TIME_FILTER_DEFAULT,
+)
+from contessa.utils import AggregatedResult
+
+
+def test_check_class_is_created_once():
+    result_table = ResultTable("tmp", "memoized", QualityCheck)
+    cls = create_default_check_class(result_table)
+
+    assert create_default_check_class(result_table) is cls
+    assert (
+        create_default_check_class(ResultTable("tmp", "memoized", QualityCheck)) is cls
+    )
+
+    DQBase.metadata.clear()
+    assert create_default_check_class(result_table) is not cls
+
+
+def test_ensure_table_is_called_once(dummy_contessa):
+    cls = create_default_check_class(ResultTable("tmp", "ensured", QualityCheck))
+
+    with mock.patch.object(Table, "create") as create:
+        dummy_contessa.conn.ensure_table(cls.__table__)
+        dummy_contessa.conn.ensure_table(cls.__table__)
+
+    create.assert_called_once()
+
+
+def test_build_row_matches_init_row(rule, ctx, dummy_engine):
+    cls = create_default_check_class(ResultTable("tmp", "rows", QualityCheck))
+    cache = HistoryCache()
+    # warm up the cache, so history is not read from db
+    cache.get(cls.__table__.fullname, date(2000, 1, 1), date(2000, 1, 1), lambda _: [])
+    conn = Connector(dummy_engine, history_cache=cache)
+    results = AggregatedResult(total_records=5, failed=2, passed=3)
+
+    row = cls.build_row(rule, results, conn, ctx)
+    obj = cls()
+    obj.init_row(rule, results, conn, ctx)
+
+    assert row == Connector.model2dict(obj)
+    assert row["status"] == "invalid"
+    assert row["failed_percentage"] == 40
+    assert row["time_filter"] == TIME_FILTER_DEFAULT
+
+
+def test_check_result_is_compact(rule, ctx):
+    results = AggregatedResult(total_records=5, failed=2, passed=3, failed_example=[])
+    obj = CheckResult()
+    obj.init_row(rule, results, None, ctx)
+
+    assert not hasattr(obj, "__dict__")
+    assert obj.status == "invalid"
+    assert obj.failed_percentage == 40
+    assert obj.context is ctx
+    with pytest.raises(AttributeError):
+        obj.failed = 0
+    with pytest.raises(AttributeError, match="already initialized"):
+        obj.init_row(
+            rule, AggregatedResult(total_records=5, failed=0, passed=5), None, ctx
+        )
+    assert obj.failed == 2
+
+
+class DictCheckResult:
+    """
+    Baseline for `CheckResult` footprint - the previous class, all the attributes
+    (including the computed ones) in `__dict__`.
+    """
+
+    def __init__(self, result: CheckResult):
+        for name in CheckResult.__annotations__:
+            setattr(self, name, getattr(result, name))
+
+
+def traced_memory(make, n):
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    objs = [make() for _ in range(n)]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (after - before) / len(objs)
+
+
+def test_check_result_footprint(rule, ctx):
+    """
+    Memory benchmark - how much one result of a big in-memory run takes.
+    """
+    n = 10_000
+    results = AggregatedResult(total_records=5, failed=2, passed=3, failed_example=[])
+
+    def make_result():
+        obj = CheckResult()
+        obj.init_row(rule, results, None, ctx)
+        return obj
+
+    result = make_result()
+    per_result = traced_memory(make_result, n)
+    per_baseline = traced_memory(lambda: DictCheckResult(result), n)
+    assert len(DictCheckResult(result).__dict__) == 12
+    assert per_result < per_baseline
+
+
+def test_failed_example_row(rule, ctx):
+    results = AggregatedResult(
+        total_records=5,
+        failed=1,
+        passed=4,
+        failed_example=[(None, date(2018, 9, 12), Decimal("1.5"))],
+    )
+    row = FailedExample.build_row(rule, results, ctx)
+
+    assert row["attribute"] == "src"
+    assert row["time_filter"] == TIME_FILTER_DEFAULT
+    assert row["examples"] == [[None, "2018-09-12", "1.5"]]
+
+
+def test_partitioned_check_class():
+    cls = create_default_check_class(
+        ResultTable("tmp", "partitioned", QualityCheck, partitioned=True)
+    )
+    ddl = str(CreateTable(cls.__table__).compile(dialect=postgresql.dialect()))
+
+    assert cls.__table__.info["partitioned"]
+    assert "PARTITION BY RANGE (task_ts)" in ddl
+    assert "id BIGSERIAL NOT NULL" in ddl
+    assert "PRIMARY KEY (id, task_ts)" in ddl
+
+    plain = create_default_check_class(ResultTable("tmp", "plain", QualityCheck))
+    assert "PARTITION BY" not in str(
+        CreateTable(plain.__table__).compile(dialect=postgresql.dialect())
+    )
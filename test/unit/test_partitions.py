@@ -0,0 +1,33 @@
+from datetime import date, datetime
+
+from contessa.partitions import (
+    months_for,
+    next_month,
+    partition_name,
+    partition_start,
+)
+
+
+def test_next_month():
+    assert next_month(date(2021, 1, 1)) == date(2021, 2, 1)
+    assert next_month(date(2021, 12, 1)) == date(2022, 1, 1)
+
+
+def test_partition_name():
+    name = partition_name("quality_check_t", date(2021, 3, 1))
+
+    assert name == "quality_check_t_p202103"
+    assert partition_start(name) == date(2021, 3, 1)
+    assert partition_start("quality_check_t") is None
+
+
+def test_months_for():
+    months = months_for(
+        [datetime(2021, 3, 15, 10), datetime(2021, 3, 31, 23), "2021-05-01T00:30:00"]
+    )
+
+    assert months == {date(2021, 3, 1), date(2021, 4, 1), date(2021, 5, 1)}
+    assert months_for(["2021-07-15 10:00:00.123+02:00", "2021-08-20"]) == {
+        date(2021, 7, 1),
+        date(2021, 8, 1),
+    }
@@ -0,0 +1,73 @@
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql
+
+from contessa.reader import ResultReader
+
+
+def test_keyset_pagination(dummy_engine):
+    reader = ResultReader(
+        dummy_engine, {"schema_name": "tmp", "table_name": "reader"}, chunk_size=2
+    )
+    ts = datetime(2021, 3, 3)
+    pages = [
+        [{"task_ts": ts, "id": 3}, {"task_ts": ts, "id": 2}],
+        [{"task_ts": ts, "id": 1}],
+    ]
+    queries = []
+
+    def execute(stmt):
+        queries.append(stmt.compile(dialect=postgresql.dialect()))
+        return pages.pop(0)
+
+    reader.conn.execute = execute
+    rows = list(reader.rule_history("src", "not_null_name", "not_null"))
+
+    assert [r["id"] for r in rows] == [3, 2, 1]
+    assert len(queries) == 2
+    keyset = "(tmp.quality_check_reader.task_ts, tmp.quality_check_reader.id) <"
+    assert keyset not in str(queries[0])
+    assert keyset in str(queries[1])
+    assert queries[1].params["param_1"] == ts
+    assert queries[1].params["param_2"] == 2
+
+
+def test_rule_history_matches_all_runs_of_time_filtered_rule(dummy_engine):
+    reader = ResultReader(dummy_engine, {"schema_name": "tmp", "table_name": "reader"})
+    queries = []
+
+    def execute(stmt):
+        queries.append(stmt.compile(dialect=postgresql.dialect()))
+        return []
+
+    reader.conn.execute = execute
+    time_filter = "<created_at 1 day relative to 2021-03-03 00:00:00>"
+    list(reader.rule_history("src", "not_null_name", "not_null", time_filter))
+
+    assert "regexp_replace(tmp.quality_check_reader.time_filter" in str(queries[0])
+    assert "<created_at 1 day>" in queries[0].params.values()
+
+
+def test_latest_is_distinct_on_stable_identity(dummy_engine):
+    reader = ResultReader(
+        dummy_engine, {"schema_name": "tmp", "table_name": "reader"}, chunk_size=1
+    )
+    row = {
+        "attribute": "created_at",
+        "rule_name": "not_null_created_at",
+        "rule_type": "not_null",
+        "time_filter": "<created_at 1 day relative to 2021-03-03 00:00:00>",
+    }
+    pages = [[row], []]
+    queries = []
+
+    def execute(stmt):
+        queries.append(stmt.compile(dialect=postgresql.dialect()))
+        return pages.pop(0)
+
+    reader.conn.execute = execute
+    assert list(reader.latest()) == [row]
+
+    assert "DISTINCT ON (" in str(queries[0])
+    assert "regexp_replace(" in str(queries[0]).split("FROM")[0]
+    assert "<created_at 1 day>" in queries[1].params.values()
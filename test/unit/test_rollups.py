@@ -0,0 +1,75 @@
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql
+
+from contessa.models import create_default_check_class, QualityCheck, ResultTable
+from contessa.rollups import rollup_select
+
+
+def test_rollup_select():
+    source = create_default_check_class(
+        ResultTable("tmp", "rollup", QualityCheck)
+    ).__table__
+    rows = [
+        {
+            "task_ts": datetime(2021, 3, 3, 10),
+            "attribute": "src",
+            "rule_name": "not_null_name",
+            "rule_type": "not_null",
+            "time_filter": "not_set",
+        }
+    ]
+
+    stmt = rollup_select(source, "week", rows)
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+
+    assert list(stmt.c.keys()) == [
+        "period",
+        "period_start",
+        "attribute",
+        "rule_name",
+        "rule_type",
+        "time_filter",
+        "total_records",
+        "failed",
+        "passed",
+        "pass_rate",
+        "run_count",
+        "updated_at",
+    ]
+    assert "GROUP BY date_trunc" in sql
+    assert "tmp.quality_check_rollup.task_ts >=" in sql
+    assert "WHERE" not in str(
+        rollup_select(source, "week").compile(dialect=postgresql.dialect())
+    )
+
+
+def test_rollup_select_groups_runs_of_time_filtered_rule():
+    source = create_default_check_class(
+        ResultTable("tmp", "rollup_tf", QualityCheck)
+    ).__table__
+    rows = [
+        {
+            "task_ts": datetime(2021, 3, 3, hour),
+            "attribute": "src",
+            "rule_name": "not_null_name",
+            "rule_type": "not_null",
+            "time_filter": "<TimeFilter created_at between 1 day, 0:00:00 and now "
+            f"relative to 2021-03-03 {hour:02}:00:00>",
+        }
+        for hour in (10, 11)
+    ]
+
+    compiled = rollup_select(source, "day", rows).compile(dialect=postgresql.dialect())
+    sql = str(compiled)
+
+    assert (
+        "regexp_replace(tmp.quality_check_rollup_tf.time_filter, %(regexp_replace_1)s, "
+        "%(regexp_replace_2)s) AS time_filter" in sql
+    )
+    assert sql.count("regexp_replace(") == 3  # select, group by and where
+    # both runs belong to one group
+    identities = [v for k, v in compiled.params.items() if k.startswith("param_")]
+    assert (
+        identities.count("<TimeFilter created_at between 1 day, 0:00:00 and now>") == 1
+    )
@@ -1,8 +1,11 @@
+from unittest import mock
+
 from contessa import ContessaRunner
 from contessa.executor import refresh_executors
+from contessa.failed_examples import FirstNExampleSelector
 from contessa.models import Table
 from test.utils import normalize_str
-from contessa.rules import SqlRule
+from contessa.rules import NotNullRule, SqlRule
 
 
 def test_rule_context_formatted_in_where():
@@ -30,3 +33,32 @@ def test_rule_context_formatted_in_where():
 		where created_at >= '20190101T000000'::timestamptz - interval '10 minutes'
 	"""
     assert normalize_str(result) == normalize_str(expected)
+
+
+class FakeRow(tuple):
+    def values(self):
+        return list(self)
+
+
+class RecordingSelector(FirstNExampleSelector):
+    def select_examples(self, failed_rows):
+        self.seen = len(failed_rows)
+        return super().select_examples(failed_rows)
+
+
+def test_failed_rows_are_kept_up_to_selector_limit():
+    rule = NotNullRule("not_null_name", "not_null", "name")
+    rows = [FakeRow((i % 4 != 0, f"name {i}")) for i in range(100)]
+    conn = mock.MagicMock()
+    con = conn.engine.connect.return_value.__enter__.return_value
+    con.execution_options.return_value.execute.return_value = rows
+    selector = RecordingSelector(3)
+
+    with mock.patch.object(
+        NotNullRule, "sql_with_where", new_callable=mock.PropertyMock
+    ):
+        result = rule.apply(conn, selector)
+
+    assert (result.total_records, result.passed, result.failed) == (100, 75, 25)
+    assert selector.seen == 3
+    assert sorted(result.failed_example) == [("name 0",), ("name 4",), ("name 8",)]
@@ -1,7 +1,19 @@
+from datetime import datetime
+from unittest import mock
+
 import pytest
+from sqlalchemy.dialects import postgresql
 
-from contessa.models import ResultTable, QualityCheck
+from contessa.journal import RunJournal
+from contessa.models import (
+    CheckResult,
+    create_default_check_class,
+    ResultTable,
+    QualityCheck,
+    TIME_FILTER_DEFAULT,
+)
 from contessa.rules import GtRule, NotNullRule
+from contessa.utils import AggregatedResult
 
 
 def test_build_rules(dummy_contessa):
@@ -56,3 +68,101 @@ def test_generic_typ_qc_class_no_prefix(dummy_contessa):
         ).__name__
         == "TmpQualityCheckMytable"
     )
+
+
+def test_skip_existing_rules(dummy_contessa):
+    rules = dummy_contessa.build_rules(
+        dummy_contessa.normalize_rules(
+            [
+                {
+                    "name": "not_null_name",
+                    "type": "not_null",
+                    "columns": ["a", "b"],
+                    "time_filter": "created_at",
+                },
+                {"name": "gt_name", "type": "gt", "column": "c", "value": 1},
+            ]
+        )
+    )
+    # time filter of the previous run was evaluated at different time
+    stored_time_filter = str(rules[0].time_filter).replace(
+        str(rules[0].time_filter.now), "2021-03-03 10:00:00"
+    )
+    existing = [
+        ("a", "not_null_name", "not_null", stored_time_filter),
+        ("c", "gt_name", "gt", TIME_FILTER_DEFAULT),
+    ]
+    session = mock.Mock()
+    session.query.return_value.filter.return_value.all.return_value = existing
+
+    with mock.patch.object(dummy_contessa.conn, "make_session", return_value=session):
+        ret = dummy_contessa.skip_existing_rules(
+            QualityCheck, rules, {"task_ts": datetime(2021, 3, 3)}
+        )
+
+    assert [r.attribute for r in ret] == ["b"]
+
+
+def test_load_existing_covers_last_seen(dummy_engine):
+    session = mock.Mock()
+    conn = mock.Mock(make_session=mock.Mock(return_value=session))
+    dq_cls = create_default_check_class(ResultTable("tmp", "existing", QualityCheck))
+    session.query.return_value.filter.return_value.all.return_value = []
+    dq_cls.load_existing(conn, datetime(2021, 3, 3))
+
+    conditions = session.query.return_value.filter.call_args[0]
+    sql = [str(c.compile(dialect=postgresql.dialect())) for c in conditions]
+    assert sql == [
+        "tmp.quality_check_existing.task_ts <= %(task_ts_1)s",
+        "coalesce(tmp.quality_check_existing.last_seen, "
+        "tmp.quality_check_existing.task_ts) >= %(coalesce_1)s",
+    ]
+
+
+def test_rollups_need_full_results(dummy_contessa):
+    with pytest.raises(ValueError, match="`rollups` can't be used with `delta`"):
+        dummy_contessa.run(
+            check_table={"schema_name": "tmp", "table_name": "t"},
+            result_table={"schema_name": "dq", "table_name": "t"},
+            raw_rules=[],
+            rollups=True,
+            delta=True,
+        )
+
+
+def test_journaled_run_is_resumed(dummy_contessa, tmpdir):
+    rules = dummy_contessa.build_rules(
+        dummy_contessa.normalize_rules(
+            [{"name": "not_null_name", "type": "not_null", "columns": ["a", "b", "c"]}]
+        )
+    )
+    context = {"task_ts": datetime(2021, 3, 3)}
+    path = str(tmpdir.join("journal.jsonl"))
+
+    def apply_rule(ctx, dq_cls, rule, fail_on="c"):
+        if rule.attribute == fail_on:
+            raise RuntimeError("connection lost")
+        obj = CheckResult()
+        obj.init_row(rule, AggregatedResult(10, 1, 9), None, ctx)
+        return obj
+
+    with mock.patch.object(dummy_contessa, "apply_rule", side_effect=apply_rule):
+        with pytest.raises(RuntimeError):
+            dummy_contessa.do_journaled_quality_checks(
+                rules, context, RunJournal(path), resume=False
+            )
+
+    with mock.patch.object(
+        dummy_contessa,
+        "apply_rule",
+        side_effect=lambda *args: apply_rule(*args, fail_on=None),
+    ) as apply_rule_mock:
+        results = dummy_contessa.do_journaled_quality_checks(
+            rules, context, RunJournal(path), resume=True
+        )
+
+    assert apply_rule_mock.call_count == 1
+    assert [r.failed for r in results] == [1, 1, 1]
+    assert results[0].context is context
+    with open(path) as f:
+        assert len(f.readlines()) == 3
@@ -0,0 +1,132 @@
+import csv
+import json
+import threading
+
+import pytest
+
+from contessa.models import CheckResult
+from contessa.sinks import CsvSink, JsonLinesSink, ParquetSink, WriteBehindSink
+from contessa.utils import AggregatedResult
+
+
+class FakeConnector:
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+        self.upserted = threading.Event()
+
+    def upsert(self, objs):
+        if self.fail:
+            raise ValueError("db is down")
+        self.batches.append(list(objs))
+        self.upserted.set()
+
+
+def test_write_behind_sink_batches():
+    conn = FakeConnector()
+    with WriteBehindSink(conn, batch_size=2, flush_interval=60) as sink:
+        for i in range(5):
+            sink.write(i)
+
+    assert conn.batches == [[0, 1], [2, 3], [4]]
+
+
+def test_write_behind_sink_flushes_after_interval():
+    conn = FakeConnector()
+    sink = WriteBehindSink(conn, batch_size=100, flush_interval=0.05)
+    sink.open()
+    sink.write(1)
+
+    # the batch isn't full, it's written after the interval, before close
+    assert conn.upserted.wait(timeout=5)
+    assert conn.batches == [[1]]
+    sink.close()
+    assert conn.batches == [[1]]
+
+
+def test_write_behind_sink_raises_write_error():
+    sink = WriteBehindSink(FakeConnector(fail=True), batch_size=1)
+    with pytest.raises(ValueError, match="db is down"):
+        with sink:
+            sink.write(1)
+
+
+@pytest.fixture()
+def check_result(rule, ctx):
+    obj = CheckResult()
+    obj.init_row(
+        rule,
+        AggregatedResult(
+            total_records=4, failed=1, passed=3, failed_example=[(None, "BTS")]
+        ),
+        None,
+        ctx,
+    )
+    return obj
+
+
+def test_json_lines_sink(tmp_path, check_result):
+    path = tmp_path / "results.jsonl"
+    with JsonLinesSink(str(path)) as sink:
+        sink.write(check_result)
+        sink.write(check_result)
+
+    lines = path.read_text().splitlines()
+    assert len(lines) == 2
+    row = json.loads(lines[0])
+    assert row["rule_name"] == "not_null_name"
+    assert row["failed"] == 1
+    assert row["failed_example"] == [[None, "BTS"]]
+    assert row["table_fullname"] == "public.tmp_table"
+    assert "context" not in row
+
+
+def test_csv_sink(tmp_path, check_result):
+    path = tmp_path / "results.csv"
+    with CsvSink(str(path)) as sink:
+        sink.write(check_result)
+
+    with open(path) as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 1
+    assert rows[0]["status"] == "invalid"
+    assert json.loads(rows[0]["failed_example"]) == [[None, "BTS"]]
+
+
+def test_parquet_sink(tmp_path, check_result):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "results.parquet"
+    with ParquetSink(str(path), row_group_size=2) as sink:
+        for _ in range(5):
+            sink.write(check_result)
+
+    f = pq.ParquetFile(str(path))
+    assert f.metadata.num_rows == 5
+    assert f.metadata.num_row_groups == 3
+
+
+def test_nested_sink_is_opened_once(tmp_path, check_result):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "results.parquet"
+    with ParquetSink(str(path)) as sink:
+        for _ in range(2):
+            # e.g. `with sink:` of each run
+            with sink:
+                sink.write(check_result)
+
+    assert pq.ParquetFile(str(path)).metadata.num_rows == 2
+    with pytest.raises(ValueError, match="already closed"):
+        with sink:
+            pass
+
+
+def test_csv_sink_appends_when_reopened(tmp_path, check_result):
+    path = tmp_path / "results.csv"
+    sink = CsvSink(str(path))
+    for _ in range(2):
+        with sink:
+            sink.write(check_result)
+
+    with open(path) as f:
+        rows = list(csv.DictReader(f))
+    assert [r["rule_name"] for r in rows] == ["not_null_name", "not_null_name"]
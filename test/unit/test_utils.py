@@ -0,0 +1,56 @@
+import threading
+import time
+
+import pytest
+
+from contessa.utils import read_ahead, run_concurrently
+
+
+def test_run_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+
+    def side(value):
+        # would time out if the sides ran one after the other
+        barrier.wait()
+        return value
+
+    assert run_concurrently(lambda: side("left"), lambda: side("right")) == [
+        "left",
+        "right",
+    ]
+
+
+def test_run_concurrently_raises():
+    def fail():
+        raise ValueError("broken")
+
+    with pytest.raises(ValueError, match="broken"):
+        run_concurrently(lambda: 1, fail)
+
+
+def test_read_ahead():
+    assert list(read_ahead(range(2500), chunk_size=100, chunks=2)) == list(range(2500))
+
+
+def test_read_ahead_raises():
+    def rows():
+        yield 1
+        raise ValueError("broken")
+
+    with pytest.raises(ValueError, match="broken"):
+        list(read_ahead(rows()))
+
+
+def test_read_ahead_stops_producer():
+    produced = []
+
+    def rows():
+        for i in range(10_000):
+            produced.append(i)
+            yield i
+
+    it = read_ahead(rows(), chunk_size=10, chunks=1)
+    assert next(it) == 0
+    it.close()
+    time.sleep(0.1)
+    assert len(produced) < 100